@@ -135,6 +135,68 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 USE_L10N = True
 STATICFILES_DIRS = [os.path.join(BASE_DIR, "static")]
 
+# feature extraction settings
+
+# load the encoder in a background thread when the WSGI/ASGI application starts
+# (otherwise it is loaded by the first extraction)
+FEATURE_ENCODER_WARMUP = True
+
+# "ffmpeg": decode the downloaded m4a straight to PCM | "librosa": librosa.load
+FEATURE_AUDIO_DECODER = "ffmpeg"
+# None: the decoder default (ffmpeg "swr", librosa "soxr_hq") | ffmpeg: "soxr" | librosa: any res_type, e.g. "soxr_lq"
+# (see Feature.utils.decoder.DecodeProfile). "soxr" needs an ffmpeg built with libsoxr: same CPU time as "swr",
+# features closest to librosa.load (benchmarks/decode_profile.py)
+FEATURE_AUDIO_RESAMPLER = None
+# "stream": decode the 30-60 s excerpt from the stream URL in memory | "file": download it to a temporary directory
+FEATURE_DOWNLOAD_MODE = "stream"
+# concurrent requests are batched into one encoder forward pass
+FEATURE_BATCH_MAX_SIZE = 16
+FEATURE_BATCH_MAX_WAIT_MS = 5
+# "predict" | "direct" | "compiled" | "tflite", see Feature.utils.inference.InferenceRunner
+FEATURE_INFERENCE_MODE = "compiled"
+FEATURE_TFLITE_PATH = os.path.join(BASE_DIR, "static", "feature", "models", "best.tflite")
+# extracted features, keyed by (video id, encoder version, mfcc params)
+FEATURE_CACHE_DIR = os.path.join(BASE_DIR, "data", "feature", "cache")  # None: memory only
+FEATURE_CACHE_MAX_ITEMS = 1024
+# yt-dlp / ffmpeg calls running at once per process (the others wait)
+FEATURE_DOWNLOAD_CONCURRENCY = 4
+# video metadata (Downloader.get_info), keyed by video id
+FEATURE_INFO_CACHE_TTL = 600  # seconds
+FEATURE_INFO_CACHE_MAX_ITEMS = 4096
+
+# music similarity settings
+
+# "exact": brute-force cosine similarity | "ivf": approximate inverted-file index
+# | "sharded": brute-force cosine similarity split across MUSIC_SEARCH_SHARDS processes (multi-core)
+# | "quantized": scan of compressed codes, the MUSIC_QUANTIZED_RERANK * k best re-ranked exactly
+MUSIC_SIMILARITY_BACKEND = "exact"
+MUSIC_SEARCH_SHARDS = None  # None: one per CPU
+MUSIC_SHARDED_MIN_ROWS = 50000  # smaller catalogues are searched in the request process (benchmarks/sharded_search.py)
+# "int8": 1 byte per dimension | "float16": 2 bytes (benchmarks/quantized_search.py)
+MUSIC_QUANTIZED_PRECISION = "int8"
+MUSIC_QUANTIZED_RERANK = 8
+MUSIC_IVF_N_LISTS = None  # None: 4 * sqrt(number of musics)
+MUSIC_IVF_N_PROBE = 8
+MUSIC_ANN_INDEX_PATH = os.path.join(BASE_DIR, "data", "music", "index", "ivf.npz")
+# /music/get_similiar_musics_batch: queries (seeds) per request and results per query
+MUSIC_BATCH_MAX_QUERIES = 500
+MUSIC_BATCH_MAX_K = 100
+# materialized k-nearest-neighbour graph (Music.neighbors), maintained at ingest time and read by
+# get_similiar_musics; rebuild it with manage.py build_neighbor_graph after changing MUSIC_NEIGHBOR_K
+MUSIC_NEIGHBOR_GRAPH = True
+MUSIC_NEIGHBOR_K = 20
+# memory-mapped feature matrix shared by the workers (manage.py export_feature_snapshot)
+MUSIC_FEATURE_SNAPSHOT_DIR = os.path.join(BASE_DIR, "data", "music", "snapshot")
+MUSIC_FEATURE_SNAPSHOT_CHECK_INTERVAL = 5  # seconds
+# reading the musics written by other processes (ingest workers, bulk ingest) into the index
+MUSIC_FEATURE_INDEX_SYNC_INTERVAL = 5  # seconds, None: only on lookup of an unknown music
+# asynchronous uploads (manage.py run_ingest_workers)
+MUSIC_INGEST_WORKERS = 2  # worker processes
+MUSIC_INGEST_MAX_ATTEMPTS = 3
+MUSIC_INGEST_RETRY_DELAY = 30  # seconds, doubled after each failed attempt
+MUSIC_INGEST_POLL_INTERVAL = 1  # seconds
+MUSIC_INGEST_JOB_TIMEOUT = 600  # seconds, running jobs older than this are queued again
+
 # logger settings
 
 LOGGING = {
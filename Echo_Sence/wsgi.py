@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Echo_Sence.settings')
 
 application = get_wsgi_application()
+
+# Load the encoder while the server starts accepting requests, instead of during the first one.
+from django.conf import settings
+
+if settings.FEATURE_ENCODER_WARMUP:
+    from Feature.services import fe
+    fe.load_in_background()
@@ -1,60 +1,267 @@
 import os
-from keras import models
+import hashlib
+import shutil
+import tempfile
+import threading
+import logging
 import numpy as np
 from typing import Literal
 
 from .utils import min_max_scaling
-from .utils.yt_music import Downloader
+from .utils.yt_music import Downloader, DownloaderConfig
 from .utils.score import Audio
+from .utils.batcher import InferenceBatcher
+from .utils.inference import InferenceMode, InferenceRunner
+from .utils.cache import FeatureCache
+from .utils.check_helper import Checker
+from .utils.decoder import DecodeProfile, get_ffmpeg
+
+logger = logging.getLogger("Feature")
 
 class FeatureExtractor:
-    def __init__(self, encoder_path: str, runtime_dir: str = "./data/music/main_runtime"):
-        self.encoder = models.load_model(encoder_path) if os.path.isfile(encoder_path) else None
+    """
+    The encoder (TensorFlow / Keras) is loaded lazily: on the first extraction, or in a background
+    thread started by `load_in_background`. Creating a `FeatureExtractor` is cheap.
+    
+    Extracted features are stored in `cache` (when given) under a key made of the video ID, the
+    encoder version, `mfcc_params` and the decoder, so repeated links skip the download, decoding
+    and inference.
+    
+    Audio is decoded by `decoder`: `"ffmpeg"` pipes the downloaded m4a straight to float32 PCM
+    (see `Feature.utils.decoder`), `"librosa"` reads it with `librosa.load`. Both output 22050 Hz
+    mono, resampled by `resampler` (the decoder default when None, see `DecodeProfile`).
+    
+    YouTube audio is fetched according to `download_mode`: `"stream"` decodes the `download_range`
+    excerpt straight from the stream URL into memory (`Downloader.fetch_excerpt`, ffmpeg only),
+    `"file"` downloads it into a private temporary directory of `runtime_dir`, removed afterwards
+    even on error. Both go through `downloader`, whose `download_range` is part of `mfcc_params`.
+    """
+    mfcc_params = {
+        "duration": 30,
+        "n_mfcc": 80,
+        "segment_size": 10,
+        "download_range": list(DownloaderConfig.download_range),
+    }
+    # segments of `segment_size` frames in the encoder input (30 s at 22050 Hz: 1292 frames)
+    n_segments = 130
+
+    def __init__(
+        self, 
+        encoder_path: str, 
+        runtime_dir: str = "./data/music/main_runtime", 
+        max_batch_size: int = 16, 
+        max_wait_ms: float = 5,
+        inference_mode: InferenceMode = "compiled",
+        tflite_path: str = None,
+        cache: FeatureCache = None,
+        decoder: Literal["ffmpeg", "librosa"] = "ffmpeg",
+        download_mode: Literal["stream", "file"] = "stream",
+        downloader: Downloader = None,
+        resampler: str = None
+    ):
+        self.encoder_path = encoder_path
+        self.encoder = None
+        self.runner = None
         self.runtime_dir = runtime_dir
-        self.is_loaded = os.path.isfile(encoder_path)
+        self.inference_mode = inference_mode
+        self.tflite_path = tflite_path
+        # Concurrent requests share one forward pass, see `InferenceBatcher`
+        self.batcher = InferenceBatcher(self._predict, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        self._load_lock = threading.Lock()
+        self.cache = cache
+        self._encoder_version = None
+        if decoder == "ffmpeg" and get_ffmpeg() is None:
+            logger.warning("ffmpeg is not installed, audio is decoded with librosa.")
+            decoder = "librosa"
+        self.decoder = decoder
+        self.profile = DecodeProfile(backend=decoder, resampler=resampler)
+        self.download_mode = download_mode if decoder == "ffmpeg" else "file"
+        self.downloader = downloader or Downloader()
+        self.mfcc_params = {**self.mfcc_params, "download_range": list(self.downloader.download_range)}
+    
+    @property
+    def is_available(self):
+        """
+        Whether the encoder file exists, i.e. whether extractions can succeed.
+        """
+        return os.path.isfile(self.encoder_path)
+    
+    @property
+    def is_loaded(self):
+        return self.runner is not None
     
-    def _yt2mp3(self, yt_link):
-        if not os.path.exists(self.runtime_dir):
-            os.makedirs(self.runtime_dir)
-        return Downloader.download(yt_link, self.runtime_dir, True)
+    def load(self):
+        """
+        Load the encoder, trace and warm up its inference path. Thread-safe and idempotent.
+        """
+        if self.runner is not None or not self.is_available:
+            return self
+        with self._load_lock:
+            if self.runner is None:
+                import absl.logging
+                from keras import models
+                
+                absl.logging.set_verbosity(absl.logging.ERROR)
+                logger.info(f"Loading encoder: {self.encoder_path}")
+                encoder = models.load_model(self.encoder_path)
+                # Traced once and warmed up here, see `InferenceRunner`
+                self.runner = InferenceRunner(encoder, mode=self.inference_mode, tflite_path=self.tflite_path)
+                self.encoder = encoder
+        return self
+    
+    def load_in_background(self) -> threading.Thread:
+        thread = threading.Thread(target=self.load, name="FeatureExtractor.load", daemon=True)
+        thread.start()
+        return thread
+    
+    @property
+    def encoder_version(self) -> str:
+        """
+        Content hash of the encoder file.
+        """
+        if self._encoder_version is None:
+            sha1 = hashlib.sha1()
+            with open(self.encoder_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    sha1.update(chunk)
+            self._encoder_version = sha1.hexdigest()[:16]
+        return self._encoder_version
+    
+    def cache_key(self, yt_link: str):
+        video_id = Checker.get_video_id(yt_link) if yt_link else None
+        if self.cache is None or video_id is None or not self.is_available:
+            return None
+        params = {**self.mfcc_params, "decoder": self.decoder}
+        if self.decoder == "ffmpeg":
+            params["downmix"] = "mean"
+        if self.profile.resampler is not None:
+            params["resampler"] = self.profile.resampler
+        return FeatureCache.make_key(video_id, self.encoder_version, params)
+    
+    def get_cached(self, yt_link: str):
+        """
+        The cached features of `yt_link`, None on a miss.
+        """
+        key = self.cache_key(yt_link)
+        return None if key is None else self.cache.get(key)
+    
+    def _download(self, yt_link, to: str) -> dict:
+        return self.downloader.get_full_data(yt_link, to=to, quiet=True, to_mp3=False)
+
+    def _fetch(self, yt_link) -> tuple[Audio, dict]:
+        """
+        The decoded excerpt of `yt_link` and its metadata.
+        """
+        if self.download_mode == "stream":
+            data = self.downloader.fetch_excerpt(yt_link, sr=self.profile.sr, resampler=self.profile.resampler)
+            return Audio(y=data["y"], sr=data["sr"]), data["info"]
+
+        os.makedirs(self.runtime_dir, exist_ok=True)
+        workdir = tempfile.mkdtemp(dir=self.runtime_dir)
+        try:
+            data = self._download(yt_link, workdir)
+            return self._load_audio(data["output_path"]), data["info"]
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
 
-    def _mfcc_to_X(self, filepath):
-        audio = Audio(filepath=filepath, duration=30)
-        _, _, mfcc = audio.get_mfcc(80, segment_size=10)
+    def _load_audio(self, filepath, offset=0.) -> Audio:
+        y, sr = self.profile.load(filepath, offset=offset, duration=self.mfcc_params["duration"])
+        return Audio(filepath=filepath, y=y, sr=sr)
+
+    def _mfcc_to_X(self, audio: Audio):
+        _, _, mfcc = audio.get_mfcc(self.mfcc_params["n_mfcc"], segment_size=self.mfcc_params["segment_size"])
         mfcc = np.array(mfcc)
         mfcc = mfcc.transpose(2, 1, 0)
-        mfcc = np.reshape(mfcc, (130, -1))
+        # (n_segments, 7 stats, n_mfcc): cropped or zero-padded to the encoder input
+        n_segments = self.n_segments
+        if mfcc.shape[0] != n_segments:
+            mfcc = np.pad(mfcc[:n_segments], ((0, max(0, n_segments - mfcc.shape[0])), (0, 0), (0, 0)))
+        mfcc = np.reshape(mfcc, (n_segments, -1))
         mfcc = np.expand_dims(mfcc, axis=-1)
         mfcc = np.expand_dims(mfcc, axis=0)
         mfcc = np.nan_to_num(mfcc, nan = 0.)
         return mfcc
 
-    def _get_features(self, filepath):
-        assert isinstance(self.encoder, models.Model), "self.encoder is not loaded"
+    def _predict(self, X: np.ndarray) -> np.ndarray:
+        return self.runner(X)
+
+    def _get_audio_features(self, audio: Audio):
+        self.load()
+        assert self.runner is not None, "self.encoder is not loaded"
         
-        mfcc = self._mfcc_to_X(filepath)
-        res = self.encoder.predict(mfcc)
+        mfcc = self._mfcc_to_X(audio)
+        res = self.batcher.submit(mfcc)
         res = res.flatten()
         res = min_max_scaling(res)
         return res
+
+    def _get_features(self, filepath, offset=0.):
+        return self._get_audio_features(self._load_audio(filepath, offset=offset))
+
+    def _store(self, yt_link: str, features: np.ndarray):
+        key = self.cache_key(yt_link)
+        if key is not None:
+            self.cache.set(key, features)
     
     def extract(self, yt_link: str) -> np.ndarray:
-        if not self.is_loaded: return None
+        data = self.extract_with_info(yt_link, cached=True)
+        return None if data is None else data["feature"]
+
+    def extract_with_info(self, yt_link: str, cached: bool = False) -> dict:
+        """
+        Fetch, decode and encode `yt_link`.
+
+        Arguments
+        -------
+            cached (bool):
+                Return the cached features without fetching anything; `info` is None then.
+
+        Returns
+        -------
+            data (dict):
+                `{"feature": np.ndarray, "info": dict}`, None if the encoder is not available.
+        """
+        if not self.is_available: return None
         
-        filepath = self._yt2mp3(yt_link)
-        if filepath is not None:
-            features = self._get_features(filepath)
-            os.remove(filepath)
-            return features
-        return None
+        if cached:
+            features = self.get_cached(yt_link)
+            if features is not None:
+                return {"feature": features, "info": None}
+        
+        audio, info = self._fetch(yt_link)
+        features = self._get_audio_features(audio)
+        self._store(yt_link, features)
+        return {"feature": features, "info": info}
+
+    def extract_from_audio(self, y: np.ndarray, sr: int, yt_link: str = None) -> np.ndarray:
+        """
+        Extract the features of a decoded excerpt. When `yt_link` is given, the features are cached for that link.
+        """
+        features = self._get_audio_features(Audio(y=y, sr=sr))
+        self._store(yt_link, features)
+        return features
     
-    def extract_from_file(self, filepath):
+    def extract_from_file(self, filepath, yt_link: str = None):
+        """
+        Extract the features of an audio file, then delete it.
+        When `yt_link` is given, the features are cached for that link.
+        """
         if filepath is not None:
-            features = self._get_features(filepath)
-            os.remove(filepath)
+            try:
+                features = self._get_features(filepath)
+            finally:
+                os.remove(filepath)
+            self._store(yt_link, features)
             return features
         return None
         
 
+    def extract_from_local_file(self, filepath: str) -> np.ndarray:
+        """
+        Extract the features of a full-length audio file (kept on disk). The same
+        `download_range` window as YouTube downloads is used.
+        """
+        return self._get_features(filepath, offset=self.downloader.download_range[0])
+
     def rebuild_feature(self, features_str: str):
         return np.array(features_str.split(","), dtype=np.float32)
\ No newline at end of file
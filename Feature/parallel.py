@@ -0,0 +1,50 @@
+"""
+Feature extraction in a pool of worker processes (MFCC and encoding are CPU-bound).
+
+Each worker loads its own `FeatureExtractor` once, in `init_worker`. This module does not
+depend on Django, so spawned workers do not need `django.setup()`.
+
+Usage
+-------
+    with ProcessPoolExecutor(4, mp_context=get_context("spawn"), initializer=init_worker, initargs=(encoder_path,)) as pool:
+        features = pool.submit(extract_file, filepath).result()
+"""
+import os
+from typing import Optional
+
+import numpy as np
+
+from .extractor import FeatureExtractor
+from .utils.inference import InferenceMode
+
+_extractor: Optional[FeatureExtractor] = None
+
+def init_worker(encoder_path: str, inference_mode: InferenceMode = "compiled", tflite_path: str = None, threads: int = 1, decoder: str = "ffmpeg", resampler: str = None):
+    global _extractor
+    # Each process gets a share of the cores: no oversubscription by the math libraries
+    for name in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "TF_NUM_INTRAOP_THREADS", "TF_NUM_INTEROP_THREADS"):
+        os.environ.setdefault(name, str(threads))
+    _extractor = FeatureExtractor(
+        encoder_path,
+        max_batch_size=1,
+        max_wait_ms=0,
+        inference_mode=inference_mode,
+        tflite_path=tflite_path,
+        decoder=decoder,
+        resampler=resampler
+    ).load()
+
+def extract_file(filepath: str, local: bool = False) -> np.ndarray:
+    """
+    The features of `filepath`. The file is not deleted.
+
+    Arguments
+    -------
+        local (bool):
+            Whether `filepath` is a full-length file (read from `download_range[0]`)
+            rather than a downloaded excerpt.
+    """
+    assert _extractor is not None, "init_worker has not been called in this process"
+    if local:
+        return _extractor.extract_from_local_file(filepath)
+    return _extractor._get_features(filepath)
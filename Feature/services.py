@@ -0,0 +1,72 @@
+"""
+In-process entry points of the Feature app.
+
+The HTTP views of this app and the other apps (e.g. `Music.views`) call these functions directly
+instead of sending requests to `/feature`, `/feature/info` or `/feature/full`.
+"""
+from django.conf import settings
+from typing import Optional
+import numpy as np
+
+from .extractor import FeatureExtractor
+from .utils.cache import FeatureCache, TTLCache
+from .utils.check_helper import Checker
+from .utils.yt_music import Downloader
+
+# Shared by every request thread: at most FEATURE_DOWNLOAD_CONCURRENCY yt-dlp / ffmpeg calls run at once
+downloader = Downloader(
+    info_cache = TTLCache(ttl=settings.FEATURE_INFO_CACHE_TTL, max_items=settings.FEATURE_INFO_CACHE_MAX_ITEMS),
+    max_concurrency = settings.FEATURE_DOWNLOAD_CONCURRENCY
+)
+
+fe = FeatureExtractor(
+    encoder_path = "static/feature/models/best.h5",
+    runtime_dir = "static/feature/runtime",
+    max_batch_size = settings.FEATURE_BATCH_MAX_SIZE,
+    max_wait_ms = settings.FEATURE_BATCH_MAX_WAIT_MS,
+    inference_mode = settings.FEATURE_INFERENCE_MODE,
+    tflite_path = settings.FEATURE_TFLITE_PATH,
+    cache = FeatureCache(settings.FEATURE_CACHE_DIR, max_items=settings.FEATURE_CACHE_MAX_ITEMS),
+    decoder = settings.FEATURE_AUDIO_DECODER,
+    resampler = settings.FEATURE_AUDIO_RESAMPLER,
+    download_mode = settings.FEATURE_DOWNLOAD_MODE,
+    downloader = downloader
+)
+
+def get_video_id(yt_link: str) -> Optional[str]:
+    """
+    The video ID of `yt_link`, parsed offline when possible, otherwise looked up with `get_info`.
+    """
+    video_id = Checker.get_video_id(yt_link)
+    if video_id is None:
+        info = get_info(yt_link)
+        video_id = info.get("id") if info is not None else None
+    return video_id
+
+def get_info(yt_link: str) -> Optional[dict]:
+    return downloader.get_info(yt_link)
+
+def get_feature(yt_link: str) -> Optional[np.ndarray]:
+    return fe.extract(yt_link)
+
+def get_full_data(yt_link: str) -> Optional[dict]:
+    """
+    Metadata and features of a video with a single yt-dlp call: the metadata comes from the
+    download (or stream) itself, and the audio is decoded once.
+
+    Returns
+    -------
+        data (dict):
+            `{"feature": np.ndarray, "info": dict}`, None if the download or the extraction failed.
+    """
+    feature = fe.get_cached(yt_link)
+    if feature is not None:
+        # Only the metadata is needed: no download, decoding or inference
+        info = get_info(yt_link)
+    else:
+        data = fe.extract_with_info(yt_link)
+        feature, info = (data["feature"], data["info"]) if data is not None else (None, None)
+
+    if feature is None or info is None:
+        return None
+    return {"feature": feature, "info": info}
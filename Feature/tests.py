@@ -1,8 +1,36 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 
 # Create your tests here.
 from rest_framework.test import APITestCase
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import http.server
 import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+from Feature.utils.batcher import InferenceBatcher
+from unittest.mock import patch
+
+from Feature.extractor import FeatureExtractor
+from Feature.utils.cache import FeatureCache, TTLCache
+from Feature.utils.check_helper import Checker
+from Feature.utils.yt_music import Downloader, DownloaderConfig
+from Feature.utils.decoder import AudioDecodeError, DecodeProfile, decode_audio, get_ffmpeg
+from Feature.utils.inference import InferenceRunner
+from Feature.utils.score import Audio, dct_matrix, mel_filterbank
+from Feature.utils.utils import AudioTools
+from scipy.io import wavfile
+from unittest import skipUnless
+import librosa
+
+def make_test_signal(seconds: float, sr: int = 22050) -> np.ndarray:
+    # Deterministic 440 Hz tone with a slow vibrato and some noise
+    t = np.arange(int(sr * seconds)) / sr
+    return (0.5 * np.sin(2 * np.pi * 440 * t * (1 + 0.1 * np.sin(t))) + 0.05 * np.random.default_rng(0).standard_normal(len(t))).astype(np.float32)
 
 class FeatureTestCase(APITestCase):
     def test_get_feature(self):
@@ -31,4 +59,587 @@ class FeatureTestCase(APITestCase):
         data = {"yt_link": "https://www.youtube.com/watch?v=slvejIelzia"}
         resp = self.client.post("/feature/info", data)
         
-        self.assertEqual(resp.status_code, 500)
\ No newline at end of file
+        self.assertEqual(resp.status_code, 500)
+
+
+class InferenceBatcherTest(SimpleTestCase):
+    def test_concurrent_requests_share_batches(self):
+        calls = []
+        release = threading.Event()
+
+        def predict(X):
+            calls.append(len(X))
+            release.wait(1)
+            return X * 2
+
+        batcher = InferenceBatcher(predict, max_batch_size=8, max_wait_ms=50)
+        inputs = [np.full((1, 3), i, dtype=np.float32) for i in range(16)]
+        with ThreadPoolExecutor(16) as pool:
+            futures = [pool.submit(batcher.submit, x) for x in inputs]
+            release.set()
+            outputs = [future.result() for future in futures]
+
+        for x, y in zip(inputs, outputs):
+            self.assertTrue(np.array_equal(y, x * 2))
+        self.assertLess(len(calls), len(inputs))
+        self.assertTrue(all(size <= 8 for size in calls))
+
+        stats = batcher.stats()
+        self.assertEqual(stats["batch_size"]["count"], len(calls))
+        self.assertEqual(stats["latency_ms"]["count"], len(inputs))
+
+    def test_errors_are_propagated(self):
+        def predict(X):
+            raise RuntimeError("boom")
+
+        batcher = InferenceBatcher(predict, max_wait_ms=1)
+        with self.assertRaises(RuntimeError):
+            batcher.submit(np.zeros((1, 3)))
+        # The worker thread survives a failed batch
+        batcher.predict = lambda X: X + 1
+        self.assertTrue(np.array_equal(batcher.submit(np.zeros((1, 3))), np.ones((1, 3))))
+
+
+class InferenceRunnerTest(SimpleTestCase):
+    encoder_path = "static/feature/models/best.h5"
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from keras import models
+        cls.model = models.load_model(cls.encoder_path)
+        cls.X = np.random.default_rng(0).random((3, 130, 560, 1), dtype=np.float32)
+        cls.expected = cls.model.predict(cls.X, verbose=0)
+
+    def test_modes_match_predict(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tflite_path = os.path.join(tmp, "encoder.tflite")
+            for mode in ["direct", "compiled", "tflite"]:
+                runner = InferenceRunner(self.model, mode=mode, tflite_path=tflite_path)
+                self.assertTrue(np.allclose(runner(self.X), self.expected, atol=1e-4), mode)
+                self.assertTrue(np.allclose(runner(self.X[:1]), self.expected[:1], atol=1e-4), mode)
+            self.assertTrue(os.path.isfile(tflite_path))
+
+
+class StartupTest(SimpleTestCase):
+    def test_urlconf_does_not_import_heavy_modules(self):
+        code = (
+            "import django, sys; django.setup(); import Echo_Sence.urls; "
+            "print(','.join(m for m in ('tensorflow', 'keras', 'matplotlib', 'pandas', 'sklearn') if m in sys.modules))"
+        )
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE="Echo_Sence.settings")
+        output = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), "")
+
+    def test_encoder_is_loaded_lazily(self):
+        fe = FeatureExtractor(encoder_path=InferenceRunnerTest.encoder_path, max_wait_ms=1)
+        self.assertTrue(fe.is_available)
+        self.assertFalse(fe.is_loaded)
+
+        fe.load_in_background().join()
+        self.assertTrue(fe.is_loaded)
+        self.assertEqual(fe.batcher.submit(np.zeros((1, 130, 560, 1), dtype=np.float32)).shape, (1, 10))
+
+    def test_missing_encoder(self):
+        fe = FeatureExtractor(encoder_path="missing.h5")
+        self.assertFalse(fe.load().is_loaded)
+        self.assertIsNone(fe.extract("https://www.youtube.com/watch?v=slvejIelzio"))
+
+
+class FeatureCacheTest(SimpleTestCase):
+    def test_lru_and_disk_tiers(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = FeatureCache(tmp, max_items=2)
+            for i in range(3):
+                cache.set(f"key{i}", np.full(3, i, dtype=np.float32))
+
+            self.assertEqual(cache.stats()["items"], 2)
+            self.assertTrue(np.array_equal(cache.get("key0"), np.zeros(3)))  # evicted, read back from disk
+            self.assertTrue(np.array_equal(cache.get("key0"), np.zeros(3)))
+            self.assertIsNone(cache.get("unknown"))
+
+            stats = cache.stats()
+            self.assertEqual((stats["memory_hits"], stats["disk_hits"], stats["misses"]), (1, 1, 1))
+            self.assertFalse(cache.get("key0").flags.writeable)
+
+    def test_key_depends_on_encoder_and_params(self):
+        key = FeatureCache.make_key("slvejIelzio", "v1", {"n_mfcc": 80})
+        self.assertEqual(key, FeatureCache.make_key("slvejIelzio", "v1", {"n_mfcc": 80}))
+        self.assertNotEqual(key, FeatureCache.make_key("slvejIelzio", "v2", {"n_mfcc": 80}))
+        self.assertNotEqual(key, FeatureCache.make_key("slvejIelzio", "v1", {"n_mfcc": 20}))
+
+    def test_video_id(self):
+        self.assertEqual(Checker.get_video_id("https://www.youtube.com/watch?v=slvejIelzio&t=10"), "slvejIelzio")
+        self.assertEqual(Checker.get_video_id("https://youtu.be/slvejIelzio"), "slvejIelzio")
+        self.assertIsNone(Checker.get_video_id("https://www.youtube.com/@channel"))
+
+    @patch.object(FeatureExtractor, "_get_audio_features", return_value=np.arange(10, dtype=np.float32))
+    @patch.object(FeatureExtractor, "_fetch", return_value=(None, {"id": "slvejIelzio"}))
+    def test_extractor_skips_download_on_hit(self, mock_fetch, mock_get_features):
+        fe = FeatureExtractor(encoder_path=InferenceRunnerTest.encoder_path, cache=FeatureCache(max_items=8))
+
+        first = fe.extract("https://www.youtube.com/watch?v=slvejIelzio")
+        second = fe.extract("https://youtu.be/slvejIelzio")
+
+        self.assertTrue(np.array_equal(first, second))
+        self.assertEqual(mock_fetch.call_count, 1)
+        self.assertEqual(mock_get_features.call_count, 1)
+        self.assertEqual(fe.cache.stats()["memory_hits"], 1)
+
+
+class StubYoutubeDL:
+    calls = 0
+    delay = 0.
+
+    def __init__(self, opts):
+        self.opts = opts
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def extract_info(self, url, download=True):
+        type(self).calls += 1
+        threading.Event().wait(self.delay)
+        video_id = Checker.get_video_id(url)
+        if video_id is None:
+            raise ValueError(f"Unsupported URL: {url}")
+        return {"id": video_id, "title": "Title", "uploader_id": "@artist", "uploader": "Artist", "timestamp": 1290166783}
+
+
+@patch("Feature.utils.yt_music.yt_dlp.YoutubeDL", StubYoutubeDL)
+class DownloaderInfoCacheTest(SimpleTestCase):
+    def setUp(self):
+        StubYoutubeDL.calls = 0
+        StubYoutubeDL.delay = 0.
+        self.downloader = Downloader(info_cache=TTLCache(ttl=60))
+
+    def test_cached_by_video_id(self):
+        info = self.downloader.get_info("https://www.youtube.com/watch?v=slvejIelzio")
+        info["title"] = "changed"
+        again = self.downloader.get_info("https://youtu.be/slvejIelzio")
+
+        self.assertEqual(StubYoutubeDL.calls, 1)
+        self.assertEqual(again.get("id"), "slvejIelzio")
+        self.assertEqual(again.get("title"), "Title")
+
+    def test_concurrent_lookups_are_coalesced(self):
+        StubYoutubeDL.delay = 0.2
+        with ThreadPoolExecutor(10) as pool:
+            infos = list(pool.map(self.downloader.get_info, ["https://www.youtube.com/watch?v=slvejIelzio"] * 10))
+
+        self.assertEqual(StubYoutubeDL.calls, 1)
+        self.assertTrue(all(info.get("id") == "slvejIelzio" for info in infos))
+        self.assertEqual(self.downloader.info_flight.coalesced, 9)
+
+    def test_errors_are_not_cached(self):
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                self.downloader.get_info("https://www.youtube.com/@channel")
+        self.assertEqual(StubYoutubeDL.calls, 2)
+
+    def test_entries_expire(self):
+        now = [0.]
+        cache = TTLCache(ttl=10, clock=lambda: now[0])
+        cache.set("key", 1)
+        self.assertEqual(cache.get("key"), 1)
+        now[0] = 11.
+        self.assertIsNone(cache.get("key"))
+
+class DownloadYoutubeDL(StubYoutubeDL):
+    """
+    Writes a fake download into the `paths.home` of its options, like yt-dlp.
+    """
+    def extract_info(self, url, download=True):
+        info = super().extract_info(url, download)
+        if download:
+            os.makedirs(self.opts["paths"]["home"], exist_ok=True)
+            with open(self.prepare_filename(info), "w") as f:
+                f.write(url)
+        return {**info, "ext": "m4a"}
+
+    def prepare_filename(self, info, outtmpl=None):
+        return os.path.join(self.opts["paths"]["home"], f"{info['id']}.m4a")
+
+
+@patch("Feature.utils.yt_music.yt_dlp.YoutubeDL", DownloadYoutubeDL)
+class DownloaderConcurrencyTest(SimpleTestCase):
+    def setUp(self):
+        DownloadYoutubeDL.delay = 0.02
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    @staticmethod
+    def link(i):
+        return f"https://www.youtube.com/watch?v={i:011d}"
+
+    def test_parallel_downloads(self):
+        downloader = Downloader(max_concurrency=3)
+        n = 64
+
+        def download(i):
+            to = os.path.join(self.tmp.name, str(i))
+            return i, downloader.get_full_data(self.link(i), to=to, quiet=i % 2 == 0, to_mp3=False)
+
+        with ThreadPoolExecutor(16) as pool:
+            results = list(pool.map(download, range(n)))
+
+        for i, data in results:
+            # Each download lands in the directory of its own call
+            self.assertEqual(data["output_path"], os.path.abspath(os.path.join(self.tmp.name, str(i), "temp", f"{i:011d}.m4a")))
+            with open(data["output_path"]) as f:
+                self.assertEqual(f.read(), self.link(i))
+            self.assertEqual(data["info"]["id"], f"{i:011d}")
+        self.assertEqual(downloader.peak, 3)
+        self.assertEqual(downloader.active, 0)
+        self.assertEqual(downloader.info_cache.stats()["items"], n)
+
+    def test_failures_release_slots(self):
+        downloader = Downloader(max_concurrency=2)
+        with ThreadPoolExecutor(8) as pool:
+            futures = [pool.submit(downloader.download, "https://www.youtube.com/@channel", self.tmp.name, True, False) for _ in range(8)]
+        self.assertTrue(all(isinstance(future.exception(), ValueError) for future in futures))
+        self.assertEqual(downloader.active, 0)
+        self.assertEqual(downloader.download("https://youtu.be/slvejIelzio", to=self.tmp.name, to_mp3=False), os.path.join(self.tmp.name, "temp", "slvejIelzio.m4a"))
+
+    def test_config_is_immutable(self):
+        downloader = Downloader(download_range=(0., 30.), max_concurrency=2)
+        derived = downloader.with_options(download_range=(60., 90.))
+
+        self.assertEqual(downloader.download_range, (0., 30.))
+        self.assertEqual(derived.download_range, (60., 90.))
+        self.assertEqual(derived.config.max_concurrency, 2)
+        self.assertIs(derived.info_cache, downloader.info_cache)
+        self.assertEqual(Downloader().config, DownloaderConfig())
+        with self.assertRaises(AttributeError):
+            downloader.config.download_range = (0., 10.)
+        with self.assertRaises(ValueError):
+            Downloader(max_concurrency=0)
+
+    def test_extractor_uses_its_downloader(self):
+        downloader = Downloader(download_range=(60., 90.))
+        fe = FeatureExtractor(encoder_path=InferenceRunnerTest.encoder_path, downloader=downloader)
+
+        self.assertEqual(fe.mfcc_params["download_range"], [60., 90.])
+        self.assertEqual(FeatureExtractor(encoder_path=InferenceRunnerTest.encoder_path).mfcc_params["download_range"], [30., 60.])
+
+class SegmentStatsTest(SimpleTestCase):
+    @staticmethod
+    def legacy(data):
+        # The previous `get_stats_2D`: float64, one scipy / numpy pass per statistic
+        from scipy.stats import kurtosis, skew
+
+        data = data.astype(np.float64)
+        return np.array([
+            kurtosis(data, axis=2), np.max(data, axis=2), np.mean(data, axis=2), np.median(data, axis=2),
+            np.min(data, axis=2), skew(data, axis=2), np.std(data, axis=2)
+        ])
+
+    def setUp(self):
+        db = AudioTools.get_db(librosa.feature.mfcc(y=make_test_signal(30), sr=22050, n_mfcc=80))
+        # Constant (padding) segments included
+        self.data = np.pad(db, ((0, 0), (0, 20 - db.shape[-1] % 10))).reshape(80, -1, 10)
+
+    def assertStatsClose(self, expected, actual, rtol, atol):
+        self.assertEqual(actual.shape, expected.shape)
+        for e, a in zip(expected, actual):
+            self.assertTrue(np.array_equal(np.isnan(e), np.isnan(a)))
+            np.testing.assert_allclose(a[~np.isnan(a)], e[~np.isnan(e)], rtol=rtol, atol=atol)
+
+    def test_matches_previous_implementation(self):
+        stats = np.array(AudioTools.get_stats_2D(self.data))
+
+        self.assertEqual(stats.dtype, np.float32)
+        self.assertTrue(np.isnan(stats[0, :, -1]).all())
+        self.assertStatsClose(self.legacy(self.data), stats, rtol=1e-4, atol=1e-4)
+
+    def test_float64(self):
+        stats = np.array(AudioTools.get_stats_2D(self.data, dtype=np.float64))
+        self.assertStatsClose(self.legacy(self.data), stats, rtol=1e-10, atol=1e-10)
+
+    def test_odd_segments_and_any_shape(self):
+        data = np.random.default_rng(1).standard_normal((3, 4, 5, 7)).astype(np.float32)
+        stats = np.array(AudioTools.get_stats_2D(data))
+
+        self.assertEqual(stats.shape, (7, 3, 4, 5))
+        np.testing.assert_allclose(stats[3], np.median(data, axis=-1), rtol=1e-6)
+        self.assertStatsClose(self.legacy(data.reshape(12, 5, 7)), stats.reshape(7, 12, 5), rtol=1e-4, atol=1e-4)
+
+class SegmentationTest(SimpleTestCase):
+    def setUp(self):
+        self.audio = Audio(y=make_test_signal(5), sr=22050)
+
+    def test_views(self):
+        data = np.arange(2 * 27, dtype=np.float32).reshape(2, 27)
+
+        segments, tail = AudioTools.segment(data, 10)
+        self.assertEqual(segments.shape, (2, 2, 10))
+        self.assertTrue(np.shares_memory(segments, data) and np.shares_memory(tail, data))
+        self.assertTrue(np.array_equal(tail, data[:, 20:]))
+
+        segments, tail = AudioTools.segment(data, 10, hop=5)
+        self.assertEqual(segments.shape, (2, 4, 10))
+        self.assertTrue(np.array_equal(segments[:, 1], data[:, 5:15]))
+        self.assertTrue(np.array_equal(tail, data[:, 20:]))
+
+        segments, tail = AudioTools.segment(data[:, :20], 10)
+        self.assertEqual((segments.shape, tail.shape), ((2, 2, 10), (2, 0)))
+        segments, tail = AudioTools.segment(data[:, :4], 10)
+        self.assertEqual((segments.shape, tail.shape), ((2, 0, 10), (2, 4)))
+
+    def test_every_frame_is_covered(self):
+        data = np.arange(27)
+        for hop in range(1, 11):
+            segments, tail = AudioTools.segment(data, 10, hop=hop)
+            self.assertEqual(set(segments.ravel()) | set(tail), set(data), hop)
+        # Larger hops would skip the frames between the segments and the last ones
+        with self.assertRaises(ValueError):
+            AudioTools.segment(data, 5, hop=10)
+        with self.assertRaises(ValueError):
+            AudioTools.get_segment_stats(data[None].astype(np.float32), 5, hop=10, tail="partial")
+
+    def test_ragged_tail_matches_padding(self):
+        db = np.random.default_rng(0).standard_normal((80, 1292)).astype(np.float32) - 40
+        padded = np.pad(db, ((0, 0), (0, 8))).reshape(80, -1, 10)
+
+        stats = np.array(AudioTools.get_segment_stats(db, 10))
+        np.testing.assert_array_equal(stats, np.array(AudioTools.get_stats_2D(padded)))
+        partial = np.array(AudioTools.get_segment_stats(db, 10, tail="partial"))
+        np.testing.assert_allclose(partial[:, :, -1], np.array(AudioTools.get_stats_2D(db[:, None, 1290:]))[:, :, 0])
+        self.assertEqual(np.array(AudioTools.get_segment_stats(db, 10, tail="drop")).shape, (7, 80, 129))
+
+    def test_exact_multiple_is_not_padded(self):
+        db = np.random.default_rng(0).standard_normal((80, 1300)).astype(np.float32)
+        stats = np.array(AudioTools.get_segment_stats(db, 10))
+
+        self.assertEqual(stats.shape, (7, 80, 130))
+        self.assertFalse(np.isnan(stats).any())
+
+    def test_every_feature(self):
+        n_frames = AudioTools.get_db(librosa.feature.chroma_cqt(y=self.audio.y, sr=self.audio.sr)).shape[-1]
+        n_segments = -(-n_frames // 10)
+        for name, n_features in (("get_cqt", 12), ("get_cens", 12), ("get_mel", 128)):
+            _, _, stats = getattr(self.audio, name)(segment_size=10)
+            self.assertEqual(np.array(stats).shape, (7, n_features, n_segments), name)
+        _, _, stats = self.audio.get_mfcc(20, segment_size=10, segment_hop=5, segment_tail="drop")
+        self.assertEqual(np.array(stats).shape, (7, 20, (n_frames - 10) // 5 + 1))
+
+    def test_encoder_input_has_130_segments(self):
+        fe = FeatureExtractor(encoder_path=InferenceRunnerTest.encoder_path)
+        for n_frames in (1292, 1300, 1310):
+            audio = Audio(y=np.resize(self.audio.y, (n_frames - 1) * 512), sr=self.audio.sr)
+            self.assertEqual(fe._mfcc_to_X(audio).shape, (1, 130, 7 * 80, 1))
+
+class AudioMemoTest(SimpleTestCase):
+    def setUp(self):
+        self.sr = 22050
+        self.y = make_test_signal(10, self.sr)
+
+    def test_matches_librosa(self):
+        audio = Audio(y=self.y, sr=self.sr)
+
+        np.testing.assert_allclose(audio.mel(), librosa.feature.melspectrogram(y=self.y, sr=self.sr), rtol=1e-5)
+        np.testing.assert_allclose(audio.mfcc(80), librosa.feature.mfcc(y=self.y, sr=self.sr, n_mfcc=80), atol=1e-3)
+        np.testing.assert_allclose(audio.chroma_cqt(), librosa.feature.chroma_cqt(y=self.y, sr=self.sr), atol=1e-6)
+        np.testing.assert_allclose(audio.chroma_cens(), librosa.feature.chroma_cens(y=self.y, sr=self.sr), atol=1e-6)
+        np.testing.assert_array_equal(audio.get_tempo(), librosa.feature.tempo(y=self.y, sr=self.sr))
+
+    def test_one_stft_for_many_features(self):
+        audio = Audio(y=self.y, sr=self.sr)
+        with patch("Feature.utils.score.librosa.stft", wraps=librosa.stft) as stft:
+            _, _, mfcc_stats = audio.get_mfcc(80, segment_size=10)
+            audio.get_mfcc(20)
+            audio.get_mel(segment_size=10)
+            audio.get_tempo()
+        self.assertEqual(stft.call_count, 1)
+
+        # Memoized arrays are shared, callers cannot modify them
+        self.assertIs(audio.mel(), audio.mel())
+        with self.assertRaises(ValueError):
+            audio.mel()[0, 0] = 0.
+        _, _, again = Audio(y=self.y, sr=self.sr).get_mfcc(80, segment_size=10)
+        np.testing.assert_array_equal(np.array(mfcc_stats), np.array(again))
+
+    def test_filterbanks_are_cached(self):
+        self.assertIs(mel_filterbank(self.sr, 2048, 128), mel_filterbank(self.sr, 2048, 128))
+        self.assertIs(dct_matrix(80, 128), dct_matrix(80, 128))
+        self.assertIsNot(mel_filterbank(self.sr, 2048, 128), mel_filterbank(44100, 2048, 128))
+        np.testing.assert_allclose(dct_matrix(80, 128) @ dct_matrix(128, 128).T, np.eye(128, dtype=np.float32)[:80], atol=1e-5)
+
+@skipUnless(get_ffmpeg(), "ffmpeg is not installed")
+class AudioDecoderTest(SimpleTestCase):
+    def setUp(self):
+        self.sr = 22050
+        t = np.arange(self.sr * 4) / self.sr
+        self.y = (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+        fd, self.path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        wavfile.write(self.path, self.sr, self.y)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_decode_file(self):
+        y, sr = decode_audio(self.path, sr=self.sr)
+        self.assertEqual(sr, self.sr)
+        self.assertEqual(y.dtype, np.float32)
+        self.assertTrue(np.allclose(y, self.y, atol=1e-6))
+
+    def test_decode_bytes_window_and_resample(self):
+        with open(self.path, "rb") as f:
+            y, sr = decode_audio(f.read(), sr=11025, offset=1., duration=2.)
+        self.assertEqual(sr, 11025)
+        self.assertEqual(len(y), 2 * 11025)
+
+    def test_matches_librosa(self):
+        y, sr = decode_audio(self.path, duration=3.)
+        expected, expected_sr = librosa.load(self.path, duration=3.)
+        self.assertEqual(sr, expected_sr)
+        self.assertTrue(np.allclose(y, expected, atol=1e-5))
+
+    def test_invalid_audio(self):
+        with self.assertRaises(AudioDecodeError):
+            decode_audio(b"not audio")
+
+    def test_extractor_decodes_to_audio(self):
+        fe = FeatureExtractor(encoder_path="static/feature/models/best.h5", cache=FeatureCache())
+        audio = fe._load_audio(self.path)
+        self.assertTrue(np.allclose(audio.y, self.y, atol=1e-6))
+        self.assertEqual(audio.sr, self.sr)
+
+        # Features decoded differently are cached separately
+        librosa_fe = FeatureExtractor(encoder_path="static/feature/models/best.h5", cache=FeatureCache(), decoder="librosa")
+        yt_link = "https://youtu.be/slvejIelzio"
+        self.assertNotEqual(fe.cache_key(yt_link), librosa_fe.cache_key(yt_link))
+        soxr_fe = FeatureExtractor(encoder_path="static/feature/models/best.h5", cache=FeatureCache(), resampler="soxr")
+        self.assertNotEqual(fe.cache_key(yt_link), soxr_fe.cache_key(yt_link))
+
+    def test_decode_profiles(self):
+        # 44.1 kHz stereo source, decoded to a 22050 Hz mono window
+        t = np.arange(44100 * 4) / 44100
+        stereo = np.stack([np.sin(2 * np.pi * 440 * t), 0.5 * np.sin(2 * np.pi * 660 * t)], axis=1).astype(np.float32) * 0.5
+        wavfile.write(self.path, 44100, stereo)
+        expected, _ = librosa.load(self.path, offset=1., duration=2.)
+
+        profiles = [
+            DecodeProfile(), DecodeProfile(resampler="soxr"),
+            DecodeProfile(backend="librosa"), DecodeProfile(backend="librosa", resampler="soxr_lq"), DecodeProfile(backend="librosa", resampler="polyphase")
+        ]
+        for profile in profiles:
+            y, sr = profile.load(self.path, offset=1., duration=2.)
+            self.assertEqual((sr, y.shape, y.dtype), (22050, expected.shape, np.float32), profile)
+            # Resampler differences are at the edges of the window mostly
+            self.assertLess(np.abs(y - expected)[100:-100].max(), 1e-2, profile)
+
+        y, sr = DecodeProfile(sr=16000, mono=False).load(self.path, duration=1.)
+        self.assertEqual((sr, y.shape), (16000, (2, 16000)))
+        self.assertEqual(Audio(self.path, duration=1., profile=DecodeProfile(sr=11025)).y.shape, (11025,))
+
+
+class RangeRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves `content` with HTTP range support, and records the requests.
+    """
+    content = b""
+    requests = []
+
+    def do_GET(self):
+        start, end = 0, len(self.content) - 1
+        range_header = self.headers.get("Range")
+        if range_header:
+            first, last = range_header.removeprefix("bytes=").split("-")
+            start, end = int(first), int(last) if last else end
+        body = self.content[start:end + 1]
+        type(self).requests.append({"range": range_header, "x-test": self.headers.get("X-Test")})
+
+        self.send_response(206 if range_header else 200)
+        self.send_header("Content-Type", "audio/mp4")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(len(body)))
+        if range_header:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(self.content)}")
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@skipUnless(get_ffmpeg(), "ffmpeg is not installed")
+class StreamingExcerptTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # 3 minutes of AAC, index at the start like YouTube m4a streams
+        sr = 22050
+        t = np.arange(sr * 180) / sr
+        y = (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "audio.m4a")
+            subprocess.run(
+                [get_ffmpeg(), "-loglevel", "error", "-f", "f32le", "-ar", str(sr), "-ac", "1", "-i", "pipe:0",
+                 "-c:a", "aac", "-movflags", "+faststart", path],
+                input=y.tobytes(), check=True
+            )
+            with open(path, "rb") as f:
+                RangeRequestHandler.content = f.read()
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RangeRequestHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/audio.m4a"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        RangeRequestHandler.requests = []
+        url = self.url
+
+        class StreamYoutubeDL(StubYoutubeDL):
+            def extract_info(self, link, download=True):
+                info = super().extract_info(link, download)
+                return {**info, "url": url, "http_headers": {"X-Test": "1"}}
+
+        patcher = patch("Feature.utils.yt_music.yt_dlp.YoutubeDL", StreamYoutubeDL)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.downloader = Downloader(info_cache=TTLCache(ttl=60))
+
+    def test_fetch_excerpt_reads_only_the_range(self):
+        data = self.downloader.fetch_excerpt("https://www.youtube.com/watch?v=slvejIelzio")
+
+        start, end = self.downloader.download_range
+        self.assertEqual(len(data["y"]), int((end - start) * data["sr"]))
+        self.assertEqual(data["info"]["id"], "slvejIelzio")
+        self.assertEqual(self.downloader.info_cache.get("slvejIelzio")["id"], "slvejIelzio")
+        self.assertTrue(all(request["x-test"] == "1" for request in RangeRequestHandler.requests))
+        # Seeks to the excerpt (past the index) instead of reading the file from the start
+        self.assertTrue(any(request["range"] not in (None, "bytes=0-") for request in RangeRequestHandler.requests))
+
+    def test_concurrent_excerpts(self):
+        with ThreadPoolExecutor(4) as pool:
+            results = list(pool.map(self.downloader.fetch_excerpt, ["https://www.youtube.com/watch?v=slvejIelzio"] * 4))
+        self.assertTrue(all(np.array_equal(result["y"], results[0]["y"]) for result in results))
+
+    def test_extractor_leaves_no_files(self):
+        with tempfile.TemporaryDirectory() as runtime_dir:
+            for download_mode in ("stream", "file"):
+                fe = FeatureExtractor(encoder_path=InferenceRunnerTest.encoder_path, runtime_dir=runtime_dir, download_mode=download_mode)
+                with patch.object(FeatureExtractor, "_download", side_effect=self.failing_download):
+                    with self.assertRaises(RuntimeError):
+                        with patch.object(FeatureExtractor, "_get_audio_features", side_effect=RuntimeError("inference failed")):
+                            fe.extract("https://www.youtube.com/watch?v=slvejIelzio")
+                self.assertEqual(os.listdir(runtime_dir), [])
+
+    @staticmethod
+    def failing_download(yt_link, to):
+        os.makedirs(os.path.join(to, "temp"))
+        open(os.path.join(to, "temp", "slvejIelzio.m4a"), "wb").close()
+        raise RuntimeError("download failed")
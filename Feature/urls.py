@@ -4,5 +4,6 @@ from . import views
 urlpatterns = [
     path('', views.get_feature, name='feature'),
     path('/info', views.get_info, name='info'),
-    path('/full', views.get_full_data, name='full')
+    path('/full', views.get_full_data, name='full'),
+    path('/stats', views.get_stats, name='feature_stats'),
 ]
\ No newline at end of file
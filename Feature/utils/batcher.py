@@ -0,0 +1,133 @@
+import bisect
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+import numpy as np
+
+logger = logging.getLogger("Feature")
+
+class Histogram:
+    """
+    Thread-safe histogram with fixed bucket upper bounds (the last bucket is unbounded).
+    """
+    def __init__(self, bounds: list[float]):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            labels = [f"<={bound:g}" for bound in self.bounds] + [f">{self.bounds[-1]:g}"]
+            return {
+                "buckets": dict(zip(labels, self.counts)),
+                "count": self.count,
+                "mean": self.sum / self.count if self.count else None,
+            }
+
+class InferenceBatcher:
+    """
+    Micro-batching layer in front of a model.
+
+    Callers submit one input (with a leading batch axis of size 1 or more) and block until its
+    output is ready. A background thread collects pending inputs for at most `max_wait_ms`
+    milliseconds, or until `max_batch_size` rows are pending, runs a single forward pass on the
+    concatenated batch and hands each caller its own slice of the output.
+
+    Attributes
+    -------
+        predict (Callable[[np.ndarray], np.ndarray]):
+            The batched forward pass.
+        batch_sizes (Histogram):
+            The number of rows per forward pass.
+        latency (Histogram):
+            The time (ms) between `submit` and the result, per caller.
+        inference_time (Histogram):
+            The duration (ms) of each forward pass.
+    """
+    BATCH_SIZE_BOUNDS = [1, 2, 4, 8, 16, 32, 64]
+    LATENCY_BOUNDS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+
+    def __init__(self, predict: Callable[[np.ndarray], np.ndarray], max_batch_size: int = 16, max_wait_ms: float = 5):
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.batch_sizes = Histogram(self.BATCH_SIZE_BOUNDS)
+        self.latency = Histogram(self.LATENCY_BOUNDS)
+        self.inference_time = Histogram(self.LATENCY_BOUNDS)
+        self._queue: "queue.Queue[tuple[np.ndarray, Future, float]]" = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._thread_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="InferenceBatcher", daemon=True)
+                    self._thread.start()
+
+    def submit(self, x: np.ndarray) -> np.ndarray:
+        """
+        Run the model on `x` as part of the next batch, and wait for its output.
+        """
+        self._ensure_started()
+        future = Future()
+        self._queue.put((x, future, time.perf_counter()))
+        return future.result()
+
+    def _collect(self) -> list[tuple[np.ndarray, Future, float]]:
+        pending = [self._queue.get()]
+        rows = len(pending[0][0])
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while rows < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            pending.append(item)
+            rows += len(item[0])
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            inputs = [x for x, _, _ in pending]
+            try:
+                start = time.perf_counter()
+                outputs = self.predict(np.concatenate(inputs, axis=0))
+                self.inference_time.observe((time.perf_counter() - start) * 1000)
+                self.batch_sizes.observe(sum(len(x) for x in inputs))
+            except Exception as e:
+                logger.error(f"Batched inference failed: {str(e)}")
+                for _, future, _ in pending:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for x, future, submitted_at in pending:
+                future.set_result(outputs[offset:offset + len(x)])
+                offset += len(x)
+                self.latency.observe((time.perf_counter() - submitted_at) * 1000)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batch_size": self.batch_sizes.snapshot(),
+            "latency_ms": self.latency.snapshot(),
+            "inference_ms": self.inference_time.snapshot(),
+        }
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+class FeatureCache:
+    """
+    Two-tier cache of extracted feature vectors.
+
+    Keys are content addresses built by `make_key` from the video ID, the encoder version and the
+    feature extraction parameters, so a new encoder or new MFCC settings never reads stale vectors.
+
+    Tiers
+    -------
+        memory:
+            A bounded LRU of at most `max_items` vectors.
+        disk (optional):
+            One `.npy` file per key under `directory`, written atomically. Disk hits are promoted
+            to the memory tier.
+    """
+    def __init__(self, directory: Optional[str] = None, max_items: int = 1024):
+        self.directory = directory
+        self.max_items = max_items
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(video_id: str, encoder_version: str, params: dict) -> str:
+        payload = json.dumps([video_id, encoder_version, params], sort_keys=True)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.npy")
+
+    def _remember(self, key: str, value: np.ndarray):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return value
+
+        value = None
+        if self.directory is not None:
+            try:
+                value = np.load(self._path(key), allow_pickle=False)
+            except (OSError, ValueError):
+                value = None
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            value.flags.writeable = False
+            self._remember(key, value)
+            self.disk_hits += 1
+            return value
+
+    def set(self, key: str, value: np.ndarray):
+        value = np.array(value, copy=True)
+        value.flags.writeable = False
+        with self._lock:
+            self._remember(key, value)
+
+        if self.directory is not None:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".npy.tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.save(f, value)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "items": len(self._memory),
+                "max_items": self.max_items,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else None,
+            }
+
+class TTLCache:
+    """
+    Thread-safe mapping whose entries expire `ttl` seconds after they were set,
+    bounded to `max_items` entries (the oldest entries are dropped first).
+    """
+    def __init__(self, ttl: float = 600, max_items: int = 1024, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_items = max_items
+        self.clock = clock
+        self._items: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[0] > self.clock():
+                self.hits += 1
+                return item[1]
+            if item is not None:
+                del self._items[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: str, value):
+        with self._lock:
+            self._items[key] = (self.clock() + self.ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"items": len(self._items), "ttl": self.ttl, "hits": self.hits, "misses": self.misses}
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key: the first caller runs the function, the others
+    wait for its result (or exception) instead of running it again.
+    """
+    def __init__(self):
+        self._calls: dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key: str, func: Callable[[], Any]):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = func()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
@@ -1,8 +1,32 @@
 import re
+from urllib.parse import parse_qs, urlparse
 
 class Checker:
     youtube_regex = re.compile(r'^(https?://)?(www\.)?(youtube\.com|youtu\.be)/.+$')
+    video_id_regex = re.compile(r'^[A-Za-z0-9_-]{11}$')
     
     @classmethod
     def is_yt_link(cls, yt_link: str):
-        return cls.youtube_regex.match(yt_link) is not None
\ No newline at end of file
+        return cls.youtube_regex.match(yt_link) is not None
+    
+    @classmethod
+    def get_video_id(cls, yt_link: str):
+        """
+        Extract the video ID of a YouTube link without any network request.
+        Supports `watch?v=`, `youtu.be/`, `/shorts/`, `/embed/` and `/live/` links. Returns None otherwise.
+        """
+        if not yt_link or not cls.is_yt_link(yt_link):
+            return None
+        url = urlparse(yt_link if "://" in yt_link else f"https://{yt_link}")
+        parts = [part for part in url.path.split("/") if part]
+        
+        if url.netloc.endswith("youtu.be"):
+            video_id = parts[0] if parts else None
+        elif parts[:1] == ["watch"]:
+            video_id = parse_qs(url.query).get("v", [None])[0]
+        elif len(parts) >= 2 and parts[0] in ("shorts", "embed", "live", "v"):
+            video_id = parts[1]
+        else:
+            video_id = None
+        
+        return video_id if video_id is not None and cls.video_id_regex.match(video_id) else None
@@ -0,0 +1,117 @@
+import subprocess
+from dataclasses import dataclass
+from typing import Literal, Optional, Union
+
+import numpy as np
+from pydub.utils import which
+
+class AudioDecodeError(RuntimeError):
+    pass
+
+def get_ffmpeg() -> Optional[str]:
+    return which("ffmpeg")
+
+def decode_audio(
+    source: Union[str, bytes],
+    sr: int = 22050,
+    channels: int = 1,
+    offset: float = 0.,
+    duration: Optional[float] = None,
+    headers: Optional[dict] = None,
+    resampler: Optional[str] = None,
+    ffmpeg: Optional[str] = None
+) -> tuple[np.ndarray, int]:
+    """
+    Decode any audio file or stream supported by ffmpeg into float32 PCM, in one pass and
+    without intermediate files.
+
+    Arguments
+    -------
+        source (str | bytes):
+            A file path or an http(s) URL, or the encoded bytes themselves (piped to ffmpeg).
+            A URL is read with HTTP range requests: only the `offset` / `duration` window and
+            the container index are fetched.
+        sr (int):
+            The output sampling rate, resampled by ffmpeg. `librosa.load` defaults to 22050 Hz.
+        channels (int):
+            The output channel count, 1 down-mixes to mono (the mean of the channels, as `librosa.to_mono`).
+        offset, duration (float, optional):
+            The window to decode, in seconds.
+        headers (dict, optional):
+            HTTP headers of a URL `source`.
+        resampler (str, optional):
+            The ffmpeg resampler, `"swr"` (the default) or `"soxr"`.
+
+    Returns
+    -------
+        y (np.ndarray):
+            The samples, shape `(n,)` (mono) or `(channels, n)`, in [-1, 1].
+        sr (int):
+            The sampling rate of `y`.
+    """
+    ffmpeg = ffmpeg or get_ffmpeg()
+    if ffmpeg is None:
+        raise AudioDecodeError("ffmpeg is not installed.")
+
+    piped = isinstance(source, (bytes, bytearray))
+    window = (["-ss", str(offset)] if offset else []) + (["-t", str(duration)] if duration is not None else [])
+    command = [ffmpeg, "-nostdin", "-hide_banner", "-loglevel", "error"]
+    # Files are seeked before decoding; pipes cannot seek, the window is cut after decoding
+    if piped:
+        command += ["-i", "pipe:0", *window, "-vn"]
+    else:
+        if headers and source.startswith(("http://", "https://")):
+            command += ["-headers", "".join(f"{key}: {value}\r\n" for key, value in headers.items())]
+        command += [*window, "-i", source, "-vn"]
+    # rematrix_maxval=1: down-mix to the mean of the channels like librosa (ffmpeg's default is 0.707 * (L + R))
+    command += ["-af", "aresample=" + (f"resampler={resampler}:" if resampler is not None else "") + "rematrix_maxval=1"]
+    command += ["-ac", str(channels), "-ar", str(sr), "-f", "f32le", "-acodec", "pcm_f32le", "pipe:1"]
+
+    process = subprocess.run(
+        command,
+        input=source if piped else None,
+        stdin=None if piped else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+    if process.returncode != 0:
+        raise AudioDecodeError(f"ffmpeg failed ({process.returncode}): {process.stderr.decode(errors='replace').strip()}")
+
+    # np.frombuffer is read-only
+    y = np.frombuffer(process.stdout, dtype=np.float32).copy()
+    if channels > 1:
+        y = y.reshape(-1, channels).T
+    return y, sr
+
+@dataclass(frozen=True)
+class DecodeProfile:
+    """
+    How audio is decoded into the signal the features are computed from: one pass straight to
+    the target rate and channel count, and only the `offset` / `duration` window.
+
+    Attributes
+    -------
+        backend (Literal["ffmpeg", "librosa"]):
+            `"ffmpeg"` resamples while decoding (see `decode_audio`), `"librosa"` uses `librosa.load`.
+        sr (int):
+            The target sampling rate.
+        mono (bool):
+            Down-mix to one channel while decoding.
+        resampler (str, optional):
+            None for the backend default (ffmpeg `"swr"`, librosa `"soxr_hq"`). ffmpeg: `"swr"` or
+            `"soxr"`; librosa: any `res_type`, e.g. `"soxr_lq"` or `"polyphase"` (faster).
+    """
+    backend: Literal["ffmpeg", "librosa"] = "ffmpeg"
+    sr: int = 22050
+    mono: bool = True
+    resampler: Optional[str] = None
+
+    def load(self, source: str, offset: float = 0., duration: Optional[float] = None) -> tuple[np.ndarray, int]:
+        """
+        Decode `duration` seconds of `source` from `offset`, see `decode_audio`.
+        """
+        if self.backend == "ffmpeg":
+            return decode_audio(source, sr=self.sr, channels=1 if self.mono else 2, offset=offset, duration=duration, resampler=self.resampler)
+
+        import librosa
+        return librosa.load(source, sr=self.sr, mono=self.mono, offset=offset, duration=duration, res_type=self.resampler or "soxr_hq")
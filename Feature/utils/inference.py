@@ -0,0 +1,103 @@
+import logging
+import os
+from typing import Literal
+
+import numpy as np
+
+logger = logging.getLogger("Feature")
+
+InferenceMode = Literal["predict", "direct", "compiled", "tflite"]
+
+class InferenceRunner:
+    """
+    Run a Keras encoder on a batch of inputs.
+
+    Modes
+    -------
+        predict:
+            `model.predict`, which builds a `tf.data` pipeline on every call.
+        direct:
+            Eager call of the model, `model(X, training=False)`.
+        compiled:
+            A `tf.function` traced once with a fixed input signature `(None, *model.input_shape[1:])`.
+        tflite:
+            The TFLite interpreter (CPU). The model is converted once and saved to `tflite_path`.
+
+    Every mode reshapes its input to the model input shape, so `(n, 130, 560, 1)` and
+    `(n, 130, 560)` are both accepted.
+    """
+    def __init__(self, model, mode: InferenceMode = "compiled", tflite_path: str = None, warmup: bool = True):
+        self.model = model
+        self.mode = mode
+        self.tflite_path = tflite_path
+        self.input_shape = tuple(model.input_shape[1:])
+        self._run = {
+            "predict": self._build_predict,
+            "direct": self._build_direct,
+            "compiled": self._build_compiled,
+            "tflite": self._build_tflite,
+        }[mode]()
+        if warmup:
+            self.warmup()
+
+    def __call__(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32).reshape((-1,) + self.input_shape)
+        return self._run(X)
+
+    def warmup(self):
+        """
+        Run one forward pass so that graph tracing / memory allocation does not hit the first request.
+        """
+        self(np.zeros((1,) + self.input_shape, dtype=np.float32))
+        logger.info(f"Encoder warmed up ({self.mode}).")
+
+    def _build_predict(self):
+        return lambda X: self.model.predict(X, batch_size=len(X), verbose=0)
+
+    def _build_direct(self):
+        return lambda X: np.asarray(self.model(X, training=False))
+
+    def _build_compiled(self):
+        import tensorflow as tf
+
+        signature = [tf.TensorSpec((None,) + self.input_shape, tf.float32)]
+        function = tf.function(lambda X: self.model(X, training=False), input_signature=signature)
+        return lambda X: function(X).numpy()
+
+    def _build_tflite(self):
+        import tensorflow as tf
+
+        if self.tflite_path and os.path.isfile(self.tflite_path):
+            interpreter = tf.lite.Interpreter(model_path=self.tflite_path)
+        else:
+            content = export_tflite(self.model, self.tflite_path)
+            interpreter = tf.lite.Interpreter(model_content=content)
+
+        input_index = interpreter.get_input_details()[0]["index"]
+        output_index = interpreter.get_output_details()[0]["index"]
+        state = {"batch_size": None}
+
+        def run(X):
+            if state["batch_size"] != len(X):
+                interpreter.resize_tensor_input(input_index, X.shape)
+                interpreter.allocate_tensors()
+                state["batch_size"] = len(X)
+            interpreter.set_tensor(input_index, X)
+            interpreter.invoke()
+            return interpreter.get_tensor(output_index).copy()
+
+        return run
+
+def export_tflite(model, path: str = None) -> bytes:
+    """
+    Convert a Keras model to TFLite, and save it to `path` if given.
+    """
+    import tensorflow as tf
+
+    content = tf.lite.TFLiteConverter.from_keras_model(model).convert()
+    if path:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content)
+        logger.info(f"TFLite model saved to {os.path.abspath(path)}")
+    return content
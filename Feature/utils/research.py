@@ -0,0 +1,251 @@
+import os
+import ast
+import sys
+
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.axes import Axes
+from matplotlib.figure import Figure
+from matplotlib.colors import Normalize
+from matplotlib.cm import ScalarMappable
+import pandas as pd
+
+from typing import Literal, Callable
+from sklearn.preprocessing import LabelEncoder
+from keras.src.models import Model
+from keras.src.callbacks import Callback
+from sklearn.manifold import TSNE
+
+# Dataset loading, training and plotting helpers. Not imported by the web application.
+
+class FMA:
+    def __init__(self):
+        self.features = None
+        self.echonest = None
+        self.genres = None
+        self.tracks = None
+    
+    def load(self, filepath: str):
+        filename = os.path.basename(filepath)
+        
+        if 'features' in filename:
+            self.features = pd.read_csv(filepath, index_col=0, header=[0, 1, 2])
+            return self.features
+
+        if 'echonest' in filename:
+            self.echonest = pd.read_csv(filepath, index_col=0, header=[0, 1, 2])
+            return self.echonest
+
+        if 'genres' in filename:
+            self.genres = pd.read_csv(filepath, index_col=0)
+            return self.genres
+
+        if 'tracks' in filename:
+            tracks = pd.read_csv(filepath, index_col=0, header=[0, 1])
+            
+            # 將 csv 內的字串轉換為正確的資料型態
+            COLUMNS = [('track', 'tags'), ('album', 'tags'), ('artist', 'tags'),
+                    ('track', 'genres'), ('track', 'genres_all')]
+            for column in COLUMNS:
+                tracks[column] = tracks[column].map(ast.literal_eval)
+
+            # 將 pd.table 內有關時間的欄位轉換為 datetime
+            COLUMNS = [('track', 'date_created'), ('track', 'date_recorded'),
+                    ('album', 'date_created'), ('album', 'date_released'),
+                    ('artist', 'date_created'), ('artist', 'active_year_begin'),
+                    ('artist', 'active_year_end')]
+            for column in COLUMNS:
+                tracks[column] = pd.to_datetime(tracks[column])
+
+            
+            SUBSETS = ('small', 'medium', 'large')
+            tracks['set', 'subset'] = tracks['set', 'subset'].astype(
+                        pd.CategoricalDtype(categories=SUBSETS, ordered=True))
+
+            COLUMNS = [('track', 'genre_top'), ('track', 'license'),
+                    ('album', 'type'), ('album', 'information'),
+                    ('artist', 'bio')]
+            for column in COLUMNS:
+                tracks[column] = tracks[column].astype('category')
+
+            self.tracks = tracks
+            
+            return self.tracks
+    
+    def train_data(self, size: Literal['small', 'medium'], feature: Literal['mfcc', 'chroma_cens']='mfcc'):
+        size = self.tracks['set', 'subset'] <= size
+        
+        train = self.tracks['set', 'split'] == 'training'
+        val = self.tracks['set', 'split'] == 'validation'
+        test = self.tracks['set', 'split'] == 'test'
+
+        X_train = self.features.loc[size & train, feature]
+        X_val = self.features.loc[size & val, feature]
+        X_test = self.features.loc[size & test, feature]
+
+        Y_train = self.tracks.loc[size & train, ('track', 'genre_top')]
+        Y_val = self.tracks.loc[size & val, ('track', 'genre_top')]
+        Y_test = self.tracks.loc[size & test, ('track', 'genre_top')]
+        
+        return (X_train, Y_train), (X_val, Y_val), (X_test, Y_test)
+    
+    def top_genres(self, size=Literal['small', 'medium'], show=False):
+        size = self.tracks['set', 'subset'] <= size
+        top_genres = self.tracks.loc[size, ('track', 'genre_top')].unique()
+        
+        if show:
+            print("Genres".ljust(20, " ") + " |  Count")
+            print("-"*28)
+            for tg in top_genres:
+                count = len(self.tracks.loc[size & (self.tracks['track', 'genre_top'] == tg)])
+                print(f"{tg.ljust(20, ' ')} | \t{count}")
+        
+        return top_genres
+
+class CustomProgressBar(Callback):
+    def __init__(self, total_epoch: int, name: str):
+        self.total_epoch = total_epoch
+        self.name = name
+        self.count = 1
+    
+    def on_epoch_begin(self, epoch, logs=None):
+        pass
+    
+    def on_epoch_end(self, epoch, logs=None):
+        # 打印簡單的 epoch 進度條
+        sys.stdout.write(f'\rEpoch {epoch+1}/{self.total_epoch} - loss: {logs["loss"]:.4f} - val_loss: {logs["val_loss"]:.4f}')
+        
+    def on_batch_begin(self, batch, logs=None):
+        pass
+    
+    def on_batch_end(self, batch, logs=None):
+        pass
+    
+    def on_train_begin(self, logs=None):
+        sys.stdout.write(f'# {self.name}\n')
+    
+    def on_train_end(self, logs=None):
+        pass
+
+class TestModel:
+    class ModelSettings:
+        def __init__(self, epochs: int=50, batch_size: int=32):
+            self.epochs = epochs
+            self.batch_size = batch_size
+            
+            
+    def __init__(self, func: Callable, settings: tuple[ModelSettings], name:str="Model"):
+        self.model_func = func
+        self.settings = settings
+        self.name = name
+        
+    def _draw_loss(self, hist, fig: Figure=None, ax: Axes=None):
+        if fig is None or ax is None:
+            fig, ax = plt.subplots(1, 2, figsize=(12, 5))
+            fig.suptitle('Loss Over Time', fontsize=20)
+        
+        ax[0].plot(hist.history['loss'], label='Training Loss')
+        ax[0].set_xlabel('Epochs')
+        ax[0].set_ylabel('Loss')
+        ax[0].legend()
+
+        ax[1].plot(hist.history['val_loss'], label='Validation Loss')
+        ax[1].set_xlabel('Epochs')
+        ax[1].set_ylabel('Loss')
+        ax[1].legend()
+
+        plt.tight_layout()
+        
+    def _show_loss(self, **kwargs):
+        self._draw_loss(**kwargs)
+        plt.show()
+        
+    def _draw_tsne(self, X_test, Y_test, encoder: Model, fig: Figure=None, ax: Axes=None, output_shape=20):
+        if fig is None or ax is None:
+            fig, ax = plt.subplots(1, 1)
+            fig.suptitle('2D Visualization of Encoded Features', fontsize=20)
+        
+        ax.set_box_aspect(1) 
+        encoded_features = encoder.predict(X_test)
+        tsne = TSNE(n_components=2)
+        encoded_2d = tsne.fit_transform(encoded_features.reshape(-1, output_shape))
+        
+        im = ax.scatter(encoded_2d[:, 0], encoded_2d[:, 1], c=Y_test, cmap='inferno', alpha=1)
+        
+        norm = Normalize(vmin=np.min(Y_test), vmax=np.max(Y_test))
+        sm = ScalarMappable(norm=norm, cmap='inferno')
+        sm.set_array([])
+        
+        fig.colorbar(sm, ax=ax)
+        
+    def _show_tsne(self, **kwargs):
+        Y = kwargs.get("Y_test")
+        kwargs["Y_test"] = self.encode_labels(Y)
+        self._draw_tsne(**kwargs)
+        plt.show()
+    
+    def encode_labels(self, Y):
+        le = LabelEncoder()
+        le.fit(Y)
+        Y = le.transform(Y)
+        return Y
+    
+    def test(self, x, y, val=None, validation_split=None, X_test=None, Y_test=None, name: str = "Model", output_shape=20):
+        
+        assert X_test is not None
+        assert Y_test is not None
+        assert val is not None or validation_split is not None
+        
+        count = len(self.settings)
+        fig_loss, ax_loss = plt.subplots(count, 2, figsize=(6, 3*count))
+        fig_tsne, ax_tsne = plt.subplots(1, count, figsize=(6*count, 6))
+        
+        for ax in ax_loss.flatten():
+            ax.set_box_aspect(1)
+            
+        for ax in ax_tsne.flatten():
+            ax.set_box_aspect(1)
+            
+            
+        for i, setting in enumerate(self.settings):
+            encoder, autoencoder = self.model_func()
+            autoencoder.compile(optimizer='adam', loss='mse')
+            if val is not None:
+                hist = autoencoder.fit(
+                    x, 
+                    y, 
+                    validation_data=val, 
+                    epochs=setting.epochs, 
+                    batch_size=setting.batch_size, 
+                    verbose=0, 
+                    callbacks=[
+                        CustomProgressBar(
+                            total_epoch=setting.epochs,
+                            name = f"{name} - {i+1}"
+                        )
+                    ]
+                )
+            elif validation_split is not None:
+                hist = autoencoder.fit(
+                    x, 
+                    y, 
+                    validation_split=validation_split, 
+                    epochs=setting.epochs, 
+                    batch_size=setting.batch_size, 
+                    verbose=0, 
+                    callbacks=[
+                        CustomProgressBar(
+                            total_epoch=setting.epochs,
+                            name = f"{name} - {i+1}"
+                        )
+                    ]
+                )
+            self._draw_loss(hist, fig=fig_loss, ax=ax_loss[i])
+            self._draw_tsne(X_test, self.encode_labels(Y_test), encoder=encoder, fig=fig_tsne, ax=ax_tsne[i], output_shape=output_shape)
+            
+        fig_loss.suptitle('Loss Over Time', fontsize=20)
+        fig_tsne.suptitle('2D Visualization of Encoded Features', fontsize=20)
+        
+        fig_loss.tight_layout()
+        fig_tsne.tight_layout()
+        plt.show()
@@ -1,8 +1,29 @@
 import librosa
 import numpy as np
-from typing import Optional, Callable
+import scipy.fft
+from functools import lru_cache
+from typing import Optional, Callable, Literal
+from .decoder import DecodeProfile
 from .utils import AudioTools, AudioFeatures
 
+@lru_cache(maxsize=32)
+def mel_filterbank(sr: int, n_fft: int = 2048, n_mels: int = 128) -> np.ndarray:
+    """
+    `librosa.filters.mel`, computed once per `(sr, n_fft, n_mels)`. Read-only.
+    """
+    basis = librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels)
+    basis.flags.writeable = False
+    return basis
+
+@lru_cache(maxsize=32)
+def dct_matrix(n_mfcc: int, n_mels: int = 128) -> np.ndarray:
+    """
+    The first `n_mfcc` rows of the orthonormal DCT-II of size `n_mels` (as in `librosa.feature.mfcc`). Read-only.
+    """
+    basis = scipy.fft.dct(np.eye(n_mels, dtype=np.float32), type=2, norm="ortho", axis=0)[:n_mfcc]
+    basis.flags.writeable = False
+    return basis
+
 class Audio:
     """
     Attributes
@@ -15,16 +36,89 @@ class Audio:
         sr (int): 
             The sampling rate of the loaded audio file. Initially set to None 
             and assigned when the audio is loaded.
+    
+    An already decoded signal can be given as `y` and `sr` (see `Feature.utils.decoder.decode_audio`),
+    in which case `filepath` is not read. Otherwise `filepath` is decoded by `profile`
+    (`librosa.load` at 22050 Hz by default), see `Feature.utils.decoder.DecodeProfile`.
+    
+    The intermediate representations (STFT magnitude, mel spectrogram, CQT magnitude) are computed
+    on first use and memoized (read-only), so e.g. `get_mfcc` then `get_mel` costs a single STFT.
     """
-    def __init__(self, filepath: str, duration=10):
+    def __init__(self, filepath: str = None, duration=10, offset=0., y: np.ndarray = None, sr: int = None, profile: DecodeProfile = None):
         self.filepath = filepath
+        self.profile = profile or DecodeProfile(backend="librosa")
         self.y = None
         self.sr = None
-        self._read_audio(duration = duration)
+        self._memo = {}
+        if y is not None:
+            assert sr is not None, "sr is required with y"
+            self.y, self.sr = np.asarray(y, dtype=np.float32), sr
+        else:
+            self._read_audio(duration = duration, offset = offset)
         
-    def _read_audio(self, duration=10):
+    def _read_audio(self, duration=10, offset=0.):
         # y: wav | sr: sampling rate
-        self.y, self.sr = librosa.load(self.filepath, duration=duration)
+        self.y, self.sr = self.profile.load(self.filepath, offset=offset, duration=duration)
+        self._memo.clear()
+
+    def _memoize(self, key: tuple, compute: Callable[[], np.ndarray]) -> np.ndarray:
+        value = self._memo.get(key)
+        if value is None:
+            value = compute()
+            value.flags.writeable = False
+            self._memo[key] = value
+        return value
+
+    def stft_magnitude(self, n_fft=2048, hop_length=512) -> np.ndarray:
+        """
+        `|STFT|` of the signal, shape `(1 + n_fft // 2, n_frames)`.
+        """
+        return self._memoize(
+            ("stft", n_fft, hop_length),
+            lambda: np.abs(librosa.stft(self.y, n_fft=n_fft, hop_length=hop_length))
+        )
+
+    def mel(self, n_mels=128, n_fft=2048, hop_length=512) -> np.ndarray:
+        """
+        The power mel spectrogram (`librosa.feature.melspectrogram`), from the memoized STFT.
+        """
+        return self._memoize(
+            ("mel", n_mels, n_fft, hop_length),
+            lambda: mel_filterbank(self.sr, n_fft, n_mels) @ np.square(self.stft_magnitude(n_fft, hop_length))
+        )
+
+    def mel_db(self, n_mels=128, n_fft=2048, hop_length=512) -> np.ndarray:
+        """
+        `librosa.power_to_db` of `mel`: the log-power mel spectrogram behind MFCC and onset strength.
+        """
+        return self._memoize(
+            ("mel_db", n_mels, n_fft, hop_length),
+            lambda: librosa.power_to_db(self.mel(n_mels, n_fft, hop_length))
+        )
+
+    def mfcc(self, n_mfcc=20, n_mels=128, n_fft=2048, hop_length=512) -> np.ndarray:
+        """
+        `librosa.feature.mfcc`: a cached DCT matrix applied to `mel_db`.
+        """
+        return self._memoize(
+            ("mfcc", n_mfcc, n_mels, n_fft, hop_length),
+            lambda: dct_matrix(n_mfcc, n_mels) @ self.mel_db(n_mels, n_fft, hop_length)
+        )
+
+    def cqt_magnitude(self, hop_length=512, n_octaves=7, bins_per_octave=36) -> np.ndarray:
+        """
+        `|CQT|` of the signal, with the bins and the estimated tuning `librosa.feature.chroma_cqt` / `chroma_cens` use by default.
+        """
+        return self._memoize(
+            ("cqt", hop_length, n_octaves, bins_per_octave),
+            lambda: np.abs(librosa.cqt(self.y, sr=self.sr, hop_length=hop_length, n_bins=n_octaves * bins_per_octave, bins_per_octave=bins_per_octave, tuning=None))
+        )
+
+    def chroma_cqt(self) -> np.ndarray:
+        return self._memoize(("chroma_cqt",), lambda: librosa.feature.chroma_cqt(C=self.cqt_magnitude(), sr=self.sr))
+
+    def chroma_cens(self) -> np.ndarray:
+        return self._memoize(("chroma_cens",), lambda: librosa.feature.chroma_cens(C=self.cqt_magnitude(), sr=self.sr))
         
     def get_tempo(self):
         """
@@ -35,10 +129,18 @@ class Audio:
             tempo (np.ndarray):  
                 An array of estimated tempo (in BPM). Typically, this will return a single value.
         """
-        tempo = librosa.feature.tempo(y=self.y, sr=self.sr)
+        onset_envelope = librosa.onset.onset_strength(S=self.mel_db(), sr=self.sr)
+        tempo = librosa.feature.tempo(onset_envelope=onset_envelope, sr=self.sr)
         return tempo
 
-    def _extract_features(self, feature_func: Callable, segment_size=-1, **kwargs) -> tuple[np.ndarray, np.ndarray, AudioFeatures]:
+    def _extract_features(
+        self,
+        feature_func: Callable,
+        segment_size=-1,
+        segment_hop: Optional[int] = None,
+        segment_tail: Literal["pad", "partial", "drop"] = "pad",
+        **kwargs
+    ) -> tuple[np.ndarray, np.ndarray, AudioFeatures]:
         """
         Extract audio features, convert them to dB format, and compute various statistical measures.
 
@@ -48,7 +150,13 @@ class Audio:
         Arguments
         ----------
             feature_func (function):
-                A Librosa feature extraction function (e.g., librosa.feature.mfcc, librosa.feature.chroma_cqt).
+                A memoized feature of this audio (e.g., `self.mfcc`, `self.chroma_cqt`), called with `kwargs`.
+            segment_size (int, optional): _Defaults to -1._
+                The number of frames per segment, -1 computes the statistics over all frames.
+            segment_hop (Optional[int], optional): _Defaults to None._
+                The number of frames between two segments (`segment_size` when None), see `AudioTools.segment`.
+            segment_tail (Literal["pad", "partial", "drop"], optional): _Defaults to "pad"._
+                How the frames after the last full segment are handled, see `AudioTools.get_segment_stats`.
             kwargs (dict):
                 Additional keyword arguments to pass to the feature extraction function.
 
@@ -60,23 +168,17 @@ class Audio:
                 The features converted to dB scale for perceptual relevance.
             stats (AudioFeatures):
                 An object containing statistical features (kurtosis, mean, median, max, min, skew, std) 
-                computed from the dB-scaled features.
+                computed from the dB-scaled features, of shape `(n_features,)` or `(n_features, n_segments)`.
         """
-        data = feature_func(y=self.y, sr=self.sr, **kwargs)
+        data = feature_func(**kwargs)
         db = AudioTools.get_db(data)
         if segment_size == -1:
             stats = AudioTools.get_stats(db)
         else:
-            segment_size = segment_size
-            pad_width = segment_size - (db.shape[-1] % segment_size)
-            
-            # ((0, 0), (0, pad_width)): (([0]left, [0]right), ([1]left, [1]right))
-            data_padded = np.pad(db, pad_width=((0, 0), (0, pad_width)), mode='constant')
-            data_seg = data_padded.reshape(kwargs.get("n_mfcc"), -1, segment_size)
-            stats = AudioTools.get_stats_2D(data_seg)
+            stats = AudioTools.get_segment_stats(db, segment_size, hop=segment_hop, tail=segment_tail)
         return data, db, stats
     
-    def get_mfcc(self, n_mfcc: Optional[int]=20, segment_size=-1) -> tuple[np.ndarray, np.ndarray, AudioFeatures]:
+    def get_mfcc(self, n_mfcc: Optional[int]=20, segment_size=-1, segment_hop=None, segment_tail="pad") -> tuple[np.ndarray, np.ndarray, AudioFeatures]:
         """
         Extract MFCC (Mel-Frequency Cepstral Coefficients) features, convert them to dB scale, 
         and compute their statistical properties.
@@ -85,6 +187,8 @@ class Audio:
         -------
             n_mfcc (Optional[int], optional): _Defaults to 20._
                 The number of MFCCs to extract.
+            segment_size, segment_hop, segment_tail:
+                Statistics per segment of frames instead of over all frames, see `_extract_features`.
         
         Returns
         -------
@@ -96,9 +200,9 @@ class Audio:
                 An object containing statistical features (kurtosis, mean, median, max, min, skew, std) 
                 computed from the dB-scaled features.
         """
-        return self._extract_features(librosa.feature.mfcc, segment_size=segment_size, n_mfcc=n_mfcc)
+        return self._extract_features(self.mfcc, segment_size=segment_size, segment_hop=segment_hop, segment_tail=segment_tail, n_mfcc=n_mfcc)
     
-    def get_cqt(self, segment_size=-1):
+    def get_cqt(self, segment_size=-1, segment_hop=None, segment_tail="pad"):
         """
         Extract Constant-Q chromagram (CQT) features, convert them to dB scale, 
         and compute their statistical properties.
@@ -112,9 +216,9 @@ class Audio:
             stats (AudioFeatures):
                 Statistical properties of the dB-scaled CQT features (kurtosis, mean, median, max, min, skew, std).
         """
-        return self._extract_features(librosa.feature.chroma_cqt, segment_size=segment_size)
+        return self._extract_features(self.chroma_cqt, segment_size=segment_size, segment_hop=segment_hop, segment_tail=segment_tail)
     
-    def get_cens(self, segment_size=-1):
+    def get_cens(self, segment_size=-1, segment_hop=None, segment_tail="pad"):
         """
         Extract CENS (Chroma Energy Normalized) features, convert them to dB scale, 
         and compute their statistical properties.
@@ -128,9 +232,9 @@ class Audio:
             stats (AudioFeatures):
                 Statistical properties of the dB-scaled CENS features (kurtosis, mean, median, max, min, skew, std).
         """
-        return self._extract_features(librosa.feature.chroma_cens, segment_size=segment_size)
+        return self._extract_features(self.chroma_cens, segment_size=segment_size, segment_hop=segment_hop, segment_tail=segment_tail)
     
-    def get_mel(self, segment_size=-1):
+    def get_mel(self, segment_size=-1, segment_hop=None, segment_tail="pad"):
         """
         Extract Mel-spectrogram features, convert them to dB scale, 
         and compute their statistical properties.
@@ -144,7 +248,7 @@ class Audio:
             stats (AudioFeatures):
                 Statistical properties of the dB-scaled Mel-spectrogram features (kurtosis, mean, median, max, min, skew, std).
         """
-        return self._extract_features(librosa.feature.melspectrogram, segment_size=segment_size)
+        return self._extract_features(self.mel, segment_size=segment_size, segment_hop=segment_hop, segment_tail=segment_tail)
     
 if __name__ == "__main__":
     audio = Audio(r"D:\CODE\Project\Music_score\src\test.mp3")
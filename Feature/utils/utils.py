@@ -1,30 +1,20 @@
 import os
-import absl.logging
 import warnings
 
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
-absl.logging.set_verbosity(absl.logging.ERROR)
 warnings.filterwarnings("ignore", category=RuntimeWarning)
 
 import librosa
 import numpy as np
-import ast
-import sys
-
-import matplotlib.pyplot as plt
-from matplotlib.axes import Axes
-from matplotlib.figure import Figure
-from matplotlib.colors import Normalize
-from matplotlib.cm import ScalarMappable
-import pandas as pd
-
-from typing import Literal, Optional, Callable
-from scipy.stats import kurtosis, skew
-from sklearn.preprocessing import LabelEncoder
-from keras.src.models import Model
-from keras.src.callbacks import Callback
-from sklearn.manifold import TSNE
+
+from typing import TYPE_CHECKING, Literal, Optional
+
+if TYPE_CHECKING:
+    from matplotlib.axes import Axes
+
+# The serving path only needs the classes below. matplotlib, pandas and scipy.stats are imported
+# when they are used, and the research / training helpers live in `research.py`.
 
 class AudioFeatures:
     """
@@ -76,6 +66,8 @@ class AudioFeatures:
         self.std = std
         
     def __str__(self):
+        import pandas as pd
+        
         df = pd.DataFrame({
             "kutosis": self.kurtosis,
             "max": self.max,
@@ -141,6 +133,8 @@ class AudioTools:
         max_d[idx, np.arange(data.shape[1])] = 1
         
         if show:
+            import matplotlib.pyplot as plt
+            
             D = cls.get_db(data)
             fig, ax = plt.subplots(3, 1, sharex=True)
             cls.show(data, frame_end=frame_end, title="original", y_axis=y_axis, ax=ax[0], show=False)
@@ -163,7 +157,7 @@ class AudioTools:
         title: Optional[str] = "",
         frame_end: Optional[int] = 1000, 
         y_axis: Optional[Literal["chroma", "mel"]] = None, 
-        ax: Optional[Axes] = None,
+        ax: Optional["Axes"] = None,
         show: Optional[bool] = True
     ):
         """
@@ -194,6 +188,9 @@ class AudioTools:
             If True, the plot will be displayed immediately using `plt.show()`. If False, the plot will be created 
             but not shown. 
         """
+        import matplotlib.pyplot as plt
+        import librosa.display
+        
         if ax is None:
             fig, ax = plt.subplots(1, 1, sharex=True)
         img = librosa.display.specshow(data[:, :frame_end], sr=sr, x_axis="time", y_axis=y_axis, ax=ax)
@@ -204,6 +201,8 @@ class AudioTools:
     
     @classmethod
     def get_stats(cls, data: np.ndarray):
+        from scipy.stats import kurtosis, skew
+        
         data = data.astype(np.float64)
         return AudioFeatures(
             kurtosis = kurtosis(data, axis=1),
@@ -216,253 +215,129 @@ class AudioTools:
         )
         
     @classmethod
-    def get_stats_2D(cls, data: np.ndarray):
-        data = data.astype(np.float64)
-        return AudioFeatures(
-            kurtosis = kurtosis(data, axis=2),
-            max = np.max(data, axis=2),
-            mean = np.mean(data, axis=2),
-            median = np.median(data, axis=2),
-            min = np.min(data, axis=2),
-            skew = skew(data, axis=2),
-            std = np.std(data, axis=2)
-        )
-    
-    
-    
-class FMA:
-    def __init__(self):
-        self.features = None
-        self.echonest = None
-        self.genres = None
-        self.tracks = None
-    
-    def load(self, filepath: str):
-        filename = os.path.basename(filepath)
-        
-        if 'features' in filename:
-            self.features = pd.read_csv(filepath, index_col=0, header=[0, 1, 2])
-            return self.features
-
-        if 'echonest' in filename:
-            self.echonest = pd.read_csv(filepath, index_col=0, header=[0, 1, 2])
-            return self.echonest
-
-        if 'genres' in filename:
-            self.genres = pd.read_csv(filepath, index_col=0)
-            return self.genres
+    def get_stats_2D(cls, data: np.ndarray, dtype=np.float32):
+        """
+        The statistics of `get_stats` along the last axis of segmented data, e.g. `(n_mfcc, n_segments, segment_size)`.
 
-        if 'tracks' in filename:
-            tracks = pd.read_csv(filepath, index_col=0, header=[0, 1])
-            
-            # 將 csv 內的字串轉換為正確的資料型態
-            COLUMNS = [('track', 'tags'), ('album', 'tags'), ('artist', 'tags'),
-                    ('track', 'genres'), ('track', 'genres_all')]
-            for column in COLUMNS:
-                tracks[column] = tracks[column].map(ast.literal_eval)
-
-            # 將 pd.table 內有關時間的欄位轉換為 datetime
-            COLUMNS = [('track', 'date_created'), ('track', 'date_recorded'),
-                    ('album', 'date_created'), ('album', 'date_released'),
-                    ('artist', 'date_created'), ('artist', 'active_year_begin'),
-                    ('artist', 'active_year_end')]
-            for column in COLUMNS:
-                tracks[column] = pd.to_datetime(tracks[column])
+        All statistics come from one fused kernel: the central moments share a single centered
+        array (scipy's `kurtosis` and `skew` recompute the mean and the moments each), and one
+        sort of the segments gives the min, median and max (numpy's vectorized float32 sort is
+        faster than a multi-`kth` `np.partition` on these short rows).
+        Segments too close to constant give NaN kurtosis and skew, like scipy.
 
-            
-            SUBSETS = ('small', 'medium', 'large')
-            tracks['set', 'subset'] = tracks['set', 'subset'].astype(
-                        pd.CategoricalDtype(categories=SUBSETS, ordered=True))
+        Arguments
+        -------
+            data (np.ndarray):
+                The segmented features, any shape: statistics are computed along the last axis.
+            dtype (np.dtype): _Defaults to np.float32._
+                The computation dtype. float32 matches float64 to ~1e-5 relative on dB features.
 
-            COLUMNS = [('track', 'genre_top'), ('track', 'license'),
-                    ('album', 'type'), ('album', 'information'),
-                    ('artist', 'bio')]
-            for column in COLUMNS:
-                tracks[column] = tracks[column].astype('category')
+        Returns
+        -------
+            stats (AudioFeatures):
+                Arrays of shape `data.shape[:-1]` and dtype `dtype`.
+        """
+        x = np.asarray(data, dtype=dtype)
+        n = x.shape[-1]
+
+        ordered = np.sort(x, axis=-1)
+        median = ordered[..., n // 2] if n % 2 else (ordered[..., n // 2 - 1] + ordered[..., n // 2]) / 2
+
+        mean = x.mean(axis=-1)
+        d = x - mean[..., None]
+        d2 = np.square(d)
+        m2 = d2.mean(axis=-1)
+        m3 = np.multiply(d2, d, out=d).mean(axis=-1)
+        m4 = np.square(d2, out=d2).mean(axis=-1)
+        with np.errstate(all="ignore"):
+            zero = m2 <= (np.finfo(x.dtype).eps * mean) ** 2
+            skew = np.where(zero, np.nan, m3 / m2 ** 1.5).astype(x.dtype, copy=False)
+            kurtosis = np.where(zero, np.nan, m4 / np.square(m2) - 3).astype(x.dtype, copy=False)
 
-            self.tracks = tracks
-            
-            return self.tracks
-    
-    def train_data(self, size: Literal['small', 'medium'], feature: Literal['mfcc', 'chroma_cens']='mfcc'):
-        size = self.tracks['set', 'subset'] <= size
-        
-        train = self.tracks['set', 'split'] == 'training'
-        val = self.tracks['set', 'split'] == 'validation'
-        test = self.tracks['set', 'split'] == 'test'
+        return AudioFeatures(
+            kurtosis = kurtosis,
+            max = ordered[..., n - 1],
+            mean = mean,
+            median = median,
+            min = ordered[..., 0],
+            skew = skew,
+            std = np.sqrt(m2)
+        )
 
-        X_train = self.features.loc[size & train, feature]
-        X_val = self.features.loc[size & val, feature]
-        X_test = self.features.loc[size & test, feature]
+    @classmethod
+    def segment(cls, data: np.ndarray, segment_size: int, hop: Optional[int] = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Split the frames (last axis) of `data` into segments, without copying.
 
-        Y_train = self.tracks.loc[size & train, ('track', 'genre_top')]
-        Y_val = self.tracks.loc[size & val, ('track', 'genre_top')]
-        Y_test = self.tracks.loc[size & test, ('track', 'genre_top')]
-        
-        return (X_train, Y_train), (X_val, Y_val), (X_test, Y_test)
-    
-    def top_genres(self, size=Literal['small', 'medium'], show=False):
-        size = self.tracks['set', 'subset'] <= size
-        top_genres = self.tracks.loc[size, ('track', 'genre_top')].unique()
-        
-        if show:
-            print("Genres".ljust(20, " ") + " |  Count")
-            print("-"*28)
-            for tg in top_genres:
-                count = len(self.tracks.loc[size & (self.tracks['track', 'genre_top'] == tg)])
-                print(f"{tg.ljust(20, ' ')} | \t{count}")
-        
-        return top_genres
+        Arguments
+        -------
+            data (np.ndarray):
+                The features, shape `(n_features, n_frames)`.
+            segment_size (int):
+                The number of frames per segment.
+            hop (Optional[int], optional): _Defaults to None._
+                The number of frames between the starts of two segments, `segment_size` (no overlap) when None.
+                At most `segment_size`: the segments must cover every frame.
 
-class CustomProgressBar(Callback):
-    def __init__(self, total_epoch: int, name: str):
-        self.total_epoch = total_epoch
-        self.name = name
-        self.count = 1
-    
-    def on_epoch_begin(self, epoch, logs=None):
-        pass
-    
-    def on_epoch_end(self, epoch, logs=None):
-        # 打印簡單的 epoch 進度條
-        sys.stdout.write(f'\rEpoch {epoch+1}/{self.total_epoch} - loss: {logs["loss"]:.4f} - val_loss: {logs["val_loss"]:.4f}')
-        
-    def on_batch_begin(self, batch, logs=None):
-        pass
-    
-    def on_batch_end(self, batch, logs=None):
-        pass
-    
-    def on_train_begin(self, logs=None):
-        sys.stdout.write(f'# {self.name}\n')
-    
-    def on_train_end(self, logs=None):
-        pass
-
-class TestModel:
-    class ModelSettings:
-        def __init__(self, epochs: int=50, batch_size: int=32):
-            self.epochs = epochs
-            self.batch_size = batch_size
-            
-            
-    def __init__(self, func: Callable, settings: tuple[ModelSettings], name:str="Model"):
-        self.model_func = func
-        self.settings = settings
-        self.name = name
-        
-    def _draw_loss(self, hist, fig: Figure=None, ax: Axes=None):
-        if fig is None or ax is None:
-            fig, ax = plt.subplots(1, 2, figsize=(12, 5))
-            fig.suptitle('Loss Over Time', fontsize=20)
-        
-        ax[0].plot(hist.history['loss'], label='Training Loss')
-        ax[0].set_xlabel('Epochs')
-        ax[0].set_ylabel('Loss')
-        ax[0].legend()
+        Returns
+        -------
+            segments (np.ndarray):
+                A strided read-only view of the full segments, shape `(n_features, n_segments, segment_size)`.
+            tail (np.ndarray):
+                A view of the frames after the last full segment (the ragged tail), shape `(n_features, n_tail)`
+                with `0 <= n_tail < segment_size`.
+        """
+        hop = segment_size if hop is None else hop
+        if segment_size < 1 or hop < 1:
+            raise ValueError("segment_size and hop must be at least 1.")
+        if hop > segment_size:
+            # The frames between two segments, and the last ones, would be skipped
+            raise ValueError("hop must not be larger than segment_size.")
+        n_frames = data.shape[-1]
+        n_segments = (n_frames - segment_size) // hop + 1 if n_frames >= segment_size else 0
+        if n_segments == 0:
+            return np.empty(data.shape[:-1] + (0, segment_size), dtype=data.dtype), data
+
+        segments = np.lib.stride_tricks.sliding_window_view(data, segment_size, axis=-1)[..., ::hop, :][..., :n_segments, :]
+        tail_start = n_segments * hop
+        # With overlapping segments, the last frames can be covered already
+        tail = data[..., tail_start:] if (n_segments - 1) * hop + segment_size < n_frames else data[..., :0]
+        return segments, tail
 
-        ax[1].plot(hist.history['val_loss'], label='Validation Loss')
-        ax[1].set_xlabel('Epochs')
-        ax[1].set_ylabel('Loss')
-        ax[1].legend()
+    @classmethod
+    def get_segment_stats(
+        cls,
+        data: np.ndarray,
+        segment_size: int,
+        hop: Optional[int] = None,
+        tail: Literal["pad", "partial", "drop"] = "pad"
+    ) -> AudioFeatures:
+        """
+        `get_stats_2D` of the segments of `data` (see `segment`): statistics of shape `(n_features, n_segments)`.
 
-        plt.tight_layout()
-        
-    def _show_loss(self, **kwargs):
-        self._draw_loss(**kwargs)
-        plt.show()
-        
-    def _draw_tsne(self, X_test, Y_test, encoder: Model, fig: Figure=None, ax: Axes=None, output_shape=20):
-        if fig is None or ax is None:
-            fig, ax = plt.subplots(1, 1)
-            fig.suptitle('2D Visualization of Encoded Features', fontsize=20)
-        
-        ax.set_box_aspect(1) 
-        encoded_features = encoder.predict(X_test)
-        tsne = TSNE(n_components=2)
-        encoded_2d = tsne.fit_transform(encoded_features.reshape(-1, output_shape))
-        
-        im = ax.scatter(encoded_2d[:, 0], encoded_2d[:, 1], c=Y_test, cmap='inferno', alpha=1)
-        
-        norm = Normalize(vmin=np.min(Y_test), vmax=np.max(Y_test))
-        sm = ScalarMappable(norm=norm, cmap='inferno')
-        sm.set_array([])
-        
-        fig.colorbar(sm, ax=ax)
-        
-    def _show_tsne(self, **kwargs):
-        Y = kwargs.get("Y_test")
-        kwargs["Y_test"] = self.encode_labels(Y)
-        self._draw_tsne(**kwargs)
-        plt.show()
-    
-    def encode_labels(self, Y):
-        le = LabelEncoder()
-        le.fit(Y)
-        Y = le.transform(Y)
-        return Y
-    
-    def test(self, x, y, val=None, validation_split=None, X_test=None, Y_test=None, name: str = "Model", output_shape=20):
-        
-        assert X_test is not None
-        assert Y_test is not None
-        assert val is not None or validation_split is not None
-        
-        count = len(self.settings)
-        fig_loss, ax_loss = plt.subplots(count, 2, figsize=(6, 3*count))
-        fig_tsne, ax_tsne = plt.subplots(1, count, figsize=(6*count, 6))
-        
-        for ax in ax_loss.flatten():
-            ax.set_box_aspect(1)
-            
-        for ax in ax_tsne.flatten():
-            ax.set_box_aspect(1)
-            
-            
-        for i, setting in enumerate(self.settings):
-            encoder, autoencoder = self.model_func()
-            autoencoder.compile(optimizer='adam', loss='mse')
-            if val is not None:
-                hist = autoencoder.fit(
-                    x, 
-                    y, 
-                    validation_data=val, 
-                    epochs=setting.epochs, 
-                    batch_size=setting.batch_size, 
-                    verbose=0, 
-                    callbacks=[
-                        CustomProgressBar(
-                            total_epoch=setting.epochs,
-                            name = f"{name} - {i+1}"
-                        )
-                    ]
-                )
-            elif validation_split is not None:
-                hist = autoencoder.fit(
-                    x, 
-                    y, 
-                    validation_split=validation_split, 
-                    epochs=setting.epochs, 
-                    batch_size=setting.batch_size, 
-                    verbose=0, 
-                    callbacks=[
-                        CustomProgressBar(
-                            total_epoch=setting.epochs,
-                            name = f"{name} - {i+1}"
-                        )
-                    ]
-                )
-            self._draw_loss(hist, fig=fig_loss, ax=ax_loss[i])
-            self._draw_tsne(X_test, self.encode_labels(Y_test), encoder=encoder, fig=fig_tsne, ax=ax_tsne[i], output_shape=output_shape)
-            
-        fig_loss.suptitle('Loss Over Time', fontsize=20)
-        fig_tsne.suptitle('2D Visualization of Encoded Features', fontsize=20)
-        
-        fig_loss.tight_layout()
-        fig_tsne.tight_layout()
-        plt.show()
-            
+        Arguments
+        -------
+            tail (Literal["pad", "partial", "drop"], optional): _Defaults to "pad"._
+                The ragged tail is an extra segment zero-padded to `segment_size` (what the encoder was
+                trained on), an extra segment of its own frames only (`"partial"`), or ignored (`"drop"`).
+                Only the tail is copied, and nothing is added when the frames split evenly.
+        """
+        segments, rest = cls.segment(data, segment_size, hop)
+        stats = cls.get_stats_2D(segments)
+        if rest.shape[-1] == 0 or tail == "drop":
+            return stats
+        if tail == "pad":
+            rest = np.pad(rest, [(0, 0)] * (rest.ndim - 1) + [(0, segment_size - rest.shape[-1])], mode='constant')
+        rest_stats = np.array(cls.get_stats_2D(rest[..., None, :]))
+        return AudioFeatures(*np.concatenate([np.array(stats), rest_stats], axis=-1))
 
 def min_max_scaling(data: np.ndarray):
     s, b = min(data), max(data)
-    return (data - s) / (b - s)
\ No newline at end of file
+    return (data - s) / (b - s)
+
+def __getattr__(name: str):
+    # Backward compatibility: the research helpers used to live in this module.
+    if name in ("FMA", "CustomProgressBar", "TestModel"):
+        from . import research
+        return getattr(research, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
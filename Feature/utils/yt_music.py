@@ -1,119 +1,241 @@
 import yt_dlp
 import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
 from pydub import AudioSegment
 from pydub.utils import which
 from datetime import datetime
 import logging
 
-AudioSegment.converter = which("ffmpeg") 
+from .cache import SingleFlight, TTLCache
+from .check_helper import Checker
+from .decoder import decode_audio
+
+AudioSegment.converter = which("ffmpeg")
 
 logger = logging.getLogger("Feature")
 
 # https://github.com/yt-dlp/yt-dlp?tab=readme-ov-file#embedding-examples
 
+@dataclass(frozen=True)
+class DownloaderConfig:
+    """
+    Immutable settings of a `Downloader`, see `Downloader.with_options` to derive another one.
+
+    Attributes
+    -------
+        download_range (tuple[float, float]):
+            The excerpt, in seconds, which is downloaded or streamed.
+        home (str):
+            The download directory used when no `to` directory is given.
+        max_concurrency (int):
+            The maximum number of yt-dlp / ffmpeg calls running at once on one `Downloader`.
+    """
+    download_range: tuple[float, float] = (30.0, 60.0)
+    home: str = './data/music/temp'
+    format: str = 'm4a/bestaudio/best'
+    # Streamed excerpts, see `fetch_excerpt`: a single progressive http(s) audio format that ffmpeg can seek in
+    stream_format: str = 'bestaudio[ext=m4a][protocol^=http]/bestaudio[protocol^=http]/bestaudio'
+    quiet: bool = False
+    no_warnings: bool = True
+    no_progress: bool = True
+    no_playlist: bool = True
+    max_concurrency: int = 4
+
 class Downloader:
-    download_range = [30.0, 60.0]
-    no_warnings = True
-    no_progress = True
-    no_playlist = True
-    
-    download_opts = {
-        'format': 'm4a/bestaudio/best',
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'm4a',
-        }],
-        'paths': {
-            'home': ""
-        },
-        'outtmpl': {
-            'default': '%(id)s.%(ext)s'
-        },
-        'quite': True,
-        'download_ranges': yt_dlp.utils.download_range_func(
-            [], 
-            [download_range]
-        ),
-        'no_warnings': no_warnings,
-        'no_progress': no_progress,
-        'noplaylist': no_playlist
-    }
-    
-    @classmethod
-    def download(cls, url, to=None, quiet=False):
-        home = './data/music/temp' if to is None else os.path.join(to, "temp")
-        cls.download_opts['paths']['home'] = home
-        cls.download_opts['quiet'] = quiet
-        try:
-            with yt_dlp.YoutubeDL(cls.download_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                logger.info("Downloading music...")
-                logger.info(f"Title: {info.get('title')}")
-                filepath = ydl.prepare_filename(info, outtmpl=cls.download_opts['outtmpl']['default'])
-                abspath = os.path.abspath(filepath)
-                if to is None:
-                    to = os.path.dirname(abspath)
-                return cls.m4a_to_mp3(abspath, to)
-        except Exception as e:
-            raise e
-            
-    @classmethod
-    def m4a_to_mp3(cls, input_file: str, output_path: str=None):
+    """
+    YouTube client. The configuration is immutable and every call builds its own yt-dlp options,
+    so a single instance can serve a thread pool: at most `config.max_concurrency` calls run at
+    once, the others wait for a free slot.
+
+    `get_info` results are cached in `info_cache`, keyed by video ID. Concurrent lookups of one
+    video share a single extraction.
+    """
+    def __init__(self, config: DownloaderConfig = None, info_cache: TTLCache = None, **options):
+        self.config = replace(config or DownloaderConfig(), **options)
+        if self.config.max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1.")
+        self.info_cache = info_cache if info_cache is not None else TTLCache(ttl=600, max_items=1024)
+        self.info_flight = SingleFlight()
+        self._slots = threading.BoundedSemaphore(self.config.max_concurrency)
+        self._lock = threading.Lock()
+        # Calls holding a slot, now and at most so far
+        self.active = 0
+        self.peak = 0
+
+    def with_options(self, **options) -> "Downloader":
+        """
+        A new `Downloader` with some settings replaced, e.g. `downloader.with_options(download_range=(0, 30))`.
+        It shares the info cache of this one, but not its concurrency slots.
+        """
+        return Downloader(replace(self.config, **options), info_cache=self.info_cache)
+
+    @property
+    def download_range(self) -> tuple[float, float]:
+        return self.config.download_range
+
+    @contextmanager
+    def _slot(self):
+        with self._slots:
+            with self._lock:
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self.active -= 1
+
+    def _download_opts(self, home: str, quiet: bool) -> dict:
+        # A new dict per call: concurrent downloads never share `paths` / `quiet`
+        return {
+            'format': self.config.format,
+            'postprocessors': [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'm4a',
+            }],
+            'paths': {
+                'home': home
+            },
+            'outtmpl': {
+                'default': '%(id)s.%(ext)s'
+            },
+            'quiet': quiet,
+            'download_ranges': yt_dlp.utils.download_range_func(
+                [],
+                [list(self.config.download_range)]
+            ),
+            'no_warnings': self.config.no_warnings,
+            'no_progress': self.config.no_progress,
+            'noplaylist': self.config.no_playlist
+        }
+
+    def _download(self, url, to=None, quiet=None):
+        home = self.config.home if to is None else os.path.join(to, "temp")
+        opts = self._download_opts(home, self.config.quiet if quiet is None else quiet)
+        with self._slot(), yt_dlp.YoutubeDL(opts) as ydl:
+            info = ydl.extract_info(url, download=True)
+            logger.info("Downloading music...")
+            logger.info(f"Title: {info.get('title')}")
+            filepath = ydl.prepare_filename(info, outtmpl=opts['outtmpl']['default'])
+        return info, os.path.abspath(filepath)
+
+    def download(self, url, to=None, quiet=None, to_mp3=True):
+        """
+        Download the `download_range` excerpt of `url`. With `to_mp3=False`, the downloaded m4a
+        is returned as is (see `Feature.utils.decoder.decode_audio`), without the mp3 transcode.
+        """
+        _, abspath = self._download(url, to, quiet)
+        if not to_mp3:
+            return abspath
+        return self.m4a_to_mp3(abspath, to if to is not None else os.path.dirname(abspath))
+
+    @staticmethod
+    def m4a_to_mp3(input_file: str, output_path: str=None):
         if output_path is None:
             output_path = os.path.abspath("./data/music/download")
         logger.info("Transform .m4a file to .mp3 file...")
         audio = AudioSegment.from_file(input_file, format="m4a")
-        
+
         filename = os.path.basename(input_file).removesuffix(".m4a") + ".mp3"
         output_path = os.path.join(output_path, filename)
-        
+
         audio.export(output_path, format="mp3")
         logger.info(f"Output path: {os.path.abspath(output_path)}")
         os.remove(input_file)
         logger.info(f"Remove file: {os.path.abspath(output_path)}")
         return output_path
-    
-    @classmethod
-    def get_info(cls, yt_link: str):
+
+    @staticmethod
+    def _info_key(yt_link: str):
+        return Checker.get_video_id(yt_link) or yt_link.strip()
+
+    def get_info(self, yt_link: str):
+        """
+        Metadata of a video, see `_get_music_info`. Results are cached for `info_cache.ttl` seconds
+        and concurrent calls for the same video trigger a single `extract_info`.
+        """
+        key = self._info_key(yt_link)
+        info = self.info_cache.get(key)
+        if info is None:
+            info = self.info_flight.do(key, lambda: self._extract_info(yt_link))
+        return dict(info)
+
+    def _extract_info(self, yt_link: str):
         opts = {
-            'format': 'm4a/bestaudio/best',
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'm4a',
-            }],
+            'format': self.config.format,
             'quiet': True,
-            'noplaylist': cls.no_playlist
+            'no_warnings': self.config.no_warnings,
+            'noplaylist': self.config.no_playlist
         }
-        try:
+        with self._slot(), yt_dlp.YoutubeDL(opts) as ydl:
+            info = self._get_music_info(ydl.extract_info(yt_link, False))
+        self.info_cache.set(self._info_key(yt_link), info)
+        return info
+
+    def get_playlist_links(self, playlist_url: str) -> list[str]:
+        """
+        The video links of a playlist (or channel), without resolving each video.
+        """
+        opts = {
+            'extract_flat': 'in_playlist',
+            'quiet': True,
+            'no_warnings': self.config.no_warnings
+        }
+        with self._slot(), yt_dlp.YoutubeDL(opts) as ydl:
+            info = ydl.extract_info(playlist_url, download=False)
+        entries = info.get('entries') or [info]
+        return [
+            f"https://www.youtube.com/watch?v={entry['id']}"
+            for entry in entries
+            if entry is not None and entry.get('id') and Checker.video_id_regex.match(entry['id'])
+        ]
+
+    def get_full_data(self, url, to=None, quiet=None, to_mp3=True):
+        info, abspath = self._download(url, to, quiet)
+        music_info = self._get_music_info(info)
+        self.info_cache.set(self._info_key(url), music_info)
+        if to_mp3:
+            abspath = self.m4a_to_mp3(abspath, to if to is not None else os.path.dirname(abspath))
+        return {
+            "output_path": abspath,
+            "info": dict(music_info)
+        }
+
+    def fetch_excerpt(self, url, sr: int = 22050, resampler: str = None) -> dict:
+        """
+        Decode the `download_range` excerpt of `url` in memory: ffmpeg reads the audio stream
+        with HTTP range requests and writes PCM to a pipe, resampled to `sr` by `resampler`
+        (see `decode_audio`). Nothing is written to disk.
+
+        Returns
+        -------
+            data (dict):
+                `{"y": np.ndarray, "sr": int, "info": dict}`, `info` as given by `get_info`.
+        """
+        start, end = self.config.download_range
+        opts = {
+            'format': self.config.stream_format,
+            'quiet': True,
+            'no_warnings': self.config.no_warnings,
+            'noplaylist': self.config.no_playlist
+        }
+        with self._slot():
             with yt_dlp.YoutubeDL(opts) as ydl:
-                info = ydl.extract_info(yt_link, False)
-                return cls._get_music_info(info)
-        except Exception as e:
-            raise e
-        
-    @classmethod
-    def get_full_data(cls, url, to=None, quiet=False):
-        home = './data/music/temp' if to is None else os.path.join(to, "temp")
-        cls.download_opts['paths']['home'] = home
-        cls.download_opts['quiet'] = quiet
-        try:
-            with yt_dlp.YoutubeDL(cls.download_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                logger.info("Downloading music...")
-                logger.info(f"Title: {info.get('title')}")
-                filepath = ydl.prepare_filename(info, outtmpl=cls.download_opts['outtmpl']['default'])
-                abspath = os.path.abspath(filepath)
-                if to is None:
-                    to = os.path.dirname(abspath)
-                return {
-                    "output_path": cls.m4a_to_mp3(abspath, to),
-                    "info": cls._get_music_info(info)
-                }
-        except Exception as e:
-            raise e
-        
-    @classmethod
-    def _get_music_info(cls, info: dict):
+                info = ydl.extract_info(url, download=False)
+            stream_url = info.get("url")
+            if stream_url is None:
+                raise ValueError(f"No audio stream found for {url}")
+
+            logger.info(f"Streaming music: {info.get('title')}")
+            y, sr = decode_audio(stream_url, sr=sr, offset=start, duration=end - start, headers=info.get("http_headers"), resampler=resampler)
+        music_info = self._get_music_info(info)
+        self.info_cache.set(self._info_key(url), music_info)
+        return {"y": y, "sr": sr, "info": dict(music_info)}
+
+    @staticmethod
+    def _get_music_info(info: dict):
         # https://github.com/ytdl-org/youtube-dl?tab=readme-ov-file#output-template
         video_id = info.get("id")
         ts = info.get("timestamp")
@@ -131,13 +253,14 @@ class Downloader:
             "view_count": info.get("view_count"),
             "like_count": info.get("like_count")
         })
-        
 
-        
+
+
 if __name__ == "__main__":
     # download("https://www.youtube.com/watch?v=t3kOeUsnocg")
+    downloader = Downloader()
     while True:
         try:
-            Downloader.download(input("URL: "))
+            downloader.download(input("URL: "))
         except:
-            break
\ No newline at end of file
+            break
@@ -5,14 +5,9 @@ from uuid import uuid4
 import logging
 import json
 
-from .extractor import FeatureExtractor
+from . import services
+from .services import fe
 from .utils.check_helper import Checker
-from .utils.yt_music import Downloader
-
-fe = FeatureExtractor(
-    encoder_path = "static/feature/models/best.h5",
-    runtime_dir = "static/feature/runtime"
-)
 
 logger = logging.getLogger("Feature")
 
@@ -25,7 +20,7 @@ def get_feature(request: HttpRequest):
     if request.method != 'POST':
         return JsonResponse({"error": "Only POST method is allowed."}, status=UNSUPPORT_METHOD_ERROR_NO)
     
-    if not fe.is_loaded: 
+    if not fe.is_available: 
         return JsonResponse(
             {"error": "The model could not be loaded. Please check the file path or model file integrity."},
             status=UNKNOWN_ERROR_NO
@@ -39,7 +34,7 @@ def get_feature(request: HttpRequest):
         return JsonResponse({"error": "The 'yt_link' field must be a valid YouTube link."}, status=FIELD_ERROR_NO)
     
     try:
-        res = fe.extract(yt_link)
+        res = services.get_feature(yt_link)
         if res is None:
             return JsonResponse({"error": "Feature extraction failed due to an unknown error."}, status=UNKNOWN_ERROR_NO)
         res = res.tolist()
@@ -65,7 +60,7 @@ def get_info(request: HttpRequest):
         return JsonResponse({"error": "The 'yt_link' field must be a valid Youtube link."}, status=FIELD_ERROR_NO)
     
     try:
-        info = Downloader.get_info(yt_link)
+        info = services.get_info(yt_link)
         if info is None:
             return JsonResponse({"error": "Get info failed due to an unknown error."}, status=UNKNOWN_ERROR_NO)
         return JsonResponse(info)
@@ -79,7 +74,7 @@ def get_full_data(request: HttpRequest):
     if request.method != 'POST':
         return JsonResponse({"error": "Only POST method is allowed."}, status=UNSUPPORT_METHOD_ERROR_NO)
     
-    if not fe.is_loaded: 
+    if not fe.is_available: 
         return JsonResponse(
             {"error": "The model could not be loaded. Please check the file path or model file integrity."},
             status=UNKNOWN_ERROR_NO
@@ -93,26 +88,31 @@ def get_full_data(request: HttpRequest):
         return JsonResponse({"error": "The 'yt_link' field must be a valid Youtube link."}, status=FIELD_ERROR_NO)
     
     try:
-        res = Downloader.get_full_data(yt_link, quiet=True)
-        output_path = res.get("output_path")
-        info = res.get("info")
-        
-        if res is None or output_path is None or info is None:
-            return JsonResponse({"error": "Get info failed due to an unknown error."}, status=UNKNOWN_ERROR_NO)
-        
-        feature = fe.extract_from_file(output_path)
-        if feature is None:
-            return JsonResponse({"error": "Feature extraction failed due to an unknown error."}, status=UNKNOWN_ERROR_NO)
+        data = services.get_full_data(yt_link)
+        if data is None:
+            return JsonResponse({"error": "Get full data failed due to an unknown error."}, status=UNKNOWN_ERROR_NO)
+        feature, info = data["feature"], data["info"]
         
         feature = feature.tolist()
         return JsonResponse({
             "feature": {
                 "data": feature,
-                "stringified_data": ",".join(map(str, res))
+                "stringified_data": ",".join(map(str, feature))
             },
             "info": info
         })
     except Exception as e:
         error_id = uuid4()
         logger.error(f"{str(e)} ({error_id})")
-        return JsonResponse({"error": "Unknown error.", "error_id": error_id}, status=UNKNOWN_ERROR_NO)
\ No newline at end of file
+        return JsonResponse({"error": "Unknown error.", "error_id": error_id}, status=UNKNOWN_ERROR_NO)
+
+def get_stats(request: HttpRequest):
+    if request.method != 'GET':
+        return JsonResponse({"error": "Only GET method is allowed."}, status=UNSUPPORT_METHOD_ERROR_NO)
+
+    return JsonResponse({
+        "inference": fe.batcher.stats(),
+        "cache": fe.cache.stats() if fe.cache is not None else None,
+        "info_cache": {**services.downloader.info_cache.stats(), "coalesced": services.downloader.info_flight.coalesced},
+        "downloads": {"active": services.downloader.active, "peak": services.downloader.peak, "max_concurrency": services.downloader.config.max_concurrency}
+    })
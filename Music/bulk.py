@@ -0,0 +1,283 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from functools import partial
+from multiprocessing import get_context
+from typing import Callable, Iterable, Optional
+
+from django.conf import settings
+
+from Feature.parallel import extract_file, init_worker
+from Feature.utils.check_helper import Checker
+from Feature.utils.yt_music import Downloader
+from Music.index import feature_index
+from Music.models import Music
+from Music.neighbors import neighbor_graph
+
+logger = logging.getLogger("default")
+
+AUDIO_EXTENSIONS = (".mp3", ".m4a", ".wav", ".flac", ".ogg", ".opus", ".aac")
+
+@dataclass
+class IngestTask:
+    """
+    One track to ingest: a YouTube link (`source` is a link) or a local audio file (`local`).
+    `info` is known up front for local files, and filled by the download otherwise.
+    """
+    music_id: str
+    source: str
+    local: bool = False
+    info: Optional[dict] = None
+    filepath: Optional[str] = None
+
+@dataclass
+class IngestReport:
+    total: int = 0
+    skipped: int = 0
+    ingested: int = 0
+    failed: dict = field(default_factory=dict)
+    elapsed: float = 0.
+    interrupted: bool = False
+
+    @property
+    def tracks_per_minute(self):
+        return self.ingested / self.elapsed * 60 if self.elapsed > 0 else 0.
+
+def read_links(path: str) -> list[str]:
+    """
+    The YouTube links of a text file (one per line, `#` comments) or of a CSV file
+    (the `yt_link` / `url` column, or the first column holding a link).
+    """
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(line for line in f if line.strip() and not line.lstrip().startswith("#")))
+    links = []
+    for row in rows:
+        link = next((cell.strip() for cell in row if Checker.is_yt_link(cell.strip())), None)
+        if link is not None:
+            links.append(link)
+    return links
+
+def local_music_id(filepath: str) -> str:
+    """
+    `<video id>.<ext>` files keep their video ID, other files are identified by a hash of their content.
+    """
+    stem = os.path.splitext(os.path.basename(filepath))[0]
+    if Checker.video_id_regex.match(stem):
+        return stem
+    sha1 = hashlib.sha1()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha1.update(chunk)
+    return "f_" + sha1.hexdigest()[:18]
+
+def link_tasks(links: Iterable[str]) -> list[IngestTask]:
+    tasks = []
+    for link in links:
+        video_id = Checker.get_video_id(link)
+        if video_id is not None:
+            tasks.append(IngestTask(video_id, link))
+        else:
+            logger.warning(f"Skipped link without a video ID: {link}")
+    return tasks
+
+def directory_tasks(directory: str, artist_id: str = "@local", artist_name: str = "Local files") -> list[IngestTask]:
+    tasks = []
+    for root, _, files in os.walk(directory):
+        for filename in sorted(files):
+            if not filename.lower().endswith(AUDIO_EXTENSIONS):
+                continue
+            filepath = os.path.join(root, filename)
+            music_id = local_music_id(filepath)
+            info = {
+                "id": music_id,
+                "title": os.path.splitext(filename)[0],
+                "author_id": artist_id,
+                "author": artist_name,
+            }
+            tasks.append(IngestTask(music_id, filepath, local=True, info=info, filepath=filepath))
+    return tasks
+
+def default_extract_executor(workers: int = None) -> Executor:
+    workers = workers or os.cpu_count() or 1
+    return ProcessPoolExecutor(
+        workers,
+        # Not forked: the download threads and TensorFlow do not survive a fork
+        mp_context=get_context("spawn"),
+        initializer=init_worker,
+        initargs=(
+            os.path.abspath("static/feature/models/best.h5"),
+            settings.FEATURE_INFERENCE_MODE,
+            settings.FEATURE_TFLITE_PATH,
+            max(1, (os.cpu_count() or 1) // workers),
+            settings.FEATURE_AUDIO_DECODER,
+            settings.FEATURE_AUDIO_RESAMPLER
+        )
+    )
+
+class BulkIngestor:
+    """
+    Ingest many tracks at once.
+
+    Pipeline
+    -------
+        download:
+            YouTube tracks are downloaded by a thread pool (I/O-bound) into `workdir`. The
+            metadata is saved next to the audio file (`<id>.json`), so an interrupted run
+            resumes without downloading again.
+        extraction:
+            MFCC + encoding run in a process pool (CPU-bound), see `Feature.parallel`.
+        write:
+            Results are inserted with `Music.bulk_upload` every `batch_size` tracks, then added
+            to `feature_index` and linked in `neighbor_graph`. Downloaded files are deleted once
+            their batch is committed.
+
+    Tracks already in the database are skipped, so running the same ingestion again resumes it.
+    """
+    def __init__(
+        self,
+        workdir: str = "./data/music/ingest",
+        download_workers: int = 4,
+        extract_workers: int = None,
+        batch_size: int = 100,
+        download: Callable[..., dict] = None,
+        extract: Callable[..., object] = None,
+        extract_executor: Executor = None,
+        progress: Callable[[IngestReport], None] = None
+    ):
+        self.workdir = workdir
+        self.download_workers = download_workers
+        self.extract_workers = extract_workers
+        self.batch_size = batch_size
+        self.download = download or partial(Downloader(max_concurrency=download_workers).get_full_data, to_mp3=False)
+        self.extract = extract or extract_file
+        self.extract_executor = extract_executor
+        self.progress = progress
+
+    def _info_path(self, music_id: str):
+        return os.path.join(self.workdir, f"{music_id}.json")
+
+    def _resume_download(self, task: IngestTask) -> bool:
+        try:
+            with open(self._info_path(task.music_id), encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if not os.path.isfile(saved.get("filepath", "")):
+            return False
+        task.info, task.filepath = saved["info"], saved["filepath"]
+        return True
+
+    def _download(self, task: IngestTask) -> IngestTask:
+        if self._resume_download(task):
+            return task
+        res = self.download(task.source, to=self.workdir, quiet=True)
+        if res is None or res.get("output_path") is None or res.get("info") is None:
+            raise RuntimeError("Download failed due to an unknown error.")
+        task.info, task.filepath = res["info"], res["output_path"]
+        # Written last: its presence means the download is complete
+        tmp_path = self._info_path(task.music_id) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"info": task.info, "filepath": os.path.abspath(task.filepath)}, f, default=str)
+        os.replace(tmp_path, self._info_path(task.music_id))
+        return task
+
+    def _cleanup(self, task: IngestTask):
+        if task.local:
+            return
+        for path in (task.filepath, self._info_path(task.music_id)):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    def _flush(self, batch: list[tuple[IngestTask, object]], report: IngestReport):
+        if not batch:
+            return
+        music_ids = Music.bulk_upload([(task.info, features) for task, features in batch])
+        inserted = set(music_ids)
+        ids = [task.music_id for task, _ in batch if task.music_id in inserted]
+        vectors = [features for task, features in batch if task.music_id in inserted]
+        infos = [task.info for task, _ in batch if task.music_id in inserted]
+        feature_index.extend(
+            ids,
+            vectors,
+            artist_ids=[info.get('author_id') for info in infos],
+            view_counts=[info.get('view_count') or 0 for info in infos]
+        )
+        if settings.MUSIC_NEIGHBOR_GRAPH:
+            neighbor_graph.extend(ids, vectors)
+        for task, _ in batch:
+            self._cleanup(task)
+        report.ingested += len(music_ids)
+        report.skipped += len(batch) - len(music_ids)
+        batch.clear()
+        report.elapsed = time.perf_counter() - self._start
+        if self.progress is not None:
+            self.progress(report)
+
+    def run(self, tasks: list[IngestTask]) -> IngestReport:
+        self._start = time.perf_counter()
+        report = IngestReport()
+
+        unique = {}
+        for task in tasks:
+            unique.setdefault(task.music_id, task)
+        report.total = len(unique)
+        existing = set(Music.objects.filter(music_id__in=list(unique)).values_list('music_id', flat=True))
+        report.skipped = len(existing)
+        pending_tasks = [task for music_id, task in unique.items() if music_id not in existing]
+
+        if pending_tasks and any(not task.local for task in pending_tasks):
+            os.makedirs(self.workdir, exist_ok=True)
+
+        extract_executor = self.extract_executor or default_extract_executor(self.extract_workers)
+        download_executor = ThreadPoolExecutor(self.download_workers, thread_name_prefix="IngestDownload")
+        futures: dict[Future, tuple[str, IngestTask]] = {}
+        batch = []
+
+        def submit_extraction(task: IngestTask):
+            futures[extract_executor.submit(self.extract, task.filepath, task.local)] = ("extract", task)
+
+        try:
+            for task in pending_tasks:
+                if task.local:
+                    submit_extraction(task)
+                else:
+                    futures[download_executor.submit(self._download, task)] = ("download", task)
+
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, task = futures.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        report.failed[task.music_id] = f"{stage}: {type(e).__name__}: {str(e)}"
+                        logger.error(f"Ingestion of {task.source} failed ({stage}): {str(e)}")
+                        if stage == "extract":
+                            # The next run downloads it again
+                            self._cleanup(task)
+                        continue
+                    if stage == "download":
+                        submit_extraction(result)
+                    else:
+                        batch.append((task, result))
+                        if len(batch) >= self.batch_size:
+                            self._flush(batch, report)
+            self._flush(batch, report)
+        except KeyboardInterrupt:
+            # Keep what has been extracted, the next run resumes from the database and `workdir`
+            report.interrupted = True
+            self._flush(batch, report)
+            for future in futures:
+                future.cancel()
+        finally:
+            download_executor.shutdown(wait=not report.interrupted, cancel_futures=True)
+            if self.extract_executor is None:
+                extract_executor.shutdown(wait=not report.interrupted, cancel_futures=True)
+
+        report.elapsed = time.perf_counter() - self._start
+        return report
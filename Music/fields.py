@@ -0,0 +1,86 @@
+import struct
+
+import numpy as np
+from django.core.exceptions import ValidationError
+from django.db import models
+
+class VectorField(models.BinaryField):
+    """
+    Store a 1D float vector as raw little-endian float32 bytes.
+
+    Layout
+    -------
+        header (8 bytes):
+            magic `b"EV"`, format version (uint8), reserved (uint8), dimension (uint32 little-endian).
+        data (4 * dimension bytes):
+            The values as little-endian float32.
+
+    Values read from the database are decoded with `np.frombuffer`, i.e. without copying:
+    the resulting array is a read-only view over the bytes returned by the database driver.
+    """
+    MAGIC = b"EV"
+    VERSION = 1
+    HEADER = struct.Struct("<2sBxI")
+    DTYPE = np.dtype("<f4")
+
+    description = "Little-endian float32 vector"
+
+    def __init__(self, *args, dim: int = None, **kwargs):
+        self.dim = dim
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.dim is not None:
+            kwargs["dim"] = self.dim
+        return name, path, args, kwargs
+
+    @classmethod
+    def encode(cls, values) -> bytes:
+        data = np.asarray(values, dtype=cls.DTYPE).reshape(-1)
+        return cls.HEADER.pack(cls.MAGIC, cls.VERSION, len(data)) + data.tobytes()
+
+    @classmethod
+    def decode(cls, value) -> np.ndarray:
+        magic, version, dim = cls.HEADER.unpack_from(value)
+        if magic != cls.MAGIC:
+            raise ValueError("Not an encoded vector.")
+        if version != cls.VERSION:
+            raise ValueError(f"Unsupported vector format version: {version}")
+        return np.frombuffer(value, dtype=cls.DTYPE, count=dim, offset=cls.HEADER.size)
+
+    @classmethod
+    def encode_list(cls, value):
+        """
+        JSON-friendly version of a vector.
+        """
+        return None if value is None else np.asarray(value, dtype=cls.DTYPE).tolist()
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return self.decode(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, np.ndarray):
+            return value
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return self.decode(value)
+        if isinstance(value, str):
+            # Output of `value_to_string`
+            return np.array(value.split(","), dtype=self.DTYPE)
+        return np.asarray(value, dtype=self.DTYPE)
+
+    def get_prep_value(self, value):
+        if value is None or isinstance(value, (bytes, bytearray, memoryview)):
+            return value
+        return self.encode(value)
+
+    def validate(self, value, model_instance):
+        super().validate(value, model_instance)
+        if value is not None and self.dim is not None and len(self.to_python(value)) != self.dim:
+            raise ValidationError(f"Expected a vector of dimension {self.dim}.", code="invalid")
+
+    def value_to_string(self, obj):
+        value = self.value_from_object(obj)
+        return None if value is None else ",".join(map(str, self.to_python(value).tolist()))
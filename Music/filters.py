@@ -0,0 +1,82 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from Music.utils import SimilarityEngine
+
+@dataclass(frozen=True)
+class MusicFilter:
+    """
+    Predicates on the results of a similarity search, evaluated inside the index: they become a
+    boolean mask aligned with the feature matrix (see `SimilarityEngine.column`), built with a few
+    vectorized comparisons, so a filtered search still returns `k` musics when there are enough
+    matching ones, at about the cost of the scoring pass.
+
+    Attributes
+    -------
+        exclude_artists (frozenset[str]):
+            Artist IDs whose musics are never returned (e.g. the artist of the query).
+        min_view_count (int, optional):
+            Only the musics with more views are returned.
+        exclude_ids (frozenset[str]):
+            Music IDs which are never returned (e.g. the ones the listener has already seen).
+    """
+    exclude_artists: frozenset = frozenset()
+    min_view_count: Optional[int] = None
+    exclude_ids: frozenset = frozenset()
+
+    def __bool__(self):
+        return bool(self.exclude_artists) or self.min_view_count is not None or bool(self.exclude_ids)
+
+    @classmethod
+    def parse(cls, data: Optional[dict]) -> "MusicFilter":
+        """
+        Read a filter from a request: `{"exclude_artists": [str], "min_view_count": int, "exclude_ids": [str]}`,
+        every key being optional.
+
+        Raises
+        -------
+            ValueError: A field has the wrong type.
+        """
+        data = data or {}
+        if not isinstance(data, dict):
+            raise ValueError("The 'filters' field must be a JSON object.")
+        fields = {}
+        for key in ("exclude_artists", "exclude_ids"):
+            values = data.get(key) or []
+            if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+                raise ValueError(f"The '{key}' filter must be a list of IDs.")
+            fields[key] = frozenset(values)
+
+        min_view_count = data.get("min_view_count")
+        if min_view_count in (None, ""):
+            min_view_count = None
+        else:
+            try:
+                min_view_count = int(min_view_count)
+            except (TypeError, ValueError):
+                raise ValueError("The 'min_view_count' filter must be an integer.")
+        return cls(min_view_count=min_view_count, **fields)
+
+    def mask(self, engine: SimilarityEngine, artist_codes: dict[str, int]) -> np.ndarray:
+        """
+        The rows of `engine` which pass the filter, from its `"artist"` (artist codes, see
+        `artist_codes`) and `"view_count"` columns. Rows without a value never match
+        `min_view_count`.
+        """
+        mask = np.ones(len(engine), dtype=bool)
+        artists = engine.column("artist")
+        codes = [artist_codes[artist_id] for artist_id in self.exclude_artists if artist_id in artist_codes]
+        if codes and artists is not None:
+            mask &= artists != codes[0] if len(codes) == 1 else ~np.isin(artists, codes)
+
+        if self.min_view_count is not None:
+            view_counts = engine.column("view_count")
+            if view_counts is None:
+                mask[:] = False
+            else:
+                mask &= view_counts > self.min_view_count
+
+        mask[engine.positions(self.exclude_ids)] = False
+        return mask
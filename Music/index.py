@@ -0,0 +1,342 @@
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from Music.filters import MusicFilter
+from Music.models import IngestJob, Music
+from Music.utils import IVFEngine, QuantizedEngine, ShardedEngine, SimilarityEngine
+from Music.utils.snapshot import FeatureSnapshot
+
+logger = logging.getLogger("default")
+
+class FeatureIndex:
+    """
+    Process-wide, in-memory copy of every `Music.features` vector.
+
+    The index is loaded from the database on first use and then kept up to date through the
+    `post_save` / `post_delete` signals of `Music` (see `Music.signals`), or explicitly through
+    `upsert` / `remove` when rows are written without signals (e.g. `bulk_create`).
+    Queries never touch the ORM.
+
+    The search backend is selected with `settings.MUSIC_SIMILARITY_BACKEND`:
+    `"exact"` uses `SimilarityEngine`, `"ivf"` uses `IVFEngine`, loaded from
+    `settings.MUSIC_ANN_INDEX_PATH` when that file exists (see `manage.py build_ann_index`),
+    `"sharded"` uses `ShardedEngine`, an exact search spread over `settings.MUSIC_SEARCH_SHARDS` processes,
+    `"quantized"` uses `QuantizedEngine`, a scan of int8 / float16 codes re-ranked exactly.
+
+    With the exact and quantized backends, the matrix is memory-mapped from the snapshot in
+    `settings.MUSIC_FEATURE_SNAPSHOT_DIR` when there is one (see `manage.py export_feature_snapshot`),
+    so that every worker shares the same page-cached copy. The snapshot generation is checked every
+    `settings.MUSIC_FEATURE_SNAPSHOT_CHECK_INTERVAL` seconds and a newer one is mapped in place.
+
+    Rows written by other processes (the ingest workers, `manage.py ingest`) do not reach the
+    signals of this one: every `settings.MUSIC_FEATURE_INDEX_SYNC_INTERVAL` seconds, a background
+    thread reads them from the database (see `pull_updates`) and only takes the lock to apply them,
+    so searches never wait on the database.
+
+    The artist and the view count of every music are kept next to its vector (engine columns
+    `"artist"` and `"view_count"`), so that searches can be restricted with a `MusicFilter`.
+    """
+    # Seconds of ingest jobs read again at every `pull_updates`
+    sync_overlap = 30
+    # Seconds between two comparisons of the whole ID list with the database
+    full_sync_interval = 60
+
+    def __init__(self, backend: str = None, snapshot_dir: str = None):
+        self.backend = backend
+        self.snapshot_dir = snapshot_dir
+        self._engine = None
+        self._lock = threading.RLock()
+        self._snapshot: FeatureSnapshot = None
+        self._generation = 0
+        self._checked_at = 0.
+        self._synced_at = 0.
+        self._full_synced_at = 0.
+        self._jobs_since = None
+        self._sync_thread: Optional[threading.Thread] = None
+        # Artist ID -> integer code of the "artist" column
+        self._artist_codes: dict[str, int] = {}
+
+    @property
+    def is_loaded(self):
+        return self._engine is not None
+
+    @property
+    def engine(self) -> SimilarityEngine:
+        self.ensure_loaded()
+        return self._engine
+
+    @classmethod
+    def create_engine(cls, backend: str = None, ids: Iterable[str] = None, features: Iterable = None) -> SimilarityEngine:
+        backend = backend or getattr(settings, "MUSIC_SIMILARITY_BACKEND", "exact")
+        if backend == "exact":
+            return SimilarityEngine(ids, features)
+        if backend == "ivf":
+            return IVFEngine(
+                ids,
+                features,
+                n_lists=getattr(settings, "MUSIC_IVF_N_LISTS", None),
+                n_probe=getattr(settings, "MUSIC_IVF_N_PROBE", 8)
+            )
+        if backend == "sharded":
+            return ShardedEngine(
+                ids,
+                features,
+                n_shards=getattr(settings, "MUSIC_SEARCH_SHARDS", None),
+                min_rows=getattr(settings, "MUSIC_SHARDED_MIN_ROWS", 0)
+            )
+        if backend == "quantized":
+            return QuantizedEngine(ids, features, **cls.quantized_options())
+        raise ValueError(f"Unknown similarity backend: {backend}")
+
+    @staticmethod
+    def quantized_options() -> dict:
+        return {
+            "precision": getattr(settings, "MUSIC_QUANTIZED_PRECISION", "int8"),
+            "rerank": getattr(settings, "MUSIC_QUANTIZED_RERANK", 8)
+        }
+
+    @staticmethod
+    def read_features(queryset=None) -> tuple[list[str], list]:
+        rows = list((Music.objects.all() if queryset is None else queryset).values_list('music_id', 'features'))
+        return [music_id for music_id, _ in rows], [features for _, features in rows]
+
+    @staticmethod
+    def read_columns(queryset=None) -> tuple[list[str], list[str], list[int]]:
+        rows = list((Music.objects.all() if queryset is None else queryset).values_list('music_id', 'artist_id', 'view_count'))
+        return [row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows]
+
+    def _set_columns(self, engine: SimilarityEngine, music_ids: list[str], artist_ids: list, view_counts: list):
+        # Unknown artists (None) get -1, unknown view counts 0
+        codes = [-1 if artist_id is None else self._artist_codes.setdefault(artist_id, len(self._artist_codes)) for artist_id in artist_ids]
+        engine.set_column("artist", music_ids, np.array(codes, dtype=np.int32), fill=-1)
+        engine.set_column("view_count", music_ids, np.array([view_count or 0 for view_count in view_counts], dtype=np.int64), fill=0)
+
+    def load(self):
+        """
+        (Re)build the index from the database, or from the saved ANN index when there is one.
+        """
+        backend = self.backend or getattr(settings, "MUSIC_SIMILARITY_BACKEND", "exact")
+        started = timezone.now()
+        path = getattr(settings, "MUSIC_ANN_INDEX_PATH", None)
+        snapshot = self.get_snapshot() if backend in ("exact", "quantized") else None
+        generation = 0
+        if backend == "ivf" and path and os.path.isfile(path):
+            engine = IVFEngine.load(path, n_probe=getattr(settings, "MUSIC_IVF_N_PROBE", None))
+            self.sync(engine)
+        elif snapshot is not None and snapshot.exists():
+            engine, generation = snapshot.load()
+            if backend == "quantized":
+                # Only the codes are built in memory, the float32 rows stay memory-mapped for the re-ranking
+                engine = QuantizedEngine.from_normalized(engine.ids, engine.matrix, **self.quantized_options())
+            self.sync(engine)
+        else:
+            engine = self.create_engine(backend, *self.read_features())
+
+        columns = self.read_columns()
+        with self._lock:
+            self._set_columns(engine, *columns)
+            self._engine = engine
+            self._snapshot = snapshot
+            self._generation = generation
+            self._checked_at = time.monotonic()
+            self._synced_at = time.monotonic()
+            self._full_synced_at = time.monotonic()
+            self._jobs_since = started
+        logger.info(f"Feature index loaded with {len(engine)} musics ({backend}, snapshot generation {generation}).")
+        return self
+
+    def get_snapshot(self) -> FeatureSnapshot:
+        directory = self.snapshot_dir or getattr(settings, "MUSIC_FEATURE_SNAPSHOT_DIR", None)
+        return None if directory is None else FeatureSnapshot(directory)
+
+    def _reload_if_stale(self):
+        interval = getattr(settings, "MUSIC_FEATURE_SNAPSHOT_CHECK_INTERVAL", 5)
+        if self._snapshot is None or time.monotonic() - self._checked_at < interval:
+            return
+        self._checked_at = time.monotonic()
+        if self._snapshot.exists() and self._snapshot.is_stale(self._generation):
+            logger.info("Feature snapshot is stale, reloading it.")
+            self.load()
+
+    def _sync_if_stale(self):
+        # Called on the request path: the database is only read by the background thread
+        interval = getattr(settings, "MUSIC_FEATURE_INDEX_SYNC_INTERVAL", 5)
+        if interval is None or self._sync_thread is not None or time.monotonic() - self._synced_at < interval:
+            return
+        with self._lock:
+            if self._sync_thread is not None:
+                return
+            self._synced_at = time.monotonic()
+            self._sync_thread = threading.Thread(target=self._sync_in_background, name="FeatureIndexSync", daemon=True)
+            self._sync_thread.start()
+
+    def _sync_in_background(self):
+        try:
+            self.pull_updates()
+        except Exception as e:
+            logger.error(f"Feature index synchronization failed: {str(e)}")
+        finally:
+            # The connections of this thread would stay open otherwise
+            connections.close_all()
+            self._sync_thread = None
+
+    def pull_updates(self):
+        """
+        Bring the index up to date with the rows written by other processes since the last call:
+        the musics of the ingest jobs which succeeded since then, and, when the number of musics
+        differs from the database or every `full_sync_interval` seconds, the difference between
+        the whole ID lists (rows written without a job, or deleted by another process).
+
+        Run in the background every `settings.MUSIC_FEATURE_INDEX_SYNC_INTERVAL` seconds, or
+        directly before an update which must see the whole catalogue (see `NeighborGraph.add`).
+        The database is read without holding the lock.
+        """
+        if self._engine is None:
+            self.ensure_loaded()
+            return
+        now, checked_at = timezone.now(), time.monotonic()
+        # Overlap with the previous check: a job is committed shortly after its `finished_at`
+        since = self._jobs_since - timedelta(seconds=self.sync_overlap)
+        finished = IngestJob.objects.filter(status=IngestJob.SUCCEEDED, finished_at__gte=since, music__isnull=False)
+        finished_ids = set(finished.values_list('music_id', flat=True))
+        with self._lock:
+            engine_ids = set(self._engine.ids)
+        new = finished_ids - engine_ids
+
+        removed = set()
+        full = checked_at - self._full_synced_at >= self.full_sync_interval
+        if full or Music.objects.count() != len(engine_ids) + len(new):
+            db_ids = set(Music.objects.values_list('music_id', flat=True))
+            removed, new = engine_ids - db_ids, db_ids - engine_ids
+            self._full_synced_at = checked_at
+
+        if new:
+            self.refresh(new)
+        with self._lock:
+            for music_id in removed:
+                self._engine.remove(music_id)
+            self._jobs_since = now
+            self._synced_at = checked_at
+        if new or removed:
+            logger.info(f"Feature index synchronized with the database: {len(new)} musics added, {len(removed)} removed.")
+
+    @classmethod
+    def sync(cls, engine: SimilarityEngine):
+        """
+        Bring a saved engine up to date with the database: add the missing musics and
+        drop the ones which have been deleted since it was saved.
+        """
+        db_ids = set(Music.objects.values_list('music_id', flat=True))
+        engine_ids = set(engine.ids)
+        for music_id in engine_ids - db_ids:
+            engine.remove(music_id)
+        missing = db_ids - engine_ids
+        if missing:
+            engine.extend(*cls.read_features(Music.objects.filter(music_id__in=missing)))
+        return engine
+
+    def ensure_loaded(self):
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    self.load()
+        else:
+            self._reload_if_stale()
+            self._sync_if_stale()
+        return self
+
+    def reset(self):
+        """
+        Drop the in-memory copy, the next query reloads it from the database.
+        """
+        with self._lock:
+            self._engine = None
+            self._snapshot = None
+            self._generation = 0
+
+    def upsert(self, music_id: str, features, artist_id: str = None, view_count: int = None):
+        # Nothing to patch before the first load: the row will be read from the database then.
+        with self._lock:
+            if self._engine is not None:
+                self._engine.add(music_id, features)
+                self._set_columns(self._engine, [music_id], [artist_id], [view_count])
+
+    def extend(self, music_ids: Iterable[str], features: Iterable, artist_ids: Sequence[str] = None, view_counts: Sequence[int] = None):
+        # Bulk `upsert`, for rows written with `bulk_create`
+        music_ids = list(music_ids)
+        with self._lock:
+            if self._engine is not None:
+                self._engine.extend(music_ids, features)
+                self._set_columns(
+                    self._engine,
+                    music_ids,
+                    artist_ids if artist_ids is not None else [None] * len(music_ids),
+                    view_counts if view_counts is not None else [None] * len(music_ids)
+                )
+
+    def refresh(self, music_ids: Iterable[str]):
+        """
+        Read `music_ids` from the database into the index, for rows written by another process
+        (e.g. the ingest workers), whose signals only reach their own index. New rows are also
+        picked up periodically, see `_sync_if_stale`.
+        """
+        queryset = Music.objects.filter(music_id__in=list(music_ids))
+        ids, features = self.read_features(queryset)
+        with self._lock:
+            if self._engine is not None and ids:
+                self._engine.extend(ids, features)
+                self._set_columns(self._engine, *self.read_columns(queryset))
+        return ids
+
+    def remove(self, music_id: str):
+        with self._lock:
+            if self._engine is not None:
+                self._engine.remove(music_id)
+
+    def get_vector(self, music_id: str):
+        with self._lock:
+            vector = self.engine.get_vector(music_id)
+            return None if vector is None else vector.copy()
+
+    def scores(self, query, exclude: Iterable[str] = ()) -> tuple[list[str], np.ndarray]:
+        """
+        The cosine similarity between `query` and every music, with the aligned music IDs.
+        The musics of `exclude` score -inf.
+        """
+        with self._lock:
+            scores = self.engine.scores(query)
+            scores[self.engine.positions(exclude)] = -np.inf
+            return list(self.engine.ids), scores
+
+    def mask(self, filters: Optional[MusicFilter]) -> Optional[np.ndarray]:
+        """
+        The rows of the engine which pass `filters`, None when there is nothing to filter.
+        """
+        with self._lock:
+            return filters.mask(self.engine, self._artist_codes) if filters else None
+
+    def search(self, query, k: int = 10, exclude: Iterable[str] = (), filters: MusicFilter = None):
+        with self._lock:
+            return self.engine.search(query, k=k, exclude=exclude, mask=self.mask(filters))
+
+    def search_batch(self, queries, k: int = 10, exclude: Sequence[Iterable[str]] = None, filters: MusicFilter = None):
+        with self._lock:
+            return self.engine.search_batch(queries, k=k, exclude=exclude, mask=self.mask(filters))
+
+    def search_max(self, queries, k: int = 10, exclude: Iterable[str] = (), filters: MusicFilter = None):
+        with self._lock:
+            return self.engine.search_max(queries, k=k, exclude=exclude, mask=self.mask(filters))
+
+    def __len__(self):
+        return len(self.engine)
+
+feature_index = FeatureIndex()
@@ -0,0 +1,118 @@
+import logging
+import multiprocessing
+import os
+import socket
+import time
+import traceback
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from Feature import services
+from Music import worker as worker_process
+from Music.models import IngestJob, Music
+
+logger = logging.getLogger("default")
+
+def ingest(yt_link: str) -> str:
+    """
+    Download, extract and store one music.
+
+    Returns
+    -------
+        music_id (str):
+            The ID of the stored music.
+    """
+    data = services.get_full_data(yt_link)
+    if data is None:
+        raise RuntimeError("Feature extraction failed due to an unknown error.")
+    info = data['info']
+    music_id = info.get('id')
+    if Music.get_music_from_id(music_id) is None:
+        if Music.upload_music(info=info, features=data['feature']) is None:
+            raise RuntimeError("Music upload failed due to an unknown error.")
+    return music_id
+
+def process_job(job: IngestJob, handler: Callable[[str], str] = ingest, retry_delay: float = None) -> IngestJob:
+    retry_delay = settings.MUSIC_INGEST_RETRY_DELAY if retry_delay is None else retry_delay
+    try:
+        job.succeed(handler(job.yt_link))
+        logger.info(f"Ingest job {job.job_id} ({job.video_id}) succeeded.")
+    except Exception as e:
+        job.fail(f"{type(e).__name__}: {str(e)}", retry_delay=retry_delay)
+        logger.error(f"Ingest job {job.job_id} ({job.video_id}) attempt {job.attempts} failed: {str(e)}\n{traceback.format_exc()}")
+    return job
+
+def run_worker(
+    name: str = None,
+    poll_interval: float = None,
+    stop_event=None,
+    once: bool = False,
+    handler: Callable[[str], str] = ingest
+) -> int:
+    """
+    Run queued jobs until `stop_event` is set (or the queue is empty, with `once`).
+
+    Returns
+    -------
+        count (int):
+            The number of jobs processed.
+    """
+    name = name or f"{socket.gethostname()}:{os.getpid()}"
+    poll_interval = settings.MUSIC_INGEST_POLL_INTERVAL if poll_interval is None else poll_interval
+    count = 0
+    while stop_event is None or not stop_event.is_set():
+        close_old_connections()
+        IngestJob.requeue_stale(settings.MUSIC_INGEST_JOB_TIMEOUT)
+        job = IngestJob.claim(name)
+        if job is None:
+            if once:
+                break
+            time.sleep(poll_interval)
+            continue
+        process_job(job, handler=handler)
+        count += 1
+    return count
+
+def run_workers(processes: int = None, poll_interval: float = None, once: bool = False):
+    """
+    Run `processes` workers in their own processes, until they exit or the parent is interrupted.
+
+    The processes are spawned rather than forked: TensorFlow and the database connections of
+    the parent cannot be shared with a forked child.
+    """
+    processes = settings.MUSIC_INGEST_WORKERS if processes is None else processes
+    context = multiprocessing.get_context("spawn")
+    stop_event = context.Event()
+    workers = [
+        context.Process(
+            target=worker_process.main,
+            args=(f"{socket.gethostname()}:{os.getpid()}-{i}", poll_interval, stop_event, once),
+            name=f"IngestWorker-{i}",
+            daemon=False
+        )
+        for i in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    logger.info(f"Started {processes} ingest workers.")
+
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        # Let the current jobs finish: the workers stop before claiming the next one
+        stop_event.set()
+        for worker in workers:
+            worker.join()
+    return workers
+
+def enqueue(yt_link: str) -> Optional[IngestJob]:
+    """
+    Queue the upload of `yt_link`, None if its video ID cannot be found.
+    """
+    video_id = services.get_video_id(yt_link)
+    if video_id is None:
+        return None
+    return IngestJob.enqueue(video_id, yt_link, max_attempts=settings.MUSIC_INGEST_MAX_ATTEMPTS)
@@ -0,0 +1,35 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from Music.index import FeatureIndex
+from Music.utils import IVFEngine
+
+class Command(BaseCommand):
+    help = "Rebuild the IVF (approximate nearest-neighbour) index from every Music.features vector and save it."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default=settings.MUSIC_ANN_INDEX_PATH, help="Path of the .npz index file.")
+        parser.add_argument("--n-lists", type=int, default=settings.MUSIC_IVF_N_LISTS, help="Number of k-means cells.")
+        parser.add_argument("--n-probe", type=int, default=settings.MUSIC_IVF_N_PROBE, help="Default number of cells visited per query.")
+        parser.add_argument("--n-iter", type=int, default=20, help="Number of k-means iterations.")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        ids, features = FeatureIndex.read_features()
+        engine = IVFEngine(
+            ids,
+            features,
+            n_lists=options["n_lists"],
+            n_probe=options["n_probe"],
+            n_iter=options["n_iter"]
+        )
+
+        output = options["output"]
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        engine.save(output)
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {len(engine)} musics in {engine.n_lists or 0} cells ({time.perf_counter() - start:.2f}s): {output}"
+        ))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from Music.neighbors import NeighborGraph
+
+class Command(BaseCommand):
+    help = "Rebuild the materialized k-nearest-neighbour graph (MusicNeighbor) from every Music.features vector."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--block", type=int, default=4096, help="Number of neighbour lists computed and written at once.")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        graph = NeighborGraph()
+        count = graph.rebuild(block=options["block"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {count} edges ({graph.k} neighbours per music) in {time.perf_counter() - start:.2f}s."
+        ))
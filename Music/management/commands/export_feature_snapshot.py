@@ -0,0 +1,24 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from Music.index import FeatureIndex
+from Music.models import Music
+from Music.utils import SimilarityEngine
+from Music.utils.snapshot import FeatureSnapshot
+
+class Command(BaseCommand):
+    help = "Export every Music.features vector into a memory-mapped snapshot shared by the workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dir", default=settings.MUSIC_FEATURE_SNAPSHOT_DIR, help="Directory of the snapshot.")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        ids, features = FeatureIndex.read_features(Music.objects.order_by('music_id'))
+        engine = SimilarityEngine(ids, features)
+        generation = FeatureSnapshot(options["dir"]).write(engine.ids, engine.matrix)
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {len(engine)} musics as generation {generation} ({time.perf_counter() - start:.2f}s): {options['dir']}"
+        ))
@@ -0,0 +1,67 @@
+import os
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from Feature.utils.yt_music import Downloader
+from Music.bulk import BulkIngestor, IngestReport, directory_tasks, link_tasks, read_links
+
+class Command(BaseCommand):
+    help = (
+        "Ingest many musics at once from a YouTube playlist, a file of links (text or CSV) or a directory of "
+        "audio files. Downloads run in a thread pool, feature extraction in a process pool. "
+        "Running the same command again resumes an interrupted ingestion."
+    )
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument("--playlist", help="URL of a YouTube playlist or channel.")
+        source.add_argument("--file", help="Text file with one YouTube link per line, or a CSV file with a link column.")
+        source.add_argument("--dir", help="Directory of local audio files.")
+        parser.add_argument("--artist-id", default="@local", help="Artist of the local audio files (--dir).")
+        parser.add_argument("--artist-name", default="Local files", help="Artist name of the local audio files (--dir).")
+        parser.add_argument("--workdir", default="./data/music/ingest", help="Directory of the downloaded files.")
+        parser.add_argument("--download-workers", type=int, default=4, help="Number of download threads.")
+        parser.add_argument("--extract-workers", type=int, default=os.cpu_count(), help="Number of feature extraction processes.")
+        parser.add_argument("--batch-size", type=int, default=100, help="Number of musics per bulk insert.")
+        parser.add_argument("--export-snapshot", action="store_true", help="Export the feature snapshot afterwards (see export_feature_snapshot).")
+
+    def handle(self, *args, **options):
+        if options["playlist"]:
+            tasks = link_tasks(Downloader().get_playlist_links(options["playlist"]))
+        elif options["file"]:
+            if not os.path.isfile(options["file"]):
+                raise CommandError(f"No such file: {options['file']}")
+            tasks = link_tasks(read_links(options["file"]))
+        else:
+            if not os.path.isdir(options["dir"]):
+                raise CommandError(f"No such directory: {options['dir']}")
+            tasks = directory_tasks(options["dir"], options["artist_id"], options["artist_name"])
+
+        self.stdout.write(f"Found {len(tasks)} tracks.")
+        ingestor = BulkIngestor(
+            workdir=options["workdir"],
+            download_workers=options["download_workers"],
+            extract_workers=options["extract_workers"],
+            batch_size=options["batch_size"],
+            progress=self.report_progress
+        )
+        report = ingestor.run(tasks)
+
+        for music_id, error in report.failed.items():
+            self.stderr.write(f"{music_id}: {error}")
+        summary = (
+            f"Ingested {report.ingested} tracks in {report.elapsed:.1f}s ({report.tracks_per_minute:.1f} tracks/min), "
+            f"{report.skipped} already in the database, {len(report.failed)} failed."
+        )
+        if report.interrupted:
+            self.stdout.write(self.style.WARNING(f"Interrupted. {summary} Run the same command again to resume."))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
+
+        if options["export_snapshot"] and report.ingested:
+            call_command("export_feature_snapshot", stdout=self.stdout)
+
+    def report_progress(self, report: IngestReport):
+        done = report.ingested + report.skipped + len(report.failed)
+        self.stdout.write(f"[{done}/{report.total}] {report.ingested} ingested, {report.tracks_per_minute:.1f} tracks/min")
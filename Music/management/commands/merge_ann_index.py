@@ -0,0 +1,30 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Music.utils import IVFEngine
+
+class Command(BaseCommand):
+    help = "Merge several saved IVF indexes into the first one. Vectors of the other indexes are assigned to the cells of the first index."
+
+    def add_arguments(self, parser):
+        parser.add_argument("indexes", nargs="+", help="Paths of the .npz index files, the first one provides the cells.")
+        parser.add_argument("--output", required=True, help="Path of the merged .npz index file.")
+        parser.add_argument("--retrain", action="store_true", help="Retrain the cells on the merged vectors.")
+
+    def handle(self, *args, **options):
+        paths = options["indexes"]
+        for path in paths:
+            if not os.path.isfile(path):
+                raise CommandError(f"Index file not found: {path}")
+
+        engine = IVFEngine.load(paths[0])
+        for path in paths[1:]:
+            engine.merge(IVFEngine.load(path))
+        if options["retrain"] and len(engine) > 0:
+            engine.train()
+
+        output = options["output"]
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        engine.save(output)
+        self.stdout.write(self.style.SUCCESS(f"Merged {len(paths)} indexes into {len(engine)} musics: {output}"))
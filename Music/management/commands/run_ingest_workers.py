@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from Music.jobs import run_worker, run_workers
+
+class Command(BaseCommand):
+    help = "Run the worker processes of the asynchronous music upload queue (Music.models.IngestJob)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=settings.MUSIC_INGEST_WORKERS, help="Number of worker processes, 0 runs in this process.")
+        parser.add_argument("--poll-interval", type=float, default=settings.MUSIC_INGEST_POLL_INTERVAL, help="Seconds between two polls of an empty queue.")
+        parser.add_argument("--once", action="store_true", help="Exit when the queue is empty.")
+
+    def handle(self, *args, **options):
+        if options["processes"] == 0:
+            count = run_worker(poll_interval=options["poll_interval"], once=options["once"])
+            self.stdout.write(self.style.SUCCESS(f"Processed {count} jobs."))
+            return
+
+        self.stdout.write(f"Starting {options['processes']} ingest workers.")
+        run_workers(options["processes"], poll_interval=options["poll_interval"], once=options["once"])
+        self.stdout.write(self.style.SUCCESS("Ingest workers stopped."))
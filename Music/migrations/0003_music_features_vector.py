@@ -0,0 +1,63 @@
+from django.db import migrations, models
+
+import Music.fields
+
+BATCH_SIZE = 1000
+
+def json_to_vector(apps, schema_editor):
+    Music = apps.get_model('Music', 'Music')
+    batch = []
+    for music in Music.objects.only('music_id', 'features').iterator(chunk_size=BATCH_SIZE):
+        music.features_vector = music.features
+        batch.append(music)
+        if len(batch) >= BATCH_SIZE:
+            Music.objects.bulk_update(batch, ['features_vector'])
+            batch = []
+    Music.objects.bulk_update(batch, ['features_vector'])
+
+def vector_to_json(apps, schema_editor):
+    Music = apps.get_model('Music', 'Music')
+    batch = []
+    for music in Music.objects.only('music_id', 'features_vector').iterator(chunk_size=BATCH_SIZE):
+        music.features = music.features_vector.tolist()
+        batch.append(music)
+        if len(batch) >= BATCH_SIZE:
+            Music.objects.bulk_update(batch, ['features'])
+            batch = []
+    Music.objects.bulk_update(batch, ['features'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Music', '0002_music_preview_url'),
+    ]
+
+    operations = [
+        # Nullable while both columns exist, so that the migration can be reversed.
+        migrations.AlterField(
+            model_name='music',
+            name='features',
+            field=models.JSONField(null=True),
+        ),
+        migrations.AddField(
+            model_name='music',
+            name='features_vector',
+            field=Music.fields.VectorField(null=True),
+        ),
+        migrations.RunPython(json_to_vector, vector_to_json),
+        migrations.RemoveField(
+            model_name='music',
+            name='features',
+        ),
+        migrations.RenameField(
+            model_name='music',
+            old_name='features_vector',
+            new_name='features',
+        ),
+        migrations.AlterField(
+            model_name='music',
+            name='features',
+            field=Music.fields.VectorField(),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.4 on 2026-10-17 22:00
+
+import Music.models
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Music', '0003_music_features_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestJob',
+            fields=[
+                ('job_id', models.CharField(default=Music.models.new_job_id, max_length=32, primary_key=True, serialize=False)),
+                ('video_id', models.CharField(max_length=20, unique=True)),
+                ('yt_link', models.URLField(max_length=500)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], db_index=True, default='queued', max_length=10)),
+                ('attempts', models.IntegerField(default=0)),
+                ('max_attempts', models.IntegerField(default=3)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('worker', models.CharField(blank=True, max_length=100, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('music', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='Music.music')),
+            ],
+            options={
+                'db_table': 'ingest_job',
+                'managed': True,
+                'indexes': [models.Index(fields=['status', 'available_at'], name='ingest_job_status_dba50c_idx')],
+            },
+        ),
+    ]
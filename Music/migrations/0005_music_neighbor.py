@@ -0,0 +1,30 @@
+# Generated by Django 5.1.4 on 2026-10-17 22:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Music', '0004_ingest_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MusicNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('similarity', models.FloatField()),
+                ('music', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='Music.music')),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Music.music')),
+            ],
+            options={
+                'db_table': 'music_neighbor',
+                'managed': True,
+                'indexes': [models.Index(fields=['rank', 'similarity'], name='music_neigh_rank_bd8865_idx')],
+                'constraints': [models.UniqueConstraint(fields=('music', 'rank'), name='music_neighbor_rank_unique')],
+            },
+        ),
+    ]
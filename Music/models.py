@@ -1,6 +1,13 @@
-from django.db import models
-from django.db.models import Manager
+from datetime import timedelta
+from typing import Optional
+from uuid import uuid4
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Manager
 from django.forms.models import model_to_dict
+from django.utils import timezone
+
+from Music.fields import VectorField
 
 class Artist(models.Model):
     artist_id = models.CharField(max_length=20, primary_key=True)
@@ -34,7 +41,7 @@ class Music(models.Model):
     artist = models.ForeignKey(Artist, on_delete=models.CASCADE)
     view_count = models.IntegerField(default=0)
     like_count = models.IntegerField(default=0)
-    features = models.JSONField()
+    features = VectorField()
     
     class Meta:
         managed = True
@@ -67,47 +74,251 @@ class Music(models.Model):
             features = features
         )
 
-        return model_to_dict(music)
+        music = model_to_dict(music)
+        music['features'] = VectorField.encode_list(music.get('features'))
+        return music
+
+    @classmethod
+    def bulk_upload(cls, items: list[tuple[dict, object]]) -> list[str]:
+        """
+        Insert many musics with a few queries: `bulk_create` for the missing artists, then for
+        the musics. Musics which already exist are skipped.
+
+        `bulk_create` does not send `post_save`: the caller updates `Music.index.feature_index`.
+
+        Arguments
+        -------
+            items (list[tuple[dict, features]]):
+                `(info, features)` pairs, `info` as given by `Downloader.get_full_data`.
+
+        Returns
+        -------
+            music_ids (list[str]):
+                The IDs of the inserted musics.
+        """
+        with transaction.atomic():
+            music_ids = [info.get('id') for info, _ in items]
+            existing = set(cls.objects.filter(music_id__in=music_ids).values_list('music_id', flat=True))
+
+            artists = {}
+            for info, _ in items:
+                author_id = info.get('author_id')
+                artists.setdefault(author_id, Artist(
+                    artist_id=author_id,
+                    name=info.get('author'),
+                    url=f"https://www.youtube.com/{author_id}"
+                ))
+            Artist.objects.bulk_create(artists.values(), ignore_conflicts=True)
+
+            musics = {}
+            for info, features in items:
+                music_id = info.get('id')
+                if music_id in existing or music_id in musics:
+                    continue
+                musics[music_id] = cls(
+                    music_id = music_id,
+                    title = info.get('title'),
+                    youtube_url = info.get('youtube_url'),
+                    cover_url = info.get('cover_url'),
+                    preview_url = info.get('preview_url'),
+                    artist_id = info.get('author_id'),
+                    view_count = info.get('view_count') or 0,
+                    like_count = info.get('like_count') or 0,
+                    features = features
+                )
+            cls.objects.bulk_create(musics.values(), ignore_conflicts=True)
+        return list(musics)
     
+    values_fields = ('music_id', 'title', 'youtube_url', 'cover_url', 'preview_url', 'artist_id', 'artist__name', 'view_count', 'like_count', 'features')
+
+    @classmethod
+    def _format_music_data(cls, item: dict):
+        return {
+            'music_id': item.get('music_id'),
+            'title': item.get('title'),
+            'youtube_url': item.get('youtube_url'),
+            'cover_url': item.get('cover_url'),
+            'preview_url': item.get('preview_url'),
+            'artist_id': item.get('artist_id'),
+            'artist_name': item.get('artist__name'),
+            'view_count': item.get('view_count'),
+            'like_count': item.get('like_count'),
+            'features': VectorField.encode_list(item.get('features')),
+        }
+
     @classmethod
     def get_music_from_id(cls, music_id):
         music = cls.objects.select_related('artist').filter(music_id=music_id)
         if music:
-            music_data = music.values('music_id', 'title', 'youtube_url', 'cover_url', 'preview_url', 'artist_id', 'artist__name', 'view_count', 'like_count', 'features').first()
-            formatted_data = {
-                'music_id': music_data.get('music_id'),
-                'title': music_data.get('title'),
-                'youtube_url': music_data.get('youtube_url'),
-                'cover_url': music_data.get('cover_url'),
-                'preview_url': music_data.get('preview_url'),
-                'artist_id': music_data.get('artist_id'),
-                'artist_name': music_data.get('artist__name'),
-                'view_count': music_data.get('view_count'),
-                'like_count': music_data.get('like_count'),
-                'features': music_data.get('features'),
-            }
-
-            return formatted_data
+            music_data = music.values(*cls.values_fields).first()
+            return cls._format_music_data(music_data)
     
     @classmethod
     def get_all_music_exclude_id(cls, music_id):
         music = cls.objects.select_related('artist').exclude(music_id=music_id)
-        music_data = music.values('music_id', 'title', 'youtube_url', 'cover_url', 'preview_url', 'artist_id', 'artist__name', 'view_count', 'like_count', 'features')
-        formatted_data = [
-            {
-                'music_id': item.get('music_id'),
-                'title': item.get('title'),
-                'youtube_url': item.get('youtube_url'),
-                'cover_url': item.get('cover_url'),
-                'preview_url': item.get('preview_url'),
-                'artist_id': item.get('artist_id'),
-                'artist_name': item.get('artist__name'),
-                'view_count': item.get('view_count'),
-                'like_count': item.get('like_count'),
-                'features': item.get('features'),
-            }
-            for item in music_data
-        ]
+        music_data = music.values(*cls.values_fields)
+        formatted_data = [cls._format_music_data(item) for item in music_data]
 
         return formatted_data
-        # return cls.objects.filter(music_id=music_id).values().first()
\ No newline at end of file
+        # return cls.objects.filter(music_id=music_id).values().first()
+
+    @classmethod
+    def get_musics_from_ids(cls, music_ids: list[str]):
+        """
+        Fetch several musics at once, keeping the order of `music_ids`. Unknown IDs are skipped.
+        """
+        music = cls.objects.select_related('artist').filter(music_id__in=music_ids)
+        music_data = {item.get('music_id'): item for item in music.values(*cls.values_fields)}
+        return [cls._format_music_data(music_data[i]) for i in music_ids if i in music_data]
+
+class MusicNeighbor(models.Model):
+    """
+    One edge of the materialized k-nearest-neighbour graph: `neighbor` is the `rank`-th most
+    similar music to `music` (0 is the closest), with their cosine `similarity`.
+
+    Every music holds its `settings.MUSIC_NEIGHBOR_K` best neighbours (all the other musics when
+    the catalogue is smaller), maintained by `Music.neighbors.NeighborGraph`.
+    """
+    music = models.ForeignKey(Music, on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey(Music, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    similarity = models.FloatField()
+
+    class Meta:
+        managed = True
+        db_table = 'music_neighbor'
+        constraints = [
+            models.UniqueConstraint(fields=['music', 'rank'], name='music_neighbor_rank_unique'),
+        ]
+        # (rank, similarity): the lowest k-th similarity of the graph, see `NeighborGraph.add`
+        indexes = [models.Index(fields=['rank', 'similarity'])]
+
+def new_job_id():
+    return uuid4().hex
+
+class IngestJob(models.Model):
+    """
+    An asynchronous music upload, run by the workers of `manage.py run_ingest_workers`.
+
+    There is at most one job per video: enqueueing a video again returns its job, and only a
+    failed job is queued again (see `enqueue`). Workers claim queued jobs with a conditional
+    `UPDATE`, so several processes can share the table without an external broker.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (SUCCEEDED, 'Succeeded'), (FAILED, 'Failed')]
+
+    job_id = models.CharField(primary_key=True, max_length=32, default=new_job_id)
+    video_id = models.CharField(max_length=20, unique=True)
+    yt_link = models.URLField(max_length=500)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    available_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    worker = models.CharField(max_length=100, blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    music = models.ForeignKey(Music, on_delete=models.SET_NULL, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        managed = True
+        db_table = 'ingest_job'
+        indexes = [models.Index(fields=['status', 'available_at'])]
+
+    @classmethod
+    def enqueue(cls, video_id: str, yt_link: str, max_attempts: int = 3) -> "IngestJob":
+        """
+        Queue the upload of `video_id`, deduplicated by video ID.
+
+        Returns
+        -------
+            job (IngestJob):
+                The new job, or the existing job of the video. A failed job is queued again;
+                a job is created already succeeded when the music is in the database.
+        """
+        music = Music.objects.filter(music_id=video_id).first()
+        defaults = {'yt_link': yt_link, 'max_attempts': max_attempts}
+        if music is not None:
+            defaults.update(status=cls.SUCCEEDED, music=music, finished_at=timezone.now())
+        try:
+            with transaction.atomic():
+                job, created = cls.objects.get_or_create(video_id=video_id, defaults=defaults)
+        except IntegrityError:
+            # Another request created it between the lookup and the insert
+            job, created = cls.objects.get(video_id=video_id), False
+
+        if not created and job.status == cls.FAILED:
+            cls.objects.filter(pk=job.pk, status=cls.FAILED).update(
+                status=cls.QUEUED, attempts=0, max_attempts=max_attempts, error=None,
+                available_at=timezone.now(), finished_at=None, updated_at=timezone.now()
+            )
+            job.refresh_from_db()
+        return job
+
+    @classmethod
+    def claim(cls, worker: str) -> Optional["IngestJob"]:
+        """
+        Atomically take the oldest available queued job, None if there is none.
+        """
+        while True:
+            job = cls.objects.filter(status=cls.QUEUED, available_at__lte=timezone.now()).order_by('available_at').first()
+            if job is None:
+                return None
+            now = timezone.now()
+            claimed = cls.objects.filter(pk=job.pk, status=cls.QUEUED).update(
+                status=cls.RUNNING, worker=worker, started_at=now, attempts=F('attempts') + 1, updated_at=now
+            )
+            if claimed:
+                job.refresh_from_db()
+                return job
+            # Claimed by another worker in the meantime, try the next one
+
+    @classmethod
+    def requeue_stale(cls, timeout: float) -> int:
+        """
+        Queue again the jobs which have been running for more than `timeout` seconds (crashed workers).
+        """
+        deadline = timezone.now() - timedelta(seconds=timeout)
+        return cls.objects.filter(status=cls.RUNNING, started_at__lt=deadline).update(
+            status=cls.QUEUED, worker=None, available_at=timezone.now(), updated_at=timezone.now()
+        )
+
+    def succeed(self, music_id: str):
+        self.status = self.SUCCEEDED
+        self.music_id = music_id
+        self.error = None
+        self.finished_at = timezone.now()
+        self.save(update_fields=['status', 'music', 'error', 'finished_at', 'updated_at'])
+
+    def fail(self, error: str, retry_delay: float = 30):
+        """
+        Record a failed attempt: the job is queued again after `retry_delay * 2 ** (attempts - 1)`
+        seconds, or marked as failed once it has been tried `max_attempts` times.
+        """
+        self.error = error
+        if self.attempts < self.max_attempts:
+            self.status = self.QUEUED
+            self.available_at = timezone.now() + timedelta(seconds=retry_delay * 2 ** max(self.attempts - 1, 0))
+        else:
+            self.status = self.FAILED
+            self.finished_at = timezone.now()
+        self.save(update_fields=['status', 'error', 'available_at', 'finished_at', 'updated_at'])
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'video_id': self.video_id,
+            'yt_link': self.yt_link,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'error': self.error,
+            'music_id': self.music_id,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+        }
@@ -0,0 +1,208 @@
+import logging
+from typing import Iterable, Optional
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+
+from Music.index import FeatureIndex, feature_index
+from Music.models import Music, MusicNeighbor
+from Music.utils import SimilarityEngine
+
+logger = logging.getLogger("default")
+
+class NeighborGraph:
+    """
+    Materialized k-nearest-neighbour graph, stored in the `MusicNeighbor` table: the similar musics
+    of a track are read with a single indexed query (`lookup`) instead of a search.
+
+    The graph is built with `rebuild` (`manage.py build_neighbor_graph`) and then kept up to date
+    incrementally, through the signals of `Music` (see `Music.signals`), or explicitly for rows
+    written with `bulk_create`:
+    `add` writes the list of a new music and patches only the lists it enters,
+    `remove` recomputes the lists which held deleted musics.
+
+    Every similarity is exact, whatever `settings.MUSIC_SIMILARITY_BACKEND`.
+    """
+    # Rows per `bulk_create`, IDs per `__in` lookup
+    batch_size = 500
+
+    def __init__(self, k: int = None, index: FeatureIndex = None):
+        self._k = k
+        self.index = feature_index if index is None else index
+
+    @property
+    def k(self) -> int:
+        return self._k or getattr(settings, "MUSIC_NEIGHBOR_K", 20)
+
+    def _chunks(self, items: list):
+        for start in range(0, len(items), self.batch_size):
+            yield items[start:start + self.batch_size]
+
+    @staticmethod
+    def _edges(music_id: str, results: list[tuple[str, float]]) -> list[MusicNeighbor]:
+        return [
+            MusicNeighbor(music_id=music_id, neighbor_id=neighbor_id, rank=rank, similarity=similarity)
+            for rank, (neighbor_id, similarity) in enumerate(results)
+        ]
+
+    def _top(self, ids: list[str], scores: np.ndarray) -> list[tuple[str, float]]:
+        # The excluded musics score -inf (see `FeatureIndex.scores`)
+        k = min(self.k, int(np.count_nonzero(scores > -np.inf)))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(ids[i], float(scores[i])) for i in top]
+
+    def _write(self, lists: dict[str, list[tuple[str, float]]]):
+        # Replace the whole list of every given music
+        for chunk in self._chunks(list(lists)):
+            MusicNeighbor.objects.filter(music_id__in=chunk).delete()
+        MusicNeighbor.objects.bulk_create(
+            [edge for music_id, results in lists.items() for edge in self._edges(music_id, results)],
+            batch_size=self.batch_size
+        )
+
+    def rebuild(self, engine: SimilarityEngine = None, block: int = 4096) -> int:
+        """
+        Recompute every list from scratch, `block` musics at a time with `SimilarityEngine.search_batch`,
+        and replace the table in one transaction.
+
+        Arguments
+        -------
+            engine (SimilarityEngine, optional): _Defaults to every `Music.features` vector._
+                The musics to link.
+            block (int, optional): _Defaults to 4096._
+                The number of lists computed and written at once.
+
+        Returns
+        -------
+            count (int):
+                The number of edges written.
+        """
+        if engine is None:
+            engine = SimilarityEngine(*FeatureIndex.read_features())
+        count = 0
+        with transaction.atomic():
+            MusicNeighbor.objects.all().delete()
+            for start in range(0, len(engine), block):
+                ids = engine.ids[start:start + block]
+                results = engine.search_batch(engine.matrix[start:start + block], k=self.k, exclude=[(music_id,) for music_id in ids])
+                edges = [edge for music_id, result in zip(ids, results) for edge in self._edges(music_id, result)]
+                MusicNeighbor.objects.bulk_create(edges, batch_size=self.batch_size)
+                count += len(edges)
+        return count
+
+    def recompute(self, music_ids: Iterable[str], exclude: Iterable[str] = ()):
+        """
+        Recompute the lists of `music_ids` from the index, `exclude` never appearing in them.
+        Musics which are not in the index are skipped.
+        """
+        exclude = tuple(exclude)
+        lists = {}
+        for music_id in dict.fromkeys(music_ids):
+            vector = self.index.get_vector(music_id)
+            if vector is not None:
+                lists[music_id] = self._top(*self.index.scores(vector, exclude=(music_id, *exclude)))
+        with transaction.atomic():
+            self._write(lists)
+
+    def add(self, music_id: str, features):
+        """
+        Link a new music: its own list is computed with one pass over the index, then it is inserted
+        into the lists whose k-th similarity it beats, each losing its last neighbour.
+
+        Only the musics more similar to the new one than the lowest k-th similarity of the graph
+        are looked up, with the `(rank, similarity)` index. Adding a music again (new features)
+        also recomputes the lists which already held it.
+
+        The index is first brought up to date with the database (`FeatureIndex.pull_updates`):
+        in an ingest worker, it would otherwise miss the musics inserted by the other workers.
+        """
+        self.index.pull_updates()
+        self._link(music_id, features)
+
+    def _link(self, music_id: str, features):
+        # `add` against the index as it is
+        k = self.k
+        ids, scores = self.index.scores(features, exclude=(music_id,))
+        own = self._top(ids, scores)
+
+        with transaction.atomic():
+            stale = set(MusicNeighbor.objects.filter(neighbor_id=music_id).values_list('music_id', flat=True))
+            others = int(np.count_nonzero(scores > -np.inf))
+            if others <= k:
+                # Small catalogue: every list holds every other music
+                self._write({music_id: own})
+                self.recompute([other for other in ids if other != music_id])
+                return
+
+            lists = {music_id: own}
+            floor = MusicNeighbor.objects.filter(rank=k - 1).aggregate(floor=Min('similarity'))['floor']
+            if floor is not None:
+                candidates = {ids[i]: float(scores[i]) for i in np.flatnonzero(scores > floor) if ids[i] not in stale}
+                displaced = []
+                for chunk in self._chunks(list(candidates)):
+                    kth = MusicNeighbor.objects.filter(rank=k - 1, music_id__in=chunk).values_list('music_id', 'similarity')
+                    displaced.extend(other for other, similarity in kth if candidates[other] > similarity)
+
+                for chunk in self._chunks(displaced):
+                    rows = MusicNeighbor.objects.filter(music_id__in=chunk).order_by('music_id', 'rank')
+                    current = {}
+                    for other, neighbor_id, similarity in rows.values_list('music_id', 'neighbor_id', 'similarity'):
+                        current.setdefault(other, []).append((neighbor_id, similarity))
+                    for other, results in current.items():
+                        results.append((music_id, candidates[other]))
+                        results.sort(key=lambda result: -result[1])
+                        lists[other] = results[:k]
+            self._write(lists)
+            if stale:
+                self.recompute(stale)
+        logger.info(f"Neighbor graph: {music_id} linked, {len(lists) - 1} lists patched.")
+
+    def extend(self, music_ids: Iterable[str], features: Iterable):
+        # Bulk `add`, for rows written with `bulk_create`: the index is brought up to date once
+        self.index.pull_updates()
+        for music_id, vector in zip(music_ids, features):
+            self._link(music_id, vector)
+
+    def remove(self, music_ids: Iterable[str], referrers: Iterable[str]):
+        """
+        Repair the graph after `music_ids` have been deleted: `referrers` are the musics whose list
+        held one of them (their edges to them are gone with the rows, see `Music.signals`).
+
+        The deleted musics are dropped from the index first, the index may not have seen every
+        deletion yet, then the lists of the surviving referrers are recomputed at once.
+        """
+        deleted = set(music_ids)
+        for music_id in deleted:
+            self.index.remove(music_id)
+        self.recompute(set(referrers) - deleted, exclude=deleted)
+
+    def lookup(self, music_id: str, k: int = None) -> Optional[list[dict]]:
+        """
+        The `k` nearest neighbours of `music_id` with one query on `MusicNeighbor`, joined with
+        `Music` and `Artist`.
+
+        Returns
+        -------
+            musics (list[dict]):
+                As `MusicSimilarityComparator.compare`, None when the graph cannot answer: the
+                music has no list (not linked yet), or `k` is larger than the lists.
+        """
+        k = self.k if k is None else k
+        if k > self.k:
+            return None
+        fields = [f"neighbor__{field}" for field in Music.values_fields]
+        rows = MusicNeighbor.objects.filter(music_id=music_id).order_by('rank').values('similarity', *fields)[:k]
+        musics = []
+        for row in rows:
+            music = Music._format_music_data({field: row[f"neighbor__{field}"] for field in Music.values_fields})
+            music['similarity'] = row['similarity']
+            musics.append(music)
+        # A list shorter than k holds the whole catalogue
+        return musics or None
+
+neighbor_graph = NeighborGraph()
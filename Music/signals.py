@@ -0,0 +1,77 @@
+import logging
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from Music.index import feature_index
+from Music.models import Music, MusicNeighbor
+from Music.neighbors import neighbor_graph
+
+logger = logging.getLogger("default")
+
+def update_neighbor_graph(update, *args):
+    # The music is committed: a failed graph update is logged, `manage.py build_neighbor_graph` repairs it
+    if not settings.MUSIC_NEIGHBOR_GRAPH:
+        return
+    try:
+        update(*args)
+    except Exception as e:
+        logger.error(f"Neighbor graph update failed ({args[0]}): {str(e)}")
+
+@receiver(post_save, sender=Music, dispatch_uid="music_feature_index_upsert")
+def update_feature_index(sender, instance: Music, **kwargs):
+    transaction.on_commit(lambda: feature_index.upsert(
+        instance.music_id, instance.features, artist_id=instance.artist_id, view_count=instance.view_count
+    ))
+
+@receiver(pre_save, sender=Music, dispatch_uid="music_neighbor_graph_features")
+def detect_feature_change(sender, instance: Music, update_fields=None, **kwargs):
+    # Read before the update: the lists are only recomputed when the features of a music change
+    instance._features_changed = False
+    if not settings.MUSIC_NEIGHBOR_GRAPH or (update_fields is not None and "features" not in update_fields):
+        return
+    previous = Music.objects.filter(music_id=instance.music_id).values_list('features', flat=True).first()
+    instance._features_changed = previous is not None and not np.array_equal(
+        np.asarray(previous, dtype=np.float32), np.asarray(instance.features, dtype=np.float32)
+    )
+
+@receiver(post_save, sender=Music, dispatch_uid="music_neighbor_graph_add")
+def add_to_neighbor_graph(sender, instance: Music, created: bool, **kwargs):
+    # Registered after `update_feature_index`: runs once the index holds the new music or features
+    if created or instance._features_changed:
+        transaction.on_commit(lambda: update_neighbor_graph(neighbor_graph.add, instance.music_id, instance.features))
+
+@receiver(pre_delete, sender=Music, dispatch_uid="music_neighbor_graph_referrers")
+def collect_neighbor_referrers(sender, instance: Music, origin=None, **kwargs):
+    # Read before the cascade deletes the edges pointing at the music
+    instance._neighbor_referrers = list(
+        MusicNeighbor.objects.filter(neighbor_id=instance.music_id).values_list('music_id', flat=True)
+    )
+    # Every `pre_delete` of a `delete()` call is sent before its first `post_delete`: forget the
+    # removal of a previous call with the same origin (see `remove_from_neighbor_graph`)
+    (instance if origin is None else origin)._neighbor_graph_removal = None
+
+@receiver(post_delete, sender=Music, dispatch_uid="music_feature_index_remove")
+def remove_from_feature_index(sender, instance: Music, **kwargs):
+    # Read now: the primary key of a deleted instance is set to None before the commit
+    music_id = instance.music_id
+    transaction.on_commit(lambda: feature_index.remove(music_id))
+
+@receiver(post_delete, sender=Music, dispatch_uid="music_neighbor_graph_remove")
+def remove_from_neighbor_graph(sender, instance: Music, origin=None, **kwargs):
+    # Every music of one `delete()` call (e.g. a queryset) shares its `origin`: the graph is repaired
+    # once, after all of them, so that no recomputed list picks another deleted music
+    origin = instance if origin is None else origin
+    removal = getattr(origin, "_neighbor_graph_removal", None)
+    if removal is None:
+        deleted, referrers = removal = origin._neighbor_graph_removal = (set(), set())
+
+        def repair():
+            if referrers:
+                update_neighbor_graph(neighbor_graph.remove, deleted, referrers)
+        transaction.on_commit(repair)
+    removal[0].add(instance.music_id)
+    removal[1].update(getattr(instance, "_neighbor_referrers", []))
@@ -1,22 +1,151 @@
-from Music.models import Music
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
+from typing import Literal, Optional
+
+from django.conf import settings
+
+from Music.filters import MusicFilter
+from Music.index import FeatureIndex, feature_index
+from Music.models import Music
+from Music.neighbors import NeighborGraph, neighbor_graph
+from Music.utils import SimilarityEngine
 
 class MusicSimilarityComparator:
-    def compare(self, target_id: str):
-        target_music = Music.objects.filter(music_id=target_id).values().first()
-        musics = Music.get_all_music_exclude_id(target_id)
+    def __init__(self, k: int = 10, index: FeatureIndex = None, graph: NeighborGraph = None):
+        self.k = k
+        self.index = feature_index if index is None else index
+        self.graph = graph if graph is not None else neighbor_graph if settings.MUSIC_NEIGHBOR_GRAPH else None
 
-        # print(target_music, musics)
+    def compare(self, target_id: str, k: int = None, filters: MusicFilter = None):
+        """
+        Find the musics most similar to `target_id`.
 
-        similarities = []
-        target_features = np.array(target_music.get("features"), dtype=np.float32).reshape(1, -1)
+        The neighbours are read from the materialized `NeighborGraph` when it holds the list of
+        `target_id`. Otherwise the search runs on the in-memory `FeatureIndex`, and the database
+        is only queried to hydrate the selected musics.
 
-        for music in musics:
-            features = np.array(music.get("features"), dtype=np.float32).reshape(1, -1)
-            similarity = cosine_similarity(target_features, features)[0][0]
-            similarities.append((music, similarity))
+        Arguments
+        -------
+            target_id (str):
+                The ID of the music to compare with.
+            k (int, optional): _Defaults to `self.k`._
+                The number of musics to return.
+            filters (MusicFilter, optional):
+                Restricts the results. Filtered searches always run on the index, whose mask keeps
+                `k` results when the graph lists would run short.
+
+        Returns
+        -------
+            musics (list[dict]):
+                The most similar musics, in decreasing order of similarity. Each music carries its
+                cosine similarity to the target under the `similarity` key.
+                None if `target_id` does not exist.
+        """
+        k = self.k if k is None else k
+        if self.graph is not None and not filters:
+            musics = self.graph.lookup(target_id, k)
+            if musics is not None:
+                return musics
+
+        target_features = self.index.get_vector(target_id)
+        if target_features is None and self.index.refresh([target_id]):
+            target_features = self.index.get_vector(target_id)
+        if target_features is None:
+            return None
+
+        results = self.index.search(target_features, k=k, exclude=(target_id,), filters=filters)
+        return self._hydrate(results)
 
-        top_10_similar = sorted(similarities, key=lambda x: x[1], reverse=True)[:10]
+    def get_vectors(self, music_ids: list[str]) -> tuple[list[str], list[np.ndarray], list[str]]:
+        """
+        The feature vectors of `music_ids`, read from the database when the index misses them.
 
-        return [music for music, _ in top_10_similar]
\ No newline at end of file
+        Returns
+        -------
+            found (list[str]), vectors (list[np.ndarray]), missing (list[str])
+        """
+        vectors = {music_id: self.index.get_vector(music_id) for music_id in dict.fromkeys(music_ids)}
+        unknown = [music_id for music_id, vector in vectors.items() if vector is None]
+        if unknown and self.index.refresh(unknown):
+            vectors.update({music_id: self.index.get_vector(music_id) for music_id in unknown})
+        found = [music_id for music_id, vector in vectors.items() if vector is not None]
+        missing = [music_id for music_id, vector in vectors.items() if vector is None]
+        return found, [vectors[music_id] for music_id in found], missing
+
+    def compare_batch(
+        self,
+        music_ids: list[str] = (),
+        features: list = (),
+        k: int = None,
+        aggregate: Optional[Literal["centroid", "max"]] = None,
+        filters: MusicFilter = None
+    ) -> dict:
+        """
+        Find the musics most similar to many queries at once, with one tiled matrix-matrix search
+        (see `SimilarityEngine.search_batch`) and one database query to hydrate every result.
+
+        Arguments
+        -------
+            music_ids (list[str]):
+                Queries given by music ID. They never appear in the results.
+            features (list):
+                Queries given as raw feature vectors.
+            k (int, optional): _Defaults to `self.k`._
+                The number of musics per result list.
+            aggregate (Literal["centroid", "max"], optional): _Defaults to None._
+                None gives one result list per query. Otherwise the queries are a seed set with a
+                single result list: the musics closest to the mean of the seeds (`"centroid"`), or
+                scored by their highest similarity to any seed (`"max"`).
+            filters (MusicFilter, optional):
+                Restricts every result list.
+
+        Returns
+        -------
+            results (dict):
+                `{"results": [{"query": str | int, "data": list[dict]}], "missing": list[str]}`.
+                `query` is the music ID, or the position in `features` of a raw vector; with
+                `aggregate`, there is one result whose `query` is the aggregation. `missing` lists
+                the unknown music IDs.
+        """
+        k = self.k if k is None else k
+        found, vectors, missing = self.get_vectors(list(music_ids))
+        queries = vectors + [np.asarray(vector, dtype=np.float32) for vector in features]
+        dim = self.index.engine.dim
+        if len(self.index) and any(query.shape != (dim,) for query in queries):
+            raise ValueError(f"Feature vectors must have {dim} values.")
+        labels = found + list(range(len(features)))
+        if len(queries) == 0:
+            return {"results": [], "missing": missing}
+
+        if aggregate is None:
+            exclude = [(music_id,) for music_id in found] + [()] * len(features)
+            results = self.index.search_batch(np.stack(queries), k=k, exclude=exclude, filters=filters)
+        elif aggregate == "centroid":
+            centroid = SimilarityEngine.normalize(np.stack(queries)).mean(axis=0)
+            results = [self.index.search(centroid, k=k, exclude=found, filters=filters)]
+            labels = [aggregate]
+        elif aggregate == "max":
+            results = [self.index.search_max(np.stack(queries), k=k, exclude=found, filters=filters)]
+            labels = [aggregate]
+        else:
+            raise ValueError(f"Unknown aggregate: {aggregate}")
+
+        hydrated = self._hydrate_many(results)
+        return {
+            "results": [{"query": label, "data": data} for label, data in zip(labels, hydrated)],
+            "missing": missing
+        }
+
+    def _hydrate_many(self, results: list[list[tuple[str, float]]]) -> list[list[dict]]:
+        ids = list(dict.fromkeys(music_id for result in results for music_id, _ in result))
+        musics = {music.get('music_id'): music for music in Music.get_musics_from_ids(ids)}
+        return [
+            [{**musics[music_id], 'similarity': score} for music_id, score in result if music_id in musics]
+            for result in results
+        ]
+
+    def _hydrate(self, results: list[tuple[str, float]]):
+        scores = dict(results)
+        musics = Music.get_musics_from_ids([music_id for music_id, _ in results])
+        for music in musics:
+            music['similarity'] = scores[music.get('music_id')]
+        return musics
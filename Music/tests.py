@@ -1,15 +1,27 @@
-from django.test import TestCase
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.urls import reverse
-from Music.models import Artist
+from django.utils import timezone
+from Music.fields import VectorField
+from Music.index import FeatureIndex, feature_index
+from Music import jobs
+from Music.bulk import BulkIngestor, directory_tasks, link_tasks, read_links
+from Music.filters import MusicFilter
+from Music.models import Artist, IngestJob, Music, MusicNeighbor
+from Music.neighbors import NeighborGraph, neighbor_graph
+from Music.similiarity import MusicSimilarityComparator
+from Music.utils import IVFEngine, QuantizedEngine, ShardedEngine, SimilarityEngine
+from Music.utils.snapshot import FeatureSnapshot
+from sklearn.metrics.pairwise import cosine_similarity
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from unittest.mock import patch
-
-class MockResponse:
-    def __init__(self, json_data, status_code):
-        self.json_data = json_data
-        self.status_code = status_code
-
-    def json(self):
-        return self.json_data
+import numpy as np
+import io
+import json
+import os
+import tempfile
+import threading
 
 class AddMusicTest(TestCase):
     def setUp(self):
@@ -36,33 +48,875 @@ class AddMusicTest(TestCase):
         }
 
 
-    @patch('Music.views.requests.post')  # 模擬 requests.post
-    @patch('Feature.views.get_full_data')  # 模擬 Feature.views.get_feature
-    def test_add_music(self, mock_get_info, mock_post):
+    @patch('Music.views.services.get_full_data')  # 模擬 Feature.services.get_full_data
+    def test_add_music(self, mock_get_full_data):
         urls = [
             "https://www.youtube.com/watch?v=4VkWsBukAWI",
             "https://www.youtube.com/watch?v=7JJfJgyHYwU",
             "https://www.youtube.com/watch?v=hT_nvWreIhg",
         ]
 
-        # 設定 mock_get_info 的返回值
-        mock_get_info.return_value.status_code = 200
-        mock_get_info.return_value.json.return_value = self.mock_data
-
-        # 設定 mock_post 的返回值
-        mock_post.return_value.status_code = 200
-        mock_post.return_value.json.return_value = self.mock_data
+        # 設定 mock_get_full_data 的返回值
+        mock_get_full_data.return_value = {
+            "feature": np.array(self.mock_data["feature"]["data"], dtype=np.float32),
+            "info": self.mock_data["info"]
+        }
 
         for url in urls:
             data = {"yt_link": url}
 
             # 發送 POST 請求到 'upload_music'
             response = self.client.post(reverse('upload_music'), data=data, format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["data"]["music_id"], "h_D3VFfhvs4")
 
-            print(response.json())
+        # 已上傳的連結直接從資料庫取得
+        response = self.client.post(reverse('upload_music'), data={"yt_link": self.mock_data["info"]["youtube_url"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_get_full_data.call_count, len(urls))
 
-        data = {'target_id': 1}
+        data = {"yt_link": self.mock_data["info"]["youtube_url"]}
 
         top10 = self.client.post(reverse('get_similiar_musics'), data=data)
-        print(top10.json())
-        
+        self.assertEqual(top10.status_code, 200)
+        self.assertEqual(top10.json()["original_data"]["music_id"], "h_D3VFfhvs4")
+
+    def test_invalid_link(self):
+        response = self.client.post(reverse('upload_music'), data={"yt_link": "https://example.com"})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(reverse('get_similiar_musics'), data={})
+        self.assertEqual(response.status_code, 400)
+
+
+class SimilarityEngineTest(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.features = rng.random((200, 10), dtype=np.float32)
+        self.ids = [f"id_{i}" for i in range(len(self.features))]
+        self.engine = SimilarityEngine(self.ids, self.features)
+
+    def test_search_matches_brute_force(self):
+        query = self.features[3]
+        expected = cosine_similarity(query.reshape(1, -1), self.features)[0]
+        expected[3] = -np.inf
+        expected_ids = [self.ids[i] for i in np.argsort(-expected)[:10]]
+
+        results = self.engine.search(query, k=10, exclude=("id_3",))
+
+        self.assertEqual([music_id for music_id, _ in results], expected_ids)
+        self.assertTrue(np.allclose([score for _, score in results], np.sort(expected)[::-1][:10], atol=1e-5))
+
+    def test_search_k_larger_than_catalogue(self):
+        engine = SimilarityEngine(self.ids[:3], self.features[:3])
+        results = engine.search(self.features[0], k=10, exclude=("id_0",))
+        self.assertEqual(len(results), 2)
+
+    def test_add_and_remove(self):
+        engine = SimilarityEngine()
+        for music_id, features in zip(self.ids, self.features):
+            engine.add(music_id, features)
+        self.assertTrue(np.allclose(engine.matrix, self.engine.matrix))
+
+        engine.remove("id_0").remove("id_unknown")
+        self.assertNotIn("id_0", engine)
+        self.assertEqual(len(engine), len(self.ids) - 1)
+        self.assertTrue(np.allclose(engine.get_vector("id_199"), self.engine.get_vector("id_199")))
+        self.assertEqual(engine.search(self.features[0], k=1)[0][0], self.engine.search(self.features[0], k=1, exclude=("id_0",))[0][0])
+
+    def test_empty_engine(self):
+        self.assertEqual(SimilarityEngine().search(self.features[0]), [])
+
+    def test_search_batch_matches_search(self):
+        queries = np.concatenate([self.features[:20], np.random.default_rng(1).random((5, 10), dtype=np.float32)])
+        exclude = [(music_id,) for music_id in self.ids[:20]] + [()] * 5
+        expected = [self.engine.search(query, k=7, exclude=ids) for query, ids in zip(queries, exclude)]
+
+        # Tiles smaller than k and not dividing the catalogue
+        for query_block, catalog_block in ((3, 5), (8, 64), (256, 4096)):
+            results = self.engine.search_batch(queries, k=7, exclude=exclude, query_block=query_block, catalog_block=catalog_block)
+            self.assertEqual([[i for i, _ in r] for r in results], [[i for i, _ in r] for r in expected])
+            self.assertTrue(np.allclose([[s for _, s in r] for r in results], [[s for _, s in r] for r in expected], atol=1e-6))
+
+        self.assertEqual(len(self.engine.search_batch(queries[:2], k=500)[0]), 200)
+        self.assertEqual(self.engine.search_batch(queries[:0]), [])
+        self.assertEqual(SimilarityEngine().search_batch(queries[:2]), [[], []])
+
+    def test_search_max(self):
+        seeds = self.features[:4]
+        expected = cosine_similarity(seeds, self.features).max(axis=0)
+        expected[:4] = -np.inf
+
+        results = self.engine.search_max(seeds, k=10, exclude=self.ids[:4], query_block=3, catalog_block=50)
+
+        self.assertEqual([music_id for music_id, _ in results], [self.ids[i] for i in np.argsort(-expected)[:10]])
+        self.assertTrue(np.allclose([score for _, score in results], np.sort(expected)[::-1][:10], atol=1e-5))
+
+    def test_columns_follow_updates(self):
+        engine = SimilarityEngine(self.ids[:10], self.features[:10])
+        engine.set_column("views", self.ids[:10], np.arange(10), fill=-1)
+        engine.add("new", self.features[10]).remove("id_2").remove("id_9")
+        engine.set_column("views", ["id_0", "unknown"], [100, 5])
+
+        self.assertEqual(engine.ids, ["id_0", "id_1", "new", "id_3", "id_4", "id_5", "id_6", "id_7", "id_8"])
+        self.assertEqual(engine.column("views").tolist(), [100, 1, -1, 3, 4, 5, 6, 7, 8])
+        self.assertIsNone(engine.column("unknown"))
+
+    def test_search_with_mask(self):
+        mask = np.arange(len(self.ids)) % 3 == 0
+        subset = SimilarityEngine([i for i, keep in zip(self.ids, mask) if keep], self.features[mask])
+        queries = self.features[:6]
+
+        self.assertEqual(self.engine.search(queries[0], k=10, exclude=("id_3",), mask=mask), subset.search(queries[0], k=10, exclude=("id_3",)))
+        results = self.engine.search_batch(queries, k=10, mask=mask, query_block=4, catalog_block=32)
+        for result, expected in zip(results, subset.search_batch(queries, k=10)):
+            self.assertEqual([i for i, _ in result], [i for i, _ in expected])
+        self.assertEqual(
+            [i for i, _ in self.engine.search_max(queries, k=10, mask=mask)],
+            [i for i, _ in subset.search_max(queries, k=10)]
+        )
+        # Fewer matching rows than k
+        self.assertEqual(len(self.engine.search(queries[0], k=500, mask=mask)), mask.sum())
+        self.assertEqual(self.engine.search(queries[0], mask=np.zeros(len(self.ids), dtype=bool)), [])
+
+
+class IVFEngineTest(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.features = rng.random((500, 10), dtype=np.float32)
+        self.ids = [f"id_{i}" for i in range(len(self.features))]
+        self.exact = SimilarityEngine(self.ids, self.features)
+        self.ivf = IVFEngine(self.ids, self.features, n_lists=16, n_probe=4)
+
+    def assertSameResults(self, results, expected):
+        self.assertEqual([music_id for music_id, _ in results], [music_id for music_id, _ in expected])
+
+    def test_full_probe_is_exact(self):
+        for query in self.features[:20]:
+            self.assertSameResults(self.ivf.search(query, k=10, n_probe=16), self.exact.search(query, k=10))
+
+    def test_recall(self):
+        hits = 0
+        for query in self.features[:50]:
+            expected = {music_id for music_id, _ in self.exact.search(query, k=10)}
+            hits += len(expected & {music_id for music_id, _ in self.ivf.search(query, k=10)})
+        self.assertGreater(hits / 500, 0.8)
+
+    def test_add_remove_and_exclude(self):
+        self.ivf.add("new", self.features[0])
+        self.assertIn("new", [music_id for music_id, _ in self.ivf.search(self.features[0], k=2, n_probe=16)])
+
+        self.ivf.remove("new").remove("id_0")
+        results = self.ivf.search(self.features[0], k=10, n_probe=16, exclude=("id_1",))
+        self.assertNotIn("new", [music_id for music_id, _ in results])
+        self.assertNotIn("id_0", [music_id for music_id, _ in results])
+        self.assertNotIn("id_1", [music_id for music_id, _ in results])
+        self.assertEqual(sum(len(cell) for cell in self.ivf._lists), len(self.ivf))
+
+    def test_search_with_mask(self):
+        mask = np.arange(len(self.ids)) % 2 == 0
+        for query in self.features[:10]:
+            self.assertSameResults(self.ivf.search(query, k=10, n_probe=16, mask=mask), self.exact.search(query, k=10, mask=mask))
+        for results in self.ivf.search_batch(self.features[:5], k=10, mask=mask):
+            self.assertTrue(all(int(music_id[3:]) % 2 == 0 for music_id, _ in results))
+
+    def test_sparse_mask_widens_probe(self):
+        # 12 matching rows, fewer than k in the cells of a single probe
+        mask = np.zeros(len(self.ids), dtype=bool)
+        mask[::42] = True
+        for query in self.features[:10]:
+            results = self.ivf.search(query, k=10, n_probe=1, mask=mask)
+            self.assertEqual(len(results), 10)
+            self.assertTrue(all(mask[int(music_id[3:])] for music_id, _ in results))
+        self.assertEqual(len(self.ivf.search(self.features[0], k=20, n_probe=1, mask=mask)), 12)
+
+    def test_save_load_and_merge(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "ivf.npz")
+            self.ivf.save(path)
+            loaded = IVFEngine.load(path)
+
+        self.assertEqual(loaded.ids, self.ivf.ids)
+        self.assertTrue(np.allclose(loaded.centroids, self.ivf.centroids))
+        self.assertSameResults(loaded.search(self.features[5]), self.ivf.search(self.features[5]))
+
+        other = SimilarityEngine(["x", "y"], self.features[:2])
+        loaded.merge(other)
+        self.assertEqual(len(loaded), len(self.ids) + 2)
+        self.assertIn("x", [music_id for music_id, _ in loaded.search(self.features[0], k=3, n_probe=16)])
+
+
+class QuantizedEngineTest(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.ids = [f"id_{i}" for i in range(2000)]
+        self.features = rng.random((2000, 10), dtype=np.float32)
+        self.exact = SimilarityEngine(self.ids, self.features)
+
+    def assertExact(self, engine, query, k=10, exclude=()):
+        results = engine.search(query, k=k, exclude=exclude)
+        expected = self.exact.search(query, k=k, exclude=exclude)
+        self.assertEqual([music_id for music_id, _ in results], [music_id for music_id, _ in expected])
+        self.assertTrue(np.allclose([score for _, score in results], [score for _, score in expected], atol=1e-6))
+
+    def test_codes(self):
+        for precision, dtype in (("int8", np.int8), ("float16", np.float16)):
+            engine = QuantizedEngine(self.ids, self.features, precision=precision)
+            self.assertEqual(engine.codes.dtype, dtype)
+            self.assertEqual(engine.code_bytes, 10 * np.dtype(dtype).itemsize)
+            error = np.abs(engine.approximate_scores(self.features[0]) - self.exact.scores(self.features[0])).max()
+            self.assertLess(error, 0.01)
+        with self.assertRaises(ValueError):
+            QuantizedEngine(precision="int4")
+
+    def test_search_reranks_exactly(self):
+        for precision in ("int8", "float16"):
+            engine = QuantizedEngine(self.ids, self.features, precision=precision)
+            for i in range(10):
+                self.assertExact(engine, self.features[i], exclude=(self.ids[i],))
+            exclude = [(music_id,) for music_id in self.ids[:10]]
+            batch = engine.search_batch(self.features[:10], k=10, exclude=exclude, catalog_block=300)
+            self.assertEqual(batch, [engine.search(self.features[i], k=10, exclude=exclude[i]) for i in range(10)])
+        self.assertEqual(len(engine.search(self.features[0], k=5000)), 2000)
+        self.assertEqual(QuantizedEngine().search(self.features[0]), [])
+
+    def test_add_and_remove(self):
+        engine = QuantizedEngine()
+        engine.extend(self.ids[:1500], self.features[:1500])
+        for music_id, vector in zip(self.ids[1500:], self.features[1500:]):
+            engine.add(music_id, vector)
+        for music_id in self.ids[:100]:
+            engine.remove(music_id)
+            self.exact.remove(music_id)
+        self.assertTrue(np.array_equal(engine.codes, engine.encode(engine.matrix)))
+        self.assertExact(engine, self.features[200])
+
+    def test_search_with_mask(self):
+        engine = QuantizedEngine(self.ids, self.features)
+        mask = np.arange(len(self.ids)) % 4 == 0
+        for i in range(5):
+            self.assertEqual(
+                [music_id for music_id, _ in engine.search(self.features[i], k=10, mask=mask)],
+                [music_id for music_id, _ in self.exact.search(self.features[i], k=10, mask=mask)]
+            )
+        self.assertEqual(engine.search_batch(self.features[:5], k=10, mask=mask), [engine.search(query, k=10, mask=mask) for query in self.features[:5]])
+
+    def test_from_memory_mapped_matrix(self):
+        with tempfile.TemporaryDirectory() as directory:
+            FeatureSnapshot(directory).write(self.exact.ids, self.exact.matrix)
+            snapshot, _ = FeatureSnapshot(directory).load()
+            engine = QuantizedEngine.from_normalized(snapshot.ids, snapshot.matrix, precision="int8")
+            self.assertIsInstance(engine.matrix, np.memmap)
+            self.assertExact(engine, self.features[3])
+            del engine, snapshot
+
+class ShardedEngineTest(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.ids = [f"id_{i}" for i in range(500)]
+        self.features = rng.random((500, 10), dtype=np.float32)
+        self.exact = SimilarityEngine(self.ids, self.features)
+        self.engine = ShardedEngine(self.ids, self.features, n_shards=3)
+        self.addCleanup(self.engine.close)
+
+    def assertSameResults(self, results, expected):
+        self.assertEqual([music_id for music_id, _ in results], [music_id for music_id, _ in expected])
+        self.assertTrue(np.allclose([score for _, score in results], [score for _, score in expected], atol=1e-6))
+
+    def test_search_matches_exact(self):
+        self.assertTrue(self.engine._is_sharded())
+        self.assertIsInstance(self.engine.matrix, np.memmap)
+        for i in range(5):
+            self.assertSameResults(self.engine.search(self.features[i], k=8, exclude=(self.ids[i],)), self.exact.search(self.features[i], k=8, exclude=(self.ids[i],)))
+
+        exclude = [(music_id,) for music_id in self.ids[:6]]
+        for results, expected in zip(self.engine.search_batch(self.features[:6], k=4, exclude=exclude), self.exact.search_batch(self.features[:6], k=4, exclude=exclude)):
+            self.assertSameResults(results, expected)
+        self.assertEqual(len(self.engine.search(self.features[0], k=1000)), 500)
+
+    def test_search_with_mask(self):
+        mask = np.arange(len(self.ids)) % 3 != 0
+        self.assertSameResults(self.engine.search(self.features[0], k=8, mask=mask), self.exact.search(self.features[0], k=8, mask=mask))
+        for results, expected in zip(self.engine.search_batch(self.features[:4], k=8, mask=mask), self.exact.search_batch(self.features[:4], k=8, mask=mask)):
+            self.assertSameResults(results, expected)
+
+    def test_updates_reach_the_shards(self):
+        vector = np.random.default_rng(1).random(10)
+        self.engine.add("new", vector)
+        self.engine.remove("id_0")
+        self.exact.add("new", vector).remove("id_0")
+        self.assertEqual(self.engine.search(vector, k=1)[0][0], "new")
+        self.assertSameResults(self.engine.search(self.features[0], k=5), self.exact.search(self.features[0], k=5))
+
+    def test_small_catalogue_stays_in_process(self):
+        engine = ShardedEngine(self.ids, self.features, n_shards=3, min_rows=1000)
+        with patch("Music.utils.sharded.get_pool", side_effect=AssertionError("scattered")):
+            self.assertSameResults(engine.search(self.features[0], k=3), self.exact.search(self.features[0], k=3))
+        path = engine._path
+        engine.close()
+        self.assertFalse(os.path.exists(path))
+
+    def test_index_backend(self):
+        engine = FeatureIndex.create_engine("sharded", self.ids[:10], self.features[:10])
+        self.assertIsInstance(engine, ShardedEngine)
+        self.assertEqual(engine.search(self.features[0], k=1)[0][0], "id_0")
+        engine.close()
+
+class VectorFieldTest(TestCase):
+    def test_encode_decode(self):
+        values = [0.0, 0.4453675448894501, 1.0]
+        data = VectorField.encode(values)
+
+        self.assertEqual(len(data), VectorField.HEADER.size + 4 * len(values))
+        self.assertEqual(data[:2], b"EV")
+        decoded = VectorField.decode(data)
+        self.assertEqual(decoded.dtype, np.dtype("<f4"))
+        self.assertTrue(np.array_equal(decoded, np.array(values, dtype=np.float32)))
+        self.assertFalse(decoded.flags.owndata)
+
+    def test_decode_invalid(self):
+        with self.assertRaises(ValueError):
+            VectorField.decode(b"XX\x01\x00\x00\x00\x00\x00")
+
+    def test_model_round_trip(self):
+        artist = Artist.objects.create(artist_id="@artist", name="Artist A")
+        Music.objects.create(music_id="a", artist=artist, features=[0.5, 0.25])
+
+        features = Music.objects.get(music_id="a").features
+        self.assertIsInstance(features, np.ndarray)
+        self.assertEqual(features.tolist(), [0.5, 0.25])
+        self.assertEqual(Music.get_music_from_id("a").get("features"), [0.5, 0.25])
+
+
+class MusicSimilarityComparatorTest(TestCase):
+    def setUp(self):
+        artist = Artist.objects.create(artist_id="@artist", name="Artist A")
+        self.vectors = {
+            "a": [1.0, 0.0, 0.0],
+            "b": [0.9, 0.1, 0.0],
+            "c": [0.0, 1.0, 0.0],
+            "d": [0.5, 0.5, 0.0],
+        }
+        for music_id, features in self.vectors.items():
+            Music.objects.create(music_id=music_id, title=music_id, artist=artist, features=features)
+
+    def test_compare(self):
+        res = MusicSimilarityComparator(k=2, index=FeatureIndex()).compare("a")
+
+        self.assertEqual([music.get("music_id") for music in res], ["b", "d"])
+        self.assertEqual(res[0].get("artist_name"), "Artist A")
+        self.assertAlmostEqual(res[0].get("similarity"), cosine_similarity([self.vectors["a"]], [self.vectors["b"]])[0][0], places=5)
+
+    def test_compare_unknown_music(self):
+        self.assertIsNone(MusicSimilarityComparator(index=FeatureIndex()).compare("unknown"))
+
+    def test_compare_with_ivf_backend(self):
+        res = MusicSimilarityComparator(k=2, index=FeatureIndex(backend="ivf")).compare("a")
+        self.assertEqual([music.get("music_id") for music in res], ["b", "d"])
+
+    def test_compare_with_quantized_backend(self):
+        res = MusicSimilarityComparator(k=2, index=FeatureIndex(backend="quantized")).compare("a")
+        self.assertEqual([music.get("music_id") for music in res], ["b", "d"])
+
+    def test_compare_batch(self):
+        comparator = MusicSimilarityComparator(k=2, index=FeatureIndex())
+        res = comparator.compare_batch(music_ids=["a", "c", "unknown"], features=[[0.0, 0.9, 0.1]])
+
+        self.assertEqual(res["missing"], ["unknown"])
+        self.assertEqual([result["query"] for result in res["results"]], ["a", "c", 0])
+        self.assertEqual([[music["music_id"] for music in result["data"]] for result in res["results"]], [["b", "d"], ["d", "b"], ["c", "d"]])
+        self.assertEqual(res["results"][0]["data"], comparator.compare("a"))
+
+    def test_compare_batch_aggregate(self):
+        comparator = MusicSimilarityComparator(k=2, index=FeatureIndex())
+
+        centroid = comparator.compare_batch(music_ids=["a", "c"], aggregate="centroid")["results"]
+        self.assertEqual([result["query"] for result in centroid], ["centroid"])
+        self.assertEqual([music["music_id"] for music in centroid[0]["data"]], ["d", "b"])
+
+        best = comparator.compare_batch(music_ids=["a", "c"], aggregate="max")["results"][0]
+        self.assertEqual([music["music_id"] for music in best["data"]], ["b", "d"])
+        self.assertAlmostEqual(best["data"][0]["similarity"], cosine_similarity([self.vectors["a"]], [self.vectors["b"]])[0][0], places=5)
+
+        self.assertEqual(comparator.compare_batch(music_ids=["unknown"]), {"results": [], "missing": ["unknown"]})
+        with self.assertRaises(ValueError):
+            comparator.compare_batch(features=[[1.0, 0.0]])
+
+    def test_compare_with_filters(self):
+        other = Artist.objects.create(artist_id="@other", name="Artist B")
+        Music.objects.create(music_id="e", title="e", artist=other, view_count=50, features=[0.95, 0.05, 0.0])
+        Music.objects.filter(music_id="d").update(view_count=100)
+        comparator = MusicSimilarityComparator(k=2, index=FeatureIndex())
+
+        def compare(**filters):
+            return [music.get("music_id") for music in comparator.compare("a", filters=MusicFilter(**filters))]
+
+        self.assertEqual(compare(), ["e", "b"])
+        self.assertEqual(compare(exclude_artists=frozenset({"@artist"})), ["e"])
+        self.assertEqual(compare(exclude_artists=frozenset({"@other"})), ["b", "d"])
+        self.assertEqual(compare(min_view_count=10), ["e", "d"])
+        self.assertEqual(compare(exclude_ids=frozenset({"e", "b"})), ["d", "c"])
+
+        batch = comparator.compare_batch(music_ids=["a", "c"], filters=MusicFilter(min_view_count=60))
+        self.assertEqual([[music["music_id"] for music in result["data"]] for result in batch["results"]], [["d"], ["d"]])
+
+    def test_index_columns_follow_updates(self):
+        index = FeatureIndex().load()
+        self.assertEqual(index.engine.column("view_count").tolist(), [0, 0, 0, 0])
+        index.upsert("e", [0.95, 0.05, 0.0], artist_id="@other", view_count=7)
+        index.remove("b")
+        self.assertEqual(index.engine.ids, ["a", "e", "c", "d"])
+        self.assertEqual(index.engine.column("view_count").tolist(), [0, 7, 0, 0])
+        self.assertEqual(index.mask(MusicFilter(exclude_artists=frozenset({"@artist"}))).tolist(), [False, True, False, False])
+        self.assertIsNone(index.mask(MusicFilter()))
+
+    def test_filter_parse(self):
+        self.assertEqual(
+            MusicFilter.parse({"exclude_artists": ["@a"], "min_view_count": "10", "exclude_ids": []}),
+            MusicFilter(exclude_artists=frozenset({"@a"}), min_view_count=10)
+        )
+        self.assertFalse(MusicFilter.parse(None))
+        for data in ({"min_view_count": "many"}, {"exclude_ids": "a"}, [1]):
+            with self.assertRaises(ValueError):
+                MusicFilter.parse(data)
+
+    def test_batch_endpoint(self):
+        feature_index.reset()
+        url = reverse("get_similiar_musics_batch")
+        response = self.client.post(url, json.dumps({"music_ids": ["a", "c"], "features": [[0.0, 1.0, 0.0]], "k": 1}), content_type="application/json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([[music["music_id"] for music in result["data"]] for result in response.json()["data"]], [["b"], ["d"], ["c"]])
+
+        response = self.client.post(url, {"music_ids": ["a", "c"], "aggregate": "max", "k": "1"})
+        self.assertEqual(response.json()["data"][0]["data"][0]["music_id"], "b")
+
+        response = self.client.post(url, json.dumps({"music_ids": ["a"], "k": 1, "filters": {"exclude_ids": ["b"]}}), content_type="application/json")
+        self.assertEqual(response.json()["data"][0]["data"][0]["music_id"], "d")
+
+        for body in (
+            {}, {"music_ids": "a"}, {"music_ids": ["a"], "k": 0}, {"music_ids": ["a"], "aggregate": "sum"}, {"features": [[1.0, 0.0]]}, {"features": [["x"]]},
+            {"music_ids": ["a"], "filters": {"min_view_count": "x"}}, {"music_ids": ["a"], "filters": ["b"]}
+        ):
+            response = self.client.post(url, json.dumps(body), content_type="application/json")
+            self.assertEqual(response.status_code, 400, body)
+        with self.settings(MUSIC_BATCH_MAX_QUERIES=1):
+            response = self.client.post(url, json.dumps({"music_ids": ["a", "b"]}), content_type="application/json")
+            self.assertEqual(response.status_code, 400)
+        feature_index.reset()
+
+    def test_index_picks_up_rows_of_other_processes(self):
+        index = FeatureIndex().load()
+        # Inserted by an ingest worker: its signals only reach the worker's index
+        Music.objects.bulk_create([Music(music_id="e", title="e", artist_id="@artist", features=[1.0, 0.02, 0.0])])
+        IngestJob.objects.create(video_id="e", yt_link="https://www.youtube.com/watch?v=e", status=IngestJob.SUCCEEDED, music_id="e", finished_at=timezone.now())
+        # Jobs, count, then the features and columns of the new music
+        with self.assertNumQueries(4):
+            index.pull_updates()
+        self.assertEqual(index.search(self.vectors["a"], k=1, exclude=("a",))[0][0], "e")
+
+        # Bulk ingest (no job) and deletes of another process
+        Music.objects.bulk_create([Music(music_id="f", title="f", artist_id="@artist", features=[0.0, 0.0, 1.0])])
+        index.pull_updates()
+        self.assertIn("f", index.engine)
+        Music.objects.filter(music_id__in=["b", "c"]).delete()
+        index.pull_updates()
+        self.assertEqual(sorted(index.engine.ids), ["a", "d", "e", "f"])
+
+        # Same number of musics: only seen by the periodic comparison of the ID lists
+        Music.objects.filter(music_id="f").delete()
+        Music.objects.bulk_create([Music(music_id="g", title="g", artist_id="@artist", features=[0.0, 1.0, 0.0])])
+        index.pull_updates()
+        self.assertIn("f", index.engine)
+        index.full_sync_interval = 0
+        index.pull_updates()
+        self.assertEqual(sorted(index.engine.ids), ["a", "d", "e", "g"])
+
+    @override_settings(MUSIC_FEATURE_INDEX_SYNC_INTERVAL=0)
+    def test_index_sync_runs_in_background(self):
+        index = FeatureIndex().load()
+        threads = []
+        with patch.object(FeatureIndex, "pull_updates", side_effect=lambda: threads.append(threading.get_ident())):
+            with self.assertNumQueries(0):
+                index.search(self.vectors["a"], k=1)
+            thread = index._sync_thread
+            if thread is not None:
+                thread.join()
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
+
+    def test_index_follows_uploads_and_deletes(self):
+        feature_index.reset()
+        comparator = MusicSimilarityComparator(k=10)
+        self.assertEqual(len(comparator.compare("a")), 3)
+
+        info = {"id": "e", "author_id": "@artist", "author": "Artist A", "title": "e", "view_count": 0, "like_count": 0}
+        with self.captureOnCommitCallbacks(execute=True):
+            Music.upload_music(info=info, features=[1.0, 0.05, 0.0])
+        res = comparator.compare("a")
+        self.assertEqual(res[0].get("music_id"), "e")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Music.objects.filter(music_id="e").delete()
+        self.assertNotIn("e", [music.get("music_id") for music in comparator.compare("a")])
+        self.assertNotIn("e", feature_index.engine)
+        feature_index.reset()
+
+
+class FeatureSnapshotTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        artist = Artist.objects.create(artist_id="@artist", name="Artist A")
+        for music_id, features in {"a": [1.0, 0.0], "b": [0.9, 0.1], "c": [0.0, 1.0]}.items():
+            Music.objects.create(music_id=music_id, title=music_id, artist=artist, features=features)
+
+    def test_write_and_map(self):
+        snapshot = FeatureSnapshot(self.tmp.name)
+        engine = SimilarityEngine(["a", "b"], [[1.0, 0.0], [0.0, 2.0]])
+        self.assertEqual(snapshot.write(engine.ids, engine.matrix), 1)
+        self.assertEqual(snapshot.write(engine.ids, engine.matrix), 2)
+
+        loaded, generation = snapshot.load()
+        self.assertEqual(generation, 2)
+        self.assertIsInstance(loaded.matrix, np.memmap)
+        self.assertEqual(loaded.ids, ["a", "b"])
+        self.assertEqual(loaded.search([0.0, 1.0], k=1)[0][0], "b")
+
+        loaded.add("c", [1.0, 1.0]).remove("a")
+        self.assertEqual(sorted(loaded.ids), ["b", "c"])
+        self.assertFalse(snapshot.is_stale(2))
+
+    def test_index_reloads_stale_snapshot(self):
+        call_command("export_feature_snapshot", dir=self.tmp.name, stdout=io.StringIO())
+        index = FeatureIndex(backend="exact", snapshot_dir=self.tmp.name)
+
+        with override_settings(MUSIC_FEATURE_SNAPSHOT_CHECK_INTERVAL=0):
+            self.assertEqual(index.search([1.0, 0.0], k=1, exclude=("a",))[0][0], "b")
+            self.assertIsInstance(index.engine.matrix, np.memmap)
+            self.assertEqual(index._generation, 1)
+
+            Music.objects.filter(music_id="b").delete()
+            call_command("export_feature_snapshot", dir=self.tmp.name, stdout=io.StringIO())
+            self.assertEqual(index.search([1.0, 0.0], k=1, exclude=("a",))[0][0], "c")
+            self.assertEqual(index._generation, 2)
+
+@override_settings(MUSIC_NEIGHBOR_K=5)
+class NeighborGraphTest(TestCase):
+    def setUp(self):
+        self.artist = Artist.objects.create(artist_id="@artist", name="Artist A")
+        rng = np.random.default_rng(0)
+        self.features = {f"m{i}": rng.random(8).tolist() for i in range(40)}
+        for music_id, features in list(self.features.items())[:30]:
+            Music.objects.create(music_id=music_id, title=music_id, artist=self.artist, features=features)
+        feature_index.reset()
+        self.addCleanup(feature_index.reset)
+
+    def expected(self, music_id):
+        ids = [i for i in self.features if i != music_id and Music.objects.filter(music_id=i).exists()]
+        scores = cosine_similarity([self.features[music_id]], [self.features[i] for i in ids])[0]
+        return [ids[i] for i in np.argsort(-scores)[:5]]
+
+    def edges(self):
+        return list(MusicNeighbor.objects.order_by('music_id', 'rank').values_list('music_id', 'neighbor_id', 'similarity'))
+
+    def test_rebuild_matches_brute_force(self):
+        self.assertEqual(neighbor_graph.rebuild(block=7), 150)
+        for music_id in ["m0", "m7", "m29"]:
+            res = neighbor_graph.lookup(music_id)
+            self.assertEqual([music["music_id"] for music in res], self.expected(music_id))
+            self.assertEqual(res[0]["artist_name"], "Artist A")
+        self.assertEqual(len(neighbor_graph.lookup("m0", k=2)), 2)
+        self.assertIsNone(neighbor_graph.lookup("m0", k=6))
+        self.assertIsNone(neighbor_graph.lookup("unknown"))
+
+    def test_incremental_add_matches_rebuild(self):
+        neighbor_graph.rebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            for music_id, features in list(self.features.items())[30:]:
+                Music.objects.create(music_id=music_id, title=music_id, artist=self.artist, features=features)
+        incremental = self.edges()
+
+        neighbor_graph.rebuild()
+        rebuilt = self.edges()
+        self.assertEqual([edge[:2] for edge in incremental], [edge[:2] for edge in rebuilt])
+        self.assertTrue(np.allclose([edge[2] for edge in incremental], [edge[2] for edge in rebuilt], atol=1e-6))
+
+    def test_extend_matches_rebuild(self):
+        neighbor_graph.rebuild()
+        feature_index.ensure_loaded()
+        rows = list(self.features.items())[30:]
+        Music.objects.bulk_create([Music(music_id=music_id, title=music_id, artist=self.artist, features=features) for music_id, features in rows])
+        with patch.object(feature_index, "pull_updates", wraps=feature_index.pull_updates) as pull_updates:
+            neighbor_graph.extend([music_id for music_id, _ in rows], [features for _, features in rows])
+        pull_updates.assert_called_once()
+        extended = self.edges()
+
+        neighbor_graph.rebuild()
+        self.assertEqual([edge[:2] for edge in extended], [edge[:2] for edge in self.edges()])
+
+    def test_add_sees_musics_of_other_processes(self):
+        neighbor_graph.rebuild()
+        feature_index.ensure_loaded()
+        # Inserted by another ingest worker: no signal reaches this process
+        self.features["m30"] = self.features["m31"]
+        Music.objects.bulk_create([Music(music_id="m30", title="m30", artist=self.artist, features=self.features["m30"])])
+        with self.captureOnCommitCallbacks(execute=True):
+            Music.objects.create(music_id="m31", title="m31", artist=self.artist, features=self.features["m31"])
+
+        self.assertEqual([music["music_id"] for music in neighbor_graph.lookup("m31")], self.expected("m31"))
+        self.assertEqual(neighbor_graph.lookup("m31")[0]["music_id"], "m30")
+
+    def test_new_features_relink(self):
+        neighbor_graph.rebuild()
+        feature_index.ensure_loaded()
+        music = Music.objects.get(music_id=neighbor_graph.lookup("m0")[0]["music_id"])
+        referrers = set(MusicNeighbor.objects.filter(neighbor=music).values_list('music_id', flat=True))
+        self.assertIn("m0", referrers)
+
+        with patch.object(neighbor_graph, "add", wraps=neighbor_graph.add) as add:
+            with self.captureOnCommitCallbacks(execute=True):
+                music.view_count = 10
+                music.save(update_fields=["view_count"])
+                music.save()
+            add.assert_not_called()
+
+            self.features[music.music_id] = music.features = self.features["m35"]
+            with self.captureOnCommitCallbacks(execute=True):
+                music.save()
+            add.assert_called_once()
+        updated = self.edges()
+
+        for referrer in {music.music_id} | referrers:
+            self.assertEqual([music["music_id"] for music in neighbor_graph.lookup(referrer)], self.expected(referrer))
+        neighbor_graph.rebuild()
+        self.assertEqual([edge[:2] for edge in updated], [edge[:2] for edge in self.edges()])
+
+    def test_small_catalogue(self):
+        Music.objects.all().delete()
+        graph = NeighborGraph(k=5, index=FeatureIndex(backend="exact"))
+        for music_id in ["m0", "m1", "m2"]:
+            Music.objects.create(music_id=music_id, title=music_id, artist=self.artist, features=self.features[music_id])
+            graph.index.upsert(music_id, self.features[music_id])
+            graph.add(music_id, self.features[music_id])
+        self.assertEqual([music["music_id"] for music in graph.lookup("m1")], self.expected("m1"))
+        self.assertEqual(MusicNeighbor.objects.count(), 6)
+
+    def test_delete_repairs_lists(self):
+        neighbor_graph.rebuild()
+        removed = self.expected("m0")[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            Music.objects.filter(music_id=removed).delete()
+
+        self.assertFalse(MusicNeighbor.objects.filter(neighbor_id=removed).exists())
+        self.assertEqual(MusicNeighbor.objects.count(), 29 * 5)
+        self.assertEqual([music["music_id"] for music in neighbor_graph.lookup("m0")], self.expected("m0"))
+
+    def test_delete_many_repairs_lists(self):
+        neighbor_graph.rebuild()
+        removed = ["m1", "m2", *self.expected("m0")[:2]]
+        feature_index.ensure_loaded()
+        with self.captureOnCommitCallbacks(execute=True):
+            Music.objects.filter(music_id__in=removed).delete()
+        repaired = self.edges()
+
+        self.assertFalse(MusicNeighbor.objects.filter(music_id__in=removed).exists())
+        self.assertFalse(MusicNeighbor.objects.filter(neighbor_id__in=removed).exists())
+        neighbor_graph.rebuild()
+        self.assertEqual([edge[:2] for edge in repaired], [edge[:2] for edge in self.edges()])
+
+    def test_comparator_reads_graph(self):
+        call_command("build_neighbor_graph", stdout=io.StringIO())
+        comparator = MusicSimilarityComparator(k=3, index=FeatureIndex(backend="exact"))
+        with patch.object(FeatureIndex, "search", side_effect=AssertionError("searched")):
+            res = comparator.compare("m3")
+        self.assertEqual([music["music_id"] for music in res], self.expected("m3")[:3])
+        self.assertEqual(
+            [music["music_id"] for music in MusicSimilarityComparator(k=3, graph=NeighborGraph(k=2)).compare("m3")],
+            self.expected("m3")[:3]
+        )
+
+class IngestJobTest(TestCase):
+    def setUp(self):
+        self.artist = Artist.objects.create(artist_id="@artist", name="Artist A")
+        self.info = {"id": "4VkWsBukAWI", "author_id": "@artist", "author": "Artist A", "title": "a", "view_count": 0, "like_count": 0}
+        self.yt_link = "https://www.youtube.com/watch?v=4VkWsBukAWI"
+
+    def upload(self, yt_link):
+        Music.upload_music(info=self.info, features=[1.0, 0.0, 0.0])
+        return self.info["id"]
+
+    def test_enqueue_deduplicates_by_video_id(self):
+        job = IngestJob.enqueue("4VkWsBukAWI", self.yt_link)
+        again = IngestJob.enqueue("4VkWsBukAWI", "https://youtu.be/4VkWsBukAWI")
+
+        self.assertEqual(job.job_id, again.job_id)
+        self.assertEqual(IngestJob.objects.count(), 1)
+        self.assertEqual(job.status, IngestJob.QUEUED)
+
+    def test_enqueue_known_music(self):
+        Music.objects.create(music_id="4VkWsBukAWI", title="a", artist=self.artist, features=[1.0, 0.0])
+        job = IngestJob.enqueue("4VkWsBukAWI", self.yt_link)
+        self.assertEqual(job.status, IngestJob.SUCCEEDED)
+        self.assertEqual(job.music_id, "4VkWsBukAWI")
+        self.assertIsNone(IngestJob.claim("worker"))
+
+    def test_worker_runs_job(self):
+        job = IngestJob.enqueue("4VkWsBukAWI", self.yt_link)
+        self.assertEqual(jobs.run_worker("worker", once=True, handler=self.upload), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, IngestJob.SUCCEEDED)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.worker, "worker")
+        self.assertEqual(job.music_id, "4VkWsBukAWI")
+
+    def test_retries_then_fails(self):
+        def broken(yt_link):
+            raise RuntimeError("download failed")
+
+        job = IngestJob.enqueue("4VkWsBukAWI", self.yt_link, max_attempts=2)
+        jobs.process_job(IngestJob.claim("worker"), handler=broken, retry_delay=0)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (IngestJob.QUEUED, 1))
+        self.assertIn("download failed", job.error)
+
+        jobs.process_job(IngestJob.claim("worker"), handler=broken, retry_delay=0)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (IngestJob.FAILED, 2))
+        self.assertIsNone(IngestJob.claim("worker"))
+
+        # A failed video can be queued again
+        job = IngestJob.enqueue("4VkWsBukAWI", self.yt_link)
+        self.assertEqual((job.status, job.attempts, job.error), (IngestJob.QUEUED, 0, None))
+
+    def test_retry_is_delayed(self):
+        job = IngestJob.enqueue("4VkWsBukAWI", self.yt_link)
+        jobs.process_job(IngestJob.claim("worker"), handler=lambda yt_link: 1 / 0, retry_delay=60)
+        self.assertIsNone(IngestJob.claim("worker"))
+
+    def test_requeue_stale(self):
+        job = IngestJob.enqueue("4VkWsBukAWI", self.yt_link)
+        IngestJob.claim("crashed worker")
+        self.assertEqual(IngestJob.requeue_stale(3600), 0)
+        IngestJob.objects.filter(pk=job.pk).update(started_at=job.created_at - timedelta(hours=1))
+        self.assertEqual(IngestJob.requeue_stale(60), 1)
+        self.assertEqual(IngestJob.claim("worker").job_id, job.job_id)
+
+    @patch('Music.jobs.services.get_full_data')
+    def test_endpoints(self, mock_get_full_data):
+        mock_get_full_data.return_value = {"feature": np.array([1.0, 0.0, 0.0], dtype=np.float32), "info": self.info}
+
+        response = self.client.post(reverse('enqueue_music'), data={"yt_link": self.yt_link})
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()["data"]["job_id"]
+
+        response = self.client.get(reverse('get_job_result', args=[job_id]))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["data"]["status"], IngestJob.QUEUED)
+
+        jobs.run_worker("worker", once=True)
+
+        response = self.client.get(reverse('get_job', args=[job_id]))
+        self.assertEqual(response.json()["data"]["status"], IngestJob.SUCCEEDED)
+        response = self.client.get(reverse('get_job_result', args=[job_id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["music_id"], "4VkWsBukAWI")
+
+        self.assertEqual(self.client.get(reverse('get_job', args=["unknown"])).status_code, 404)
+        self.assertEqual(self.client.post(reverse('enqueue_music'), data={"yt_link": "https://example.com"}).status_code, 400)
+
+    def test_comparator_reads_rows_written_by_other_processes(self):
+        Music.objects.create(music_id="a", title="a", artist=self.artist, features=[1.0, 0.0])
+        index = FeatureIndex().load()
+        # Rows inserted without signals reaching this process's index
+        Music.objects.bulk_create([Music(music_id="b", title="b", artist=self.artist, features=[0.9, 0.1])])
+
+        res = MusicSimilarityComparator(index=index).compare("b")
+        self.assertEqual([music.get("music_id") for music in res], ["a"])
+
+class BulkIngestTest(TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.links = [f"https://www.youtube.com/watch?v={video_id}" for video_id in ("aaaaaaaaaaa", "bbbbbbbbbbb", "ccccccccccc")]
+        self.downloaded = []
+        feature_index.reset()
+
+    def tearDown(self):
+        feature_index.reset()
+
+    def download(self, url, to=None, quiet=False):
+        video_id = url[-11:]
+        self.downloaded.append(video_id)
+        output_path = os.path.join(to, f"{video_id}.mp3")
+        with open(output_path, "wb") as f:
+            f.write(b"audio")
+        info = {"id": video_id, "title": video_id, "author_id": f"@{video_id[0]}", "author": video_id[0], "view_count": 1, "like_count": None}
+        return {"output_path": output_path, "info": info}
+
+    @staticmethod
+    def extract(filepath, local=False):
+        if "ccc" in filepath:
+            raise ValueError("corrupted file")
+        return np.array([1.0, float(len(filepath)), 0.0], dtype=np.float32)
+
+    def ingestor(self, **kwargs):
+        return BulkIngestor(
+            workdir=self.workdir,
+            batch_size=2,
+            download=self.download,
+            extract=self.extract,
+            extract_executor=ThreadPoolExecutor(2),
+            **kwargs
+        )
+
+    def test_ingest_links(self):
+        feature_index.load()
+        progress = []
+        report = self.ingestor(progress=lambda report: progress.append(report.ingested)).run(link_tasks(self.links + self.links[:1]))
+
+        self.assertEqual((report.total, report.ingested, report.skipped), (3, 2, 0))
+        self.assertEqual(list(report.failed), ["ccccccccccc"])
+        self.assertEqual(progress, [2])
+        self.assertEqual(set(Music.objects.values_list('music_id', flat=True)), {"aaaaaaaaaaa", "bbbbbbbbbbb"})
+        self.assertEqual(set(Artist.objects.values_list('artist_id', flat=True)), {"@a", "@b"})
+        self.assertIsNotNone(feature_index.get_vector("aaaaaaaaaaa"))
+        # Committed and failed downloads are deleted
+        self.assertEqual([name for name in os.listdir(self.workdir) if name != "temp"], [])
+
+    def test_resume(self):
+        artist = Artist.objects.create(artist_id="@a", name="a")
+        Music.objects.create(music_id="aaaaaaaaaaa", title="a", artist=artist, features=[1.0, 0.0, 0.0])
+        # Downloaded by an interrupted run
+        self.download(self.links[1], to=self.workdir)
+        with open(os.path.join(self.workdir, "bbbbbbbbbbb.json"), "w", encoding="utf-8") as f:
+            json.dump({"info": {"id": "bbbbbbbbbbb", "author_id": "@b"}, "filepath": os.path.join(self.workdir, "bbbbbbbbbbb.mp3")}, f)
+        self.downloaded.clear()
+
+        report = self.ingestor().run(link_tasks(self.links[:2]))
+
+        self.assertEqual((report.ingested, report.skipped), (1, 1))
+        self.assertEqual(self.downloaded, [])
+        self.assertTrue(Music.objects.filter(music_id="bbbbbbbbbbb").exists())
+
+    def test_ingest_directory(self):
+        directory = tempfile.mkdtemp()
+        for filename in ("dddddddddddd.txt", "ddddddddddd.mp3", "my song.wav"):
+            with open(os.path.join(directory, filename), "wb") as f:
+                f.write(filename.encode())
+        tasks = directory_tasks(directory)
+        self.assertEqual(len(tasks), 2)
+        self.assertEqual(tasks[0].music_id, "ddddddddddd")
+        self.assertTrue(tasks[1].music_id.startswith("f_"))
+
+        report = self.ingestor().run(tasks)
+        self.assertEqual(report.ingested, 2)
+        self.assertEqual(Music.objects.get(music_id="ddddddddddd").artist_id, "@local")
+        # Local files are kept
+        self.assertEqual(len(os.listdir(directory)), 3)
+
+    def test_read_links(self):
+        path = os.path.join(self.workdir, "links.csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("title,yt_link\n# comment\na,https://www.youtube.com/watch?v=aaaaaaaaaaa\nb,https://youtu.be/bbbbbbbbbbb\nc,not a link\n")
+        self.assertEqual(read_links(path), ["https://www.youtube.com/watch?v=aaaaaaaaaaa", "https://youtu.be/bbbbbbbbbbb"])
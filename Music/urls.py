@@ -4,5 +4,9 @@ from . import views
 urlpatterns = [
     path('/upload_music', views.upload_music, name='upload_music'),
     path('/get_similiar_musics', views.get_similiar_musics, name='get_similiar_musics'),
+    path('/get_similiar_musics_batch', views.get_similiar_musics_batch, name='get_similiar_musics_batch'),
+    path('/enqueue_music', views.enqueue_music, name='enqueue_music'),
+    path('/jobs/<str:job_id>', views.get_job, name='get_job'),
+    path('/jobs/<str:job_id>/result', views.get_job_result, name='get_job_result'),
     path('/test_create_data', views.test_create_data, name='test_create_data'),
 ]
\ No newline at end of file
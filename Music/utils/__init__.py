@@ -0,0 +1,4 @@
+from .engine import SimilarityEngine
+from .ivf import IVFEngine
+from .sharded import ShardedEngine
+from .quantized import QuantizedEngine
@@ -0,0 +1,443 @@
+import numpy as np
+from typing import Iterable, Optional, Sequence
+
+class SimilarityEngine:
+    """
+    Exact cosine similarity search over a contiguous, pre-normalized feature matrix.
+
+    Every row of `matrix` is L2-normalized once when the engine is built, so a query is answered
+    with a single matrix-vector product followed by `np.argpartition` to pick the top-k rows.
+    Rows can be added and removed in place; the backing buffer grows geometrically so that
+    `add` is amortized O(dim). A read-only buffer (e.g. a memory-mapped snapshot) is copied
+    to private memory on the first update.
+
+    Rows can also carry scalar attributes (`set_column`), kept aligned with the matrix through
+    every update: a search restricted by a boolean `mask` built from them costs one vectorized
+    pass over the rows, like the scoring itself.
+
+    Attributes
+    -------
+        ids (list[str]):
+            The music IDs, aligned with the rows of `matrix`.
+        matrix (np.ndarray):
+            A C-contiguous float32 array of shape (n, dim) holding the normalized feature vectors.
+    """
+    # Memory bound of the batch searches: one `query_block x catalog_block` float32 score tile
+    query_block = 256
+    catalog_block = 4096
+
+    def __init__(self, ids: Optional[Iterable[str]] = None, features: Optional[Iterable] = None):
+        self.ids: list[str] = []
+        self._buffer = np.empty((0, 0), dtype=np.float32)
+        self._positions: dict[str, int] = {}
+        # name -> (buffer, fill value of the rows without a value)
+        self._columns: dict[str, tuple[np.ndarray, object]] = {}
+        if ids is not None:
+            self.build(ids, features)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._buffer[:len(self.ids)]
+
+    @property
+    def dim(self) -> int:
+        return self._buffer.shape[1]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, music_id: str):
+        return music_id in self._positions
+
+    @staticmethod
+    def normalize(features) -> np.ndarray:
+        """
+        Convert `features` to a 2D C-contiguous float32 array with L2-normalized rows.
+        Zero vectors are left as zeros, matching `sklearn.metrics.pairwise.cosine_similarity`.
+        """
+        data = np.array(features, dtype=np.float32, ndmin=2, copy=True, order="C")
+        norms = np.linalg.norm(data, axis=1, keepdims=True)
+        norms[norms == 0] = 1.
+        data /= norms
+        return data
+
+    def build(self, ids: Iterable[str], features: Iterable):
+        """
+        Replace the content of the engine.
+
+        Arguments
+        -------
+            ids (Iterable[str]):
+                The music IDs.
+            features (Iterable):
+                The feature vectors, one per ID, all with the same dimension.
+        """
+        self.ids = list(ids)
+        self._positions = {music_id: i for i, music_id in enumerate(self.ids)}
+        self._columns = {}
+        features = list(features) if not isinstance(features, np.ndarray) else features
+        if len(self.ids) == 0:
+            self._buffer = np.empty((0, 0), dtype=np.float32)
+            return self
+        self._buffer = self.normalize(features)
+        assert self._buffer.shape[0] == len(self.ids), "ids and features must have the same length"
+        return self
+
+    @classmethod
+    def from_normalized(cls, ids: Iterable[str], matrix: np.ndarray):
+        """
+        Build an engine on top of an already normalized float32 matrix, without copying it.
+        """
+        engine = cls()
+        engine.ids = list(ids)
+        engine._positions = {music_id: i for i, music_id in enumerate(engine.ids)}
+        engine._buffer = matrix
+        return engine
+
+    def _allocate(self, rows: int, dim: int) -> np.ndarray:
+        # A new backing buffer, see `ShardedEngine` for one shared with other processes
+        return np.empty((rows, dim), dtype=np.float32)
+
+    def _ensure_writeable(self):
+        if not self._buffer.flags.writeable:
+            self._buffer = np.array(self._buffer, dtype=np.float32, order="C")
+
+    def add(self, music_id: str, features):
+        """
+        Insert a row, or overwrite it if `music_id` is already in the engine.
+        """
+        vector = self.normalize(features)[0]
+        self._ensure_writeable()
+        position = self._positions.get(music_id)
+        if position is not None:
+            self._buffer[position] = vector
+            return self
+
+        if len(self.ids) == 0 and self.dim != vector.shape[0]:
+            self._buffer = np.empty((0, vector.shape[0]), dtype=np.float32)
+        assert vector.shape[0] == self.dim, f"Expected a vector of dimension {self.dim}, got {vector.shape[0]}"
+
+        n = len(self.ids)
+        if n == self._buffer.shape[0]:
+            buffer = self._allocate(max(16, 2 * n), self.dim)
+            buffer[:n] = self._buffer[:n]
+            self._buffer = buffer
+        self._buffer[n] = vector
+        self.ids.append(music_id)
+        self._positions[music_id] = n
+        return self
+
+    def extend(self, ids: Iterable[str], features):
+        """
+        Insert (or overwrite) many rows at once.
+        """
+        ids = list(ids)
+        if len(ids) == 0:
+            return self
+        if len(self.ids) == 0:
+            return self.build(ids, features)
+
+        vectors = self.normalize(features)
+        self._ensure_writeable()
+        n = len(self.ids)
+        new_ids, new_rows = [], []
+        for i, music_id in enumerate(ids):
+            position = self._positions.get(music_id)
+            if position is None:
+                self._positions[music_id] = n + len(new_ids)
+                new_ids.append(music_id)
+                new_rows.append(i)
+            elif position >= n:
+                new_rows[position - n] = i
+            else:
+                self._buffer[position] = vectors[i]
+
+        if n + len(new_ids) > self._buffer.shape[0]:
+            buffer = self._allocate(max(16, 2 * (n + len(new_ids))), self.dim)
+            buffer[:n] = self._buffer[:n]
+            self._buffer = buffer
+        self._buffer[n:n + len(new_ids)] = vectors[new_rows]
+        self.ids.extend(new_ids)
+        return self
+
+    def remove(self, music_id: str):
+        """
+        Remove a row by moving the last row into its slot. Unknown IDs are ignored.
+        """
+        position = self._positions.pop(music_id, None)
+        if position is None:
+            return self
+
+        last = len(self.ids) - 1
+        if position != last:
+            self._ensure_writeable()
+            last_id = self.ids[last]
+            self._buffer[position] = self._buffer[last]
+            self.ids[position] = last_id
+            self._positions[last_id] = position
+        for buffer, fill in self._columns.values():
+            if position < len(buffer):
+                buffer[position] = buffer[last] if last < len(buffer) else fill
+            if last < len(buffer):
+                buffer[last] = fill
+        self.ids.pop()
+        return self
+
+    def positions(self, music_ids: Iterable[str]) -> np.ndarray:
+        """
+        The rows of `music_ids`, unknown IDs are skipped.
+        """
+        return np.array([self._positions[i] for i in music_ids if i in self._positions], dtype=np.int64)
+
+    def set_column(self, name: str, music_ids: Iterable[str], values, fill=0):
+        """
+        Set the attribute `name` of the rows of `music_ids` (unknown IDs are skipped). Rows which
+        have never been given a value hold `fill`.
+        """
+        music_ids = list(music_ids)
+        values = np.asarray(values)
+        if name not in self._columns:
+            self._columns[name] = (np.full(max(16, len(self.ids)), fill, dtype=values.dtype), fill)
+        column = self.column(name)
+        known = [i for i, music_id in enumerate(music_ids) if music_id in self._positions]
+        column[self.positions(music_ids)] = values[known]
+        return self
+
+    def _grow_column(self, buffer: np.ndarray, fill) -> np.ndarray:
+        if len(buffer) >= len(self.ids):
+            return buffer
+        grown = np.full(max(16, 2 * len(self.ids)), fill, dtype=buffer.dtype)
+        grown[:len(buffer)] = buffer
+        return grown
+
+    def column(self, name: str) -> Optional[np.ndarray]:
+        """
+        The attribute `name` of every row, aligned with `matrix`. None if it has never been set.
+        """
+        if name not in self._columns:
+            return None
+        buffer, fill = self._columns[name]
+        if len(buffer) < len(self.ids):
+            buffer = self._grow_column(buffer, fill)
+            self._columns[name] = (buffer, fill)
+        return buffer[:len(self.ids)]
+
+    def get_vector(self, music_id: str) -> Optional[np.ndarray]:
+        position = self._positions.get(music_id)
+        return None if position is None else self.matrix[position]
+
+    def scores(self, query) -> np.ndarray:
+        """
+        Cosine similarity between `query` and every row of the engine.
+        """
+        query = self.normalize(query)[0]
+        return self.matrix @ query
+
+    def _filter(self, scores: np.ndarray, exclude: Iterable[str] = (), mask: Optional[np.ndarray] = None) -> int:
+        """
+        Set the scores of the rows which must not be returned to -inf, in place.
+
+        Returns
+        -------
+            available (int):
+                The number of rows left.
+        """
+        excluded = np.unique(self.positions(exclude))
+        if mask is None:
+            scores[excluded] = -np.inf
+            return len(scores) - len(excluded)
+        scores[~mask] = -np.inf
+        scores[excluded] = -np.inf
+        return int(np.count_nonzero(mask)) - int(np.count_nonzero(mask[excluded]))
+
+    def search(
+        self,
+        query,
+        k: int = 10,
+        exclude: Iterable[str] = (),
+        mask: Optional[np.ndarray] = None
+    ) -> list[tuple[str, float]]:
+        """
+        Find the `k` rows most similar to `query`.
+
+        Arguments
+        -------
+            query (array-like):
+                The query feature vector.
+            k (int, optional): _Defaults to 10._
+                The number of results to return.
+            exclude (Iterable[str], optional):
+                Music IDs which must not appear in the results (e.g. the query itself).
+            mask (np.ndarray, optional):
+                A boolean array aligned with the rows: only the rows where it is True are returned.
+
+        Returns
+        -------
+            results (list[tuple[str, float]]):
+                `(music_id, similarity)` pairs sorted by decreasing similarity.
+        """
+        if len(self.ids) == 0 or k <= 0:
+            return []
+
+        scores = self.scores(query)
+        k = min(k, self._filter(scores, exclude, mask))
+        if k <= 0:
+            return []
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.ids[i], float(scores[i])) for i in top]
+
+    def _excluded_pairs(self, exclude: Optional[Sequence[Iterable[str]]], n_queries: int) -> tuple[np.ndarray, np.ndarray]:
+        assert exclude is None or len(exclude) == n_queries, "exclude must have one entry per query"
+        rows, columns = [], []
+        for row, ids in enumerate(exclude or ()):
+            positions = [self._positions[i] for i in ids if i in self._positions]
+            rows.extend([row] * len(positions))
+            columns.extend(positions)
+        return np.array(rows, dtype=np.int64), np.array(columns, dtype=np.int64)
+
+    @staticmethod
+    def _top(scores: np.ndarray, positions: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        # The k best columns of every row, unordered
+        if scores.shape[1] <= k:
+            return scores, positions
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        return np.take_along_axis(scores, top, axis=1), np.take_along_axis(positions, top, axis=1)
+
+    @staticmethod
+    def _merge_top(best_scores: np.ndarray, best_positions: np.ndarray, scores: np.ndarray, offset: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Merge a tile of scores into the running top-k of every row (k = `best_scores.shape[1]`).
+        Only the scores above the current k-th best of their row are looked at.
+        """
+        n_rows, k = best_scores.shape
+        rows, columns = np.nonzero(scores > best_scores.min(axis=1)[:, None])
+        if len(rows) == 0:
+            return best_scores, best_positions
+
+        candidate_rows = np.concatenate([np.repeat(np.arange(n_rows), k), rows])
+        candidate_scores = np.concatenate([best_scores.ravel(), scores[rows, columns]])
+        candidate_positions = np.concatenate([best_positions.ravel(), columns + offset])
+        # Grouped by row, best first: the first k of every group are kept
+        order = np.lexsort((-candidate_scores, candidate_rows))
+        starts = np.concatenate([[0], np.cumsum(np.bincount(candidate_rows, minlength=n_rows))[:-1]])
+        keep = order[np.arange(len(order)) - starts[candidate_rows[order]] < k]
+        return candidate_scores[keep].reshape(n_rows, k), candidate_positions[keep].reshape(n_rows, k)
+
+    def _score_tile(self, queries: np.ndarray, start: int, end: int) -> np.ndarray:
+        # Scores of normalized `queries` against rows `[start, end)`, shape `(len(queries), end - start)`
+        return queries @ self.matrix[start:end].T
+
+    def _results(self, scores: np.ndarray, positions: np.ndarray) -> list[tuple[str, float]]:
+        order = np.argsort(-scores, kind="stable")
+        return [(self.ids[positions[i]], float(scores[i])) for i in order if scores[i] > -np.inf]
+
+    def search_batch(
+        self,
+        queries,
+        k: int = 10,
+        exclude: Optional[Sequence[Iterable[str]]] = None,
+        query_block: Optional[int] = None,
+        catalog_block: Optional[int] = None,
+        mask: Optional[np.ndarray] = None
+    ) -> list[list[tuple[str, float]]]:
+        """
+        `search` for many queries at once: the scores are computed tile by tile with one
+        matrix-matrix product per `(query_block, catalog_block)` tile, and only a running top-k
+        per query is kept, so memory stays bounded whatever the number of queries and rows.
+
+        Arguments
+        -------
+            queries (array-like):
+                The query feature vectors, shape `(n_queries, dim)`.
+            k (int, optional): _Defaults to 10._
+                The number of results per query.
+            exclude (Sequence[Iterable[str]], optional):
+                Per query, the music IDs which must not appear in its results.
+            query_block, catalog_block (int, optional):
+                The tile size, `self.query_block` / `self.catalog_block` by default.
+            mask (np.ndarray, optional):
+                A boolean array aligned with the rows, shared by every query: only the rows where
+                it is True are returned.
+
+        Returns
+        -------
+            results (list[list[tuple[str, float]]]):
+                Per query, `(music_id, similarity)` pairs sorted by decreasing similarity.
+        """
+        queries = self.normalize(queries) if len(queries) else np.empty((0, self.dim), dtype=np.float32)
+        n_queries, n = len(queries), len(self.ids)
+        if n == 0 or k <= 0:
+            return [[] for _ in range(n_queries)]
+
+        query_block = query_block or self.query_block
+        catalog_block = catalog_block or self.catalog_block
+        excluded_rows, excluded_columns = self._excluded_pairs(exclude, n_queries)
+        rejected = None if mask is None else ~mask
+        k = min(k, n)
+        results = []
+        for q_start in range(0, n_queries, query_block):
+            block = queries[q_start:q_start + query_block]
+            best_scores, best_positions = None, None
+            in_block = (excluded_rows >= q_start) & (excluded_rows < q_start + len(block))
+            for c_start in range(0, n, catalog_block):
+                c_end = min(c_start + catalog_block, n)
+                scores = self._score_tile(block, c_start, c_end)
+                if rejected is not None:
+                    scores[:, rejected[c_start:c_end]] = -np.inf
+                pairs = in_block & (excluded_columns >= c_start) & (excluded_columns < c_end)
+                scores[excluded_rows[pairs] - q_start, excluded_columns[pairs] - c_start] = -np.inf
+
+                if best_scores is None or best_scores.shape[1] < k:
+                    # Until k rows have been seen: full selection
+                    positions = np.broadcast_to(np.arange(c_start, c_start + scores.shape[1]), scores.shape)
+                    if best_scores is not None:
+                        scores = np.concatenate([best_scores, scores], axis=1)
+                        positions = np.concatenate([best_positions, positions], axis=1)
+                    best_scores, best_positions = self._top(scores, positions, k)
+                else:
+                    best_scores, best_positions = self._merge_top(best_scores, best_positions, scores, c_start)
+            results.extend(self._results(s, p) for s, p in zip(best_scores, best_positions))
+        return results
+
+    def search_max(
+        self,
+        queries,
+        k: int = 10,
+        exclude: Iterable[str] = (),
+        query_block: Optional[int] = None,
+        catalog_block: Optional[int] = None,
+        mask: Optional[np.ndarray] = None
+    ) -> list[tuple[str, float]]:
+        """
+        Search with a set of seeds: the similarity of a row is its highest similarity to any of
+        `queries` (max-sim aggregation), computed with the same tiling as `search_batch`.
+
+        Returns
+        -------
+            results (list[tuple[str, float]]):
+                `(music_id, similarity)` pairs sorted by decreasing similarity.
+        """
+        n = len(self.ids)
+        if n == 0 or k <= 0 or len(queries) == 0:
+            return []
+
+        queries = self.normalize(queries)
+        query_block = query_block or self.query_block
+        catalog_block = catalog_block or self.catalog_block
+        best = np.full(n, -np.inf, dtype=np.float32)
+        for c_start in range(0, n, catalog_block):
+            tile = self.matrix[c_start:c_start + catalog_block]
+            for q_start in range(0, len(queries), query_block):
+                np.maximum(
+                    best[c_start:c_start + len(tile)],
+                    (queries[q_start:q_start + query_block] @ tile.T).max(axis=0),
+                    out=best[c_start:c_start + len(tile)]
+                )
+
+        k = min(k, self._filter(best, exclude, mask))
+        if k <= 0:
+            return []
+        top = np.argpartition(-best, k - 1)[:k]
+        return self._results(best[top], top)
@@ -0,0 +1,282 @@
+import numpy as np
+from typing import Iterable, Optional
+
+from .engine import SimilarityEngine
+
+class IVFEngine(SimilarityEngine):
+    """
+    Approximate cosine similarity search with an inverted-file (IVF) index.
+
+    The normalized vectors are clustered with spherical k-means into `n_lists` cells. A query
+    only scores the vectors of the `n_probe` cells whose centroids are the most similar to it,
+    so the cost of a search is roughly `n_probe / n_lists` of the exact scan.
+
+    Recall / latency knobs
+    -------
+        n_lists (int):
+            The number of cells. More cells means smaller cells, hence faster but less accurate
+            searches for the same `n_probe`. Defaults to `4 * sqrt(n)`.
+        n_probe (int):
+            The number of cells visited per query. `n_probe == n_lists` is an exact search.
+            Can be overridden per query. It is doubled while the visited cells hold fewer than
+            `k` returnable rows (mask, excluded IDs), so a search returns `k` results whenever
+            the engine has them.
+
+    The engine behaves exactly like `SimilarityEngine` until it has been trained.
+    """
+    def __init__(
+        self,
+        ids: Optional[Iterable[str]] = None,
+        features: Optional[Iterable] = None,
+        n_lists: Optional[int] = None,
+        n_probe: int = 8,
+        n_iter: int = 20,
+        train_size: int = 64,
+        seed: int = 0
+    ):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.train_size = train_size
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self._assignments: list[int] = []
+        self._lists: list[set[int]] = []
+        self._list_arrays: dict[int, np.ndarray] = {}
+        super().__init__(ids, features)
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def build(self, ids: Iterable[str], features: Iterable):
+        super().build(ids, features)
+        self.centroids = None
+        self._assignments = []
+        self._lists = []
+        self._list_arrays = {}
+        if len(self.ids) > 0:
+            self.train()
+        return self
+
+    # ---------------------------------------------------------------- training
+
+    def train(self, vectors: Optional[np.ndarray] = None):
+        """
+        Learn the centroids with spherical k-means, then assign every row of the engine.
+
+        Arguments
+        -------
+            vectors (np.ndarray, optional): _Defaults to the rows of the engine._
+                The training vectors. At most `train_size * n_lists` of them are used.
+        """
+        vectors = self.matrix if vectors is None else self.normalize(vectors)
+        n_lists = self.n_lists or max(1, int(4 * np.sqrt(len(vectors))))
+        n_lists = min(n_lists, len(vectors))
+        rng = np.random.default_rng(self.seed)
+
+        if len(vectors) > self.train_size * n_lists:
+            vectors = vectors[rng.choice(len(vectors), self.train_size * n_lists, replace=False)]
+
+        centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+        for _ in range(self.n_iter):
+            assignments = self._nearest(vectors, centroids)
+            sums = np.stack([
+                np.bincount(assignments, weights=vectors[:, d], minlength=n_lists)
+                for d in range(vectors.shape[1])
+            ], axis=1)
+            empty = np.bincount(assignments, minlength=n_lists) == 0
+            if empty.any():
+                sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+            centroids = self.normalize(sums)
+
+        self.centroids = centroids
+        self.n_lists = n_lists
+        self._reassign()
+        return self
+
+    @staticmethod
+    def _nearest(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk_size):
+            chunk = vectors[start:start + chunk_size]
+            assignments[start:start + chunk_size] = np.argmax(chunk @ centroids.T, axis=1)
+        return assignments
+
+    def _reassign(self):
+        assignments = self._nearest(self.matrix, self.centroids) if len(self.ids) else np.empty(0, dtype=np.int64)
+        self._assignments = assignments.tolist()
+        self._lists = [set() for _ in range(len(self.centroids))]
+        for position, cell in enumerate(self._assignments):
+            self._lists[cell].add(position)
+        self._list_arrays = {}
+
+    def _move(self, position: int, cell: Optional[int]):
+        """
+        Move the row at `position` to `cell` (None: out of every cell).
+        """
+        old = self._assignments[position] if position < len(self._assignments) else None
+        if old is not None:
+            self._lists[old].discard(position)
+            self._list_arrays.pop(old, None)
+        if cell is not None:
+            self._lists[cell].add(position)
+            self._list_arrays.pop(cell, None)
+            if position < len(self._assignments):
+                self._assignments[position] = cell
+            else:
+                self._assignments.append(cell)
+
+    def _list_array(self, cell: int) -> np.ndarray:
+        array = self._list_arrays.get(cell)
+        if array is None:
+            array = np.fromiter(self._lists[cell], dtype=np.int64, count=len(self._lists[cell]))
+            self._list_arrays[cell] = array
+        return array
+
+    # ---------------------------------------------------------------- updates
+
+    def add(self, music_id: str, features):
+        super().add(music_id, features)
+        if self.is_trained:
+            position = self._positions[music_id]
+            cell = int(np.argmax(self.centroids @ self.matrix[position]))
+            self._move(position, cell)
+        return self
+
+    def extend(self, ids: Iterable[str], features):
+        ids = list(ids)
+        if not self.is_trained:
+            return super().extend(ids, features) if len(self.ids) else self.build(ids, features)
+
+        super().extend(ids, features)
+        positions = np.array([self._positions[music_id] for music_id in ids], dtype=np.int64)
+        cells = self._nearest(self.matrix[positions], self.centroids)
+        for position, cell in zip(positions.tolist(), cells.tolist()):
+            self._move(position, cell)
+        return self
+
+    def remove(self, music_id: str):
+        position = self._positions.get(music_id)
+        if position is None:
+            return self
+
+        last = len(self.ids) - 1
+        super().remove(music_id)
+        if self.is_trained:
+            last_cell = self._assignments[last]
+            self._move(position, None)
+            if position != last:
+                self._lists[last_cell].discard(last)
+                self._lists[last_cell].add(position)
+                self._list_arrays.pop(last_cell, None)
+                self._assignments[position] = last_cell
+            self._assignments.pop()
+        return self
+
+    def merge(self, other: SimilarityEngine):
+        """
+        Add every row of `other` to this engine, assigning them to the cells of this engine.
+        Rows whose ID already exists are overwritten.
+        """
+        return self.extend(other.ids, other.matrix)
+
+    # ---------------------------------------------------------------- search
+
+    def search(
+        self,
+        query,
+        k: int = 10,
+        exclude: Iterable[str] = (),
+        mask: Optional[np.ndarray] = None,
+        n_probe: Optional[int] = None
+    ) -> list[tuple[str, float]]:
+        """
+        Approximate version of `SimilarityEngine.search`.
+
+        Arguments
+        -------
+            n_probe (int, optional): _Defaults to `self.n_probe`._
+                The number of cells to visit for this query.
+        """
+        if not self.is_trained:
+            return super().search(query, k=k, exclude=exclude, mask=mask)
+        if len(self.ids) == 0 or k <= 0:
+            return []
+
+        query = self.normalize(query)[0]
+        n_probe = max(1, min(self.n_probe if n_probe is None else n_probe, len(self.centroids)))
+        cells = np.argsort(-(self.centroids @ query), kind="stable")
+        excluded = [self._positions[i] for i in exclude if i in self._positions]
+        parts, count, probed = [], 0, 0
+        while True:
+            for cell in cells[probed:n_probe].tolist():
+                part = self._list_array(cell)
+                if mask is not None:
+                    part = part[mask[part]]
+                if excluded:
+                    part = part[~np.isin(part, excluded)]
+                parts.append(part)
+                count += len(part)
+            probed = n_probe
+            if count >= k or n_probe == len(cells):
+                break
+            n_probe = min(2 * n_probe, len(cells))
+        candidates = np.concatenate(parts)
+
+        k = min(k, len(candidates))
+        if k <= 0:
+            return []
+
+        scores = self.matrix[candidates] @ query
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.ids[candidates[i]], float(scores[i])) for i in top]
+
+    def search_batch(self, queries, k: int = 10, exclude=None, query_block=None, catalog_block=None, mask=None, n_probe: Optional[int] = None):
+        """
+        `search` for every query (the cells differ per query). Exact tiled search while untrained.
+        """
+        if not self.is_trained:
+            return super().search_batch(queries, k=k, exclude=exclude, query_block=query_block, catalog_block=catalog_block, mask=mask)
+        exclude = exclude if exclude is not None else [()] * len(queries)
+        return [self.search(query, k=k, exclude=ids, mask=mask, n_probe=n_probe) for query, ids in zip(queries, exclude)]
+
+    # ---------------------------------------------------------------- persistence
+
+    def save(self, path: str):
+        """
+        Save the engine to a `.npz` file.
+        """
+        np.savez(
+            path,
+            ids=np.array(self.ids, dtype=str),
+            matrix=self.matrix,
+            centroids=self.centroids if self.is_trained else np.empty((0, self.dim), dtype=np.float32),
+            assignments=np.array(self._assignments, dtype=np.int64),
+            params=np.array([self.n_lists or 0, self.n_probe, self.n_iter, self.train_size, self.seed], dtype=np.int64)
+        )
+
+    @classmethod
+    def load(cls, path: str, n_probe: Optional[int] = None) -> "IVFEngine":
+        """
+        Load an engine saved with `save`.
+        """
+        with np.load(path, allow_pickle=False) as data:
+            n_lists, saved_n_probe, n_iter, train_size, seed = data["params"].tolist()
+            engine = cls(
+                n_lists=n_lists or None,
+                n_probe=saved_n_probe if n_probe is None else n_probe,
+                n_iter=n_iter,
+                train_size=train_size,
+                seed=seed
+            )
+            ids = data["ids"].tolist()
+            SimilarityEngine.build(engine, ids, data["matrix"])
+            if len(data["centroids"]) > 0:
+                engine.centroids = data["centroids"]
+                engine._assignments = data["assignments"].tolist()
+                engine._lists = [set() for _ in range(len(engine.centroids))]
+                for position, cell in enumerate(engine._assignments):
+                    engine._lists[cell].add(position)
+        return engine
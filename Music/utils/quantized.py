@@ -0,0 +1,203 @@
+import numpy as np
+from typing import Iterable, Literal, Optional, Sequence
+
+from .engine import SimilarityEngine
+
+class QuantizedEngine(SimilarityEngine):
+    """
+    Cosine similarity search over compressed codes, with an exact re-ranking of the best candidates.
+
+    Every normalized vector is also stored as a code of `precision`:
+        `"int8"`:
+            Per-dimension scalar quantization: `x[d] ~ offset[d] + scale[d] * (code[d] + 128)`,
+            `offset` / `scale` spanning the range of dimension `d` over the catalogue (`train`).
+            1 byte per dimension instead of 4.
+        `"float16"`:
+            Half-precision copy, 2 bytes per dimension.
+
+    A search scans the codes only: tiles of `scan_bytes` are widened to float32 in cache and
+    scored with one BLAS product, the quantization being folded into the query
+    (`q . x ~ q . offset + 128 * sum(q * scale) + (q * scale) . code`). The `rerank * k` best
+    candidates are then scored exactly on the float32 rows, so the results carry exact
+    similarities, and only the candidate rows of `matrix` are read: it can stay on disk
+    (memory-mapped snapshot, see `from_normalized`) while the codes are in RAM.
+
+    Vectors added after `train` are clipped to the trained ranges; `train` again once the catalogue
+    has drifted (the exact re-ranking keeps the results exact, only the recall of the scan suffers).
+    See `benchmarks/quantized_search.py` for memory, throughput and recall.
+    """
+    # Size of the float32 tiles the codes are widened to (fits in L2)
+    scan_bytes = 1 << 18
+
+    def __init__(
+        self,
+        ids: Optional[Iterable[str]] = None,
+        features: Optional[Iterable] = None,
+        precision: Literal["int8", "float16"] = "int8",
+        rerank: int = 8
+    ):
+        if precision not in ("int8", "float16"):
+            raise ValueError(f"Unknown precision: {precision}")
+        self.precision = precision
+        self.rerank = rerank
+        self.offset: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+        self._codes = np.empty((0, 0), dtype=self.dtype)
+        super().__init__(ids, features)
+
+    @property
+    def dtype(self):
+        return np.int8 if self.precision == "int8" else np.float16
+
+    @property
+    def codes(self) -> np.ndarray:
+        return self._codes[:len(self.ids)]
+
+    @property
+    def code_bytes(self) -> int:
+        # Bytes scanned per music
+        return self.dim * np.dtype(self.dtype).itemsize
+
+    @classmethod
+    def from_normalized(cls, ids: Iterable[str], matrix: np.ndarray, **options):
+        """
+        Quantize an already normalized float32 matrix (e.g. a memory-mapped snapshot), which is
+        kept as is, without copying it, for the re-ranking.
+        """
+        engine = cls(**options)
+        engine.ids = list(ids)
+        engine._positions = {music_id: i for i, music_id in enumerate(engine.ids)}
+        engine._buffer = matrix
+        return engine.train()
+
+    # ---------------------------------------------------------------- codes
+
+    def train(self):
+        """
+        Fit the per-dimension ranges of the int8 codes on the catalogue, and (re)encode every row.
+        """
+        if self.precision == "int8" and len(self.ids) > 0:
+            low, high = self.matrix.min(axis=0), self.matrix.max(axis=0)
+            self.offset = low.astype(np.float32)
+            self.scale = np.maximum((high - low) / 255, np.finfo(np.float32).tiny).astype(np.float32)
+        self._codes = self.encode(self.matrix) if len(self.ids) > 0 else np.empty((0, self.dim), dtype=self.dtype)
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        if self.precision == "float16":
+            return vectors.astype(np.float16)
+        codes = np.rint((vectors - self.offset) / self.scale) - 128
+        return np.clip(codes, -128, 127).astype(np.int8)
+
+    def _encode_rows(self, positions: np.ndarray):
+        n = len(self.ids)
+        if self._codes.shape[0] < n or self._codes.shape[1] != self.dim:
+            codes = np.empty((max(16, 2 * n), self.dim), dtype=self.dtype)
+            kept = min(self._codes.shape[0], n) if self._codes.shape[1] == self.dim else 0
+            codes[:kept] = self._codes[:kept]
+            self._codes = codes
+        self._codes[positions] = self.encode(self.matrix[positions])
+
+    def build(self, ids: Iterable[str], features: Iterable):
+        super().build(ids, features)
+        return self.train()
+
+    def add(self, music_id: str, features):
+        if len(self.ids) == 0:
+            return self.build([music_id], [features])
+        super().add(music_id, features)
+        self._encode_rows(np.array([self._positions[music_id]]))
+        return self
+
+    def extend(self, ids: Iterable[str], features):
+        ids = list(ids)
+        if len(self.ids) == 0:
+            return self.build(ids, features)
+        super().extend(ids, features)
+        self._encode_rows(np.array(sorted({self._positions[music_id] for music_id in ids}), dtype=np.int64))
+        return self
+
+    def remove(self, music_id: str):
+        position = self._positions.get(music_id)
+        last = len(self.ids) - 1
+        super().remove(music_id)
+        if position is not None and position != last:
+            self._codes[position] = self._codes[last]
+        return self
+
+    # ---------------------------------------------------------------- search
+
+    def _fold(self, queries: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # The quantization moved to the query side: scores = codes @ weights.T + bias
+        if self.precision == "float16":
+            return queries, np.zeros(len(queries), dtype=np.float32)
+        weights = queries * self.scale
+        return weights, queries @ self.offset + 128 * weights.sum(axis=1)
+
+    def _score_tile(self, queries: np.ndarray, start: int, end: int) -> np.ndarray:
+        weights, bias = self._fold(queries)
+        return weights @ self._codes[start:end].astype(np.float32).T + bias[:, None]
+
+    def approximate_scores(self, query) -> np.ndarray:
+        """
+        Approximate cosine similarity between `query` and every row, computed from the codes.
+        """
+        weights, bias = self._fold(self.normalize(query))
+        weights = weights[0]
+        n = len(self.ids)
+        rows = max(1024, self.scan_bytes // (4 * self.dim))
+        tile = np.empty((min(rows, n), self.dim), dtype=np.float32)
+        scores = np.empty(n, dtype=np.float32)
+        for start in range(0, n, rows):
+            end = min(start + rows, n)
+            np.copyto(tile[:end - start], self._codes[start:end], casting="unsafe")
+            np.dot(tile[:end - start], weights, out=scores[start:end])
+        return scores + bias[0]
+
+    def _rerank(self, query: np.ndarray, positions: np.ndarray, k: int) -> list[tuple[str, float]]:
+        # Sorted positions: sequential reads when `matrix` is memory-mapped
+        positions = np.sort(positions)
+        scores = self.matrix[positions] @ query
+        top = np.argsort(-scores, kind="stable")[:k]
+        return [(self.ids[positions[i]], float(scores[i])) for i in top]
+
+    def search(
+        self,
+        query,
+        k: int = 10,
+        exclude: Iterable[str] = (),
+        mask: Optional[np.ndarray] = None
+    ) -> list[tuple[str, float]]:
+        if len(self.ids) == 0 or k <= 0:
+            return []
+
+        scores = self.approximate_scores(query)
+        available = self._filter(scores, exclude, mask)
+        k = min(k, available)
+        if k <= 0:
+            return []
+        n_candidates = min(available, k * self.rerank)
+        candidates = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+        return self._rerank(self.normalize(query)[0], candidates, k)
+
+    def search_batch(
+        self,
+        queries,
+        k: int = 10,
+        exclude: Optional[Sequence[Iterable[str]]] = None,
+        query_block: Optional[int] = None,
+        catalog_block: Optional[int] = None,
+        mask: Optional[np.ndarray] = None
+    ) -> list[list[tuple[str, float]]]:
+        """
+        `SimilarityEngine.search_batch` over the codes (see `_score_tile`) for `rerank * k`
+        candidates per query, re-ranked exactly.
+        """
+        if len(self.ids) == 0 or k <= 0:
+            return [[] for _ in range(len(queries))]
+        candidates = super().search_batch(queries, k=k * self.rerank, exclude=exclude, query_block=query_block, catalog_block=catalog_block, mask=mask)
+        queries = self.normalize(queries)
+        return [
+            self._rerank(query, np.array([self._positions[music_id] for music_id, _ in results], dtype=np.int64), k)
+            for query, results in zip(queries, candidates)
+        ]
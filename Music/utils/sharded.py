@@ -0,0 +1,251 @@
+import atexit
+import heapq
+import os
+import tempfile
+import threading
+import weakref
+from itertools import islice
+from multiprocessing import get_context
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+from .engine import SimilarityEngine
+
+def _shard_worker(connection):
+    """
+    Loop of a shard process: map the shared matrix, answer the searches on its rows.
+
+    Messages
+    -------
+        ("search", path, shape, start, end, queries, k, exclude, mask, single):
+            Top-k of rows `[start, end)` of the matrix in `path`, `exclude` and the results are
+            global row positions, `mask` is None or the bit-packed (`np.packbits`) mask of the range.
+            Answered with `("ok", results)` or `("error", message)`.
+        None:
+            Exit.
+    """
+    engines = {}
+    while True:
+        try:
+            message = connection.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        try:
+            _, path, shape, start, end, queries, k, exclude, mask, single = message
+            key = (path, shape, start, end)
+            engine = engines.get(key)
+            if engine is None:
+                # The parent moved to another buffer or another split: drop the stale mappings
+                engines = {}
+                matrix = np.memmap(path, dtype=np.float32, mode="r", shape=shape)
+                # IDs are the global row positions, so results need no translation
+                engine = engines[key] = SimilarityEngine.from_normalized(range(start, end), matrix[start:end])
+            if mask is not None:
+                mask = np.unpackbits(mask, count=end - start).astype(bool)
+            if single:
+                results = [engine.search(queries[0], k=k, exclude=exclude[0], mask=mask)]
+            else:
+                results = engine.search_batch(queries, k=k, exclude=exclude, mask=mask)
+            connection.send(("ok", results))
+        except Exception as e:
+            connection.send(("error", f"{type(e).__name__}: {str(e)}"))
+    connection.close()
+
+class ShardPool:
+    """
+    Long-lived search processes, one per shard. They are spawned rather than forked, so they hold
+    no copy of the parent (threads, TensorFlow, database connections): only a read-only mapping of
+    the matrix, see `ShardedEngine`.
+    """
+    def __init__(self, n_shards: int):
+        context = get_context("spawn")
+        self.n_shards = n_shards
+        self._lock = threading.Lock()
+        self._connections = []
+        self._processes = []
+        for i in range(n_shards):
+            connection, child = context.Pipe()
+            process = context.Process(target=_shard_worker, args=(child,), name=f"SimilarityShard-{i}", daemon=True)
+            process.start()
+            child.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+
+    @property
+    def is_alive(self):
+        return all(process.is_alive() for process in self._processes)
+
+    def map(self, messages: list[tuple]) -> list:
+        """
+        Send `messages[i]` to shard `i`, then gather the answers in the same order. Every shard
+        works at the same time; a search holds the pool until all of them have answered.
+        """
+        assert len(messages) <= self.n_shards, "at most one message per shard"
+        with self._lock:
+            for connection, message in zip(self._connections, messages):
+                connection.send(message)
+            answers = [connection.recv() for connection in self._connections[:len(messages)]]
+        errors = [answer for status, answer in answers if status == "error"]
+        if errors:
+            raise RuntimeError(f"Shard search failed: {errors[0]}")
+        return [answer for _, answer in answers]
+
+    def close(self):
+        for connection in self._connections:
+            try:
+                connection.send(None)
+                connection.close()
+            except OSError:
+                pass
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._connections, self._processes = [], []
+
+_pools: dict[int, ShardPool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(n_shards: int) -> ShardPool:
+    """
+    The pool of `n_shards` processes of this process, started on first use and shared by every
+    `ShardedEngine` (a reloaded index does not spawn new processes). A pool with a dead process
+    is replaced.
+    """
+    with _pools_lock:
+        pool = _pools.get(n_shards)
+        if pool is None or not pool.is_alive:
+            if pool is not None:
+                pool.close()
+            pool = _pools[n_shards] = ShardPool(n_shards)
+        return pool
+
+@atexit.register
+def close_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+def _remove_file(path: str):
+    # Processes which still map it keep their pages (POSIX); Windows refuses to delete a mapped file
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+class ShardedEngine(SimilarityEngine):
+    """
+    Exact search spread over several processes (scatter-gather), so that one search uses several cores.
+
+    The normalized matrix lives in a memory-mapped file in `directory` (`/dev/shm` when available,
+    i.e. in RAM), which this process writes and every shard process maps read-only: rows are never
+    copied between processes, and `add` / `remove` are visible to the shards at once.
+    A search splits the rows into `n_shards` contiguous ranges, sends the query to every shard of
+    the pool (see `get_pool`), each one computes the top-k of its range, and the sorted partial
+    results are merged with a heap (`heapq.merge`).
+
+    Catalogues smaller than `min_rows` are searched in this process: below it, the round trip to
+    the shards costs more than the scan itself (see `benchmarks/sharded_search.py`).
+    """
+    def __init__(
+        self,
+        ids: Optional[Iterable[str]] = None,
+        features: Optional[Iterable] = None,
+        n_shards: Optional[int] = None,
+        min_rows: int = 0,
+        directory: Optional[str] = None
+    ):
+        self.n_shards = n_shards or os.cpu_count() or 1
+        self.min_rows = min_rows
+        self.directory = directory or ("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+        self._path: Optional[str] = None
+        self._finalizer = None
+        super().__init__(ids, features)
+
+    def _allocate(self, rows: int, dim: int) -> np.ndarray:
+        fd, path = tempfile.mkstemp(prefix="similarity-", suffix=".f32", dir=self.directory)
+        os.close(fd)
+        buffer = np.memmap(path, dtype=np.float32, mode="w+", shape=(rows, dim))
+        # The previous file can be unlinked now: this process keeps its mapping until the caller has copied the rows
+        if self._finalizer is not None:
+            self._finalizer()
+        self._path = path
+        self._finalizer = weakref.finalize(self, _remove_file, path)
+        return buffer
+
+    def build(self, ids: Iterable[str], features: Iterable):
+        super().build(ids, features)
+        if len(self.ids) > 0:
+            matrix = self._buffer
+            self._buffer = self._allocate(*matrix.shape)
+            self._buffer[:] = matrix
+        return self
+
+    def close(self):
+        """
+        Remove the shared file. The pool keeps running for the other engines.
+        """
+        if self._finalizer is not None:
+            self._finalizer()
+        self._path = None
+
+    def _is_sharded(self) -> bool:
+        return self.n_shards > 1 and len(self.ids) >= max(self.min_rows, self.n_shards) and self._path is not None
+
+    def _scatter(
+        self,
+        queries: np.ndarray,
+        k: int,
+        exclude: list[list[int]],
+        mask: Optional[np.ndarray],
+        single: bool
+    ) -> list[list[tuple[str, float]]]:
+        n = len(self.ids)
+        bounds = np.linspace(0, n, self.n_shards + 1).astype(int)
+        # 1 bit per row on the pipe
+        messages = [
+            (
+                "search", self._path, self._buffer.shape, int(start), int(end), queries, k, exclude,
+                None if mask is None else np.packbits(mask[start:end]), single
+            )
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+        partials = get_pool(self.n_shards).map(messages)
+        # Every partial list is sorted by decreasing similarity: k-way heap merge of the first k
+        return [
+            [(self.ids[position], score) for position, score in islice(heapq.merge(*lists, key=lambda result: -result[1]), k)]
+            for lists in zip(*partials)
+        ]
+
+    def _excluded_positions(self, exclude: Iterable[str]) -> list[int]:
+        return [self._positions[music_id] for music_id in exclude if music_id in self._positions]
+
+    def search(
+        self,
+        query,
+        k: int = 10,
+        exclude: Iterable[str] = (),
+        mask: Optional[np.ndarray] = None
+    ) -> list[tuple[str, float]]:
+        if not self._is_sharded() or k <= 0:
+            return super().search(query, k=k, exclude=exclude, mask=mask)
+        return self._scatter(self.normalize(query), k, [self._excluded_positions(exclude)], mask, single=True)[0]
+
+    def search_batch(
+        self,
+        queries,
+        k: int = 10,
+        exclude: Optional[Sequence[Iterable[str]]] = None,
+        query_block: Optional[int] = None,
+        catalog_block: Optional[int] = None,
+        mask: Optional[np.ndarray] = None
+    ) -> list[list[tuple[str, float]]]:
+        if not self._is_sharded() or k <= 0 or len(queries) == 0:
+            return super().search_batch(queries, k=k, exclude=exclude, query_block=query_block, catalog_block=catalog_block, mask=mask)
+        assert exclude is None or len(exclude) == len(queries), "exclude must have one entry per query"
+        exclude = [self._excluded_positions(ids) for ids in exclude] if exclude is not None else None
+        return self._scatter(self.normalize(queries), k, exclude, mask, single=False)
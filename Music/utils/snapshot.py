@@ -0,0 +1,129 @@
+import glob
+import json
+import os
+import tempfile
+from typing import Iterable, Optional
+
+import numpy as np
+
+from .engine import SimilarityEngine
+
+class FeatureSnapshot:
+    """
+    On-disk snapshot of a normalized feature matrix, shared by every worker through `mmap`.
+
+    Layout of `directory`
+    -------
+        snapshot.json:
+            The manifest: `{"generation": int, "count": int, "dim": int, "features": str, "ids": str}`.
+            It is replaced atomically, so readers always see a complete generation.
+        features.<generation>.npy:
+            The normalized float32 matrix of shape (count, dim), loaded with `mmap_mode='r'`.
+        ids.<generation>.npy:
+            The music IDs, aligned with the rows of the matrix.
+
+    Each export increments `generation`; readers compare it with the generation they loaded
+    to detect a stale snapshot (see `is_stale`).
+    """
+    MANIFEST = "snapshot.json"
+    KEEP_GENERATIONS = 2
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, self.MANIFEST)
+
+    def exists(self):
+        return os.path.isfile(self.manifest_path)
+
+    def read_manifest(self) -> Optional[dict]:
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def generation(self) -> int:
+        manifest = self.read_manifest()
+        return 0 if manifest is None else manifest.get("generation", 0)
+
+    def write(self, ids: Iterable[str], matrix: np.ndarray) -> int:
+        """
+        Publish a new generation.
+
+        Arguments
+        -------
+            ids (Iterable[str]):
+                The music IDs.
+            matrix (np.ndarray):
+                The normalized feature vectors, one row per ID.
+
+        Returns
+        -------
+            generation (int):
+                The generation number of the new snapshot.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        generation = self.generation() + 1
+        ids = np.array(list(ids), dtype=str)
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        assert len(ids) == len(matrix), "ids and matrix must have the same length"
+
+        features_file = f"features.{generation}.npy"
+        ids_file = f"ids.{generation}.npy"
+        np.save(os.path.join(self.directory, features_file), matrix)
+        np.save(os.path.join(self.directory, ids_file), ids)
+
+        manifest = {
+            "generation": generation,
+            "count": int(matrix.shape[0]),
+            "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+            "features": features_file,
+            "ids": ids_file,
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".json")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+        self._remove_old_generations(generation)
+        return generation
+
+    def _remove_old_generations(self, generation: int):
+        # Workers may still map an older generation: POSIX keeps unlinked files alive, Windows refuses to delete them.
+        for path in glob.glob(os.path.join(self.directory, "*.*.npy")):
+            try:
+                file_generation = int(os.path.basename(path).split(".")[1])
+            except ValueError:
+                continue
+            if file_generation <= generation - self.KEEP_GENERATIONS:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def load(self) -> tuple[Optional[SimilarityEngine], int]:
+        """
+        Map the current generation.
+
+        Returns
+        -------
+            engine (SimilarityEngine):
+                An engine backed by the read-only memory-mapped matrix, None if there is no snapshot.
+            generation (int):
+                The generation of the loaded snapshot.
+        """
+        manifest = self.read_manifest()
+        if manifest is None:
+            return None, 0
+
+        ids = np.load(os.path.join(self.directory, manifest["ids"])).tolist()
+        if manifest.get("count", 0) == 0:
+            return SimilarityEngine(), manifest["generation"]
+        matrix = np.load(os.path.join(self.directory, manifest["features"]), mmap_mode="r")
+        return SimilarityEngine.from_normalized(ids, matrix), manifest["generation"]
+
+    def is_stale(self, generation: int) -> bool:
+        return self.generation() != generation
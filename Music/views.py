@@ -1,12 +1,16 @@
-from django.urls import reverse
 from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseServerError, JsonResponse
 from django.http import HttpRequest
+from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
-from Music.models import Artist, Music
+from Feature import services
+from Feature.utils.check_helper import Checker
+from Music import jobs
+from Music.filters import MusicFilter
+from Music.models import Artist, IngestJob, Music
 from Music.similiarity import MusicSimilarityComparator
+from dataclasses import replace
 from uuid import uuid4
 import logging
-import requests
 import json
 
 msc = MusicSimilarityComparator()
@@ -23,23 +27,25 @@ def upload_music(request: HttpRequest):
     if yt_link is None:
         return JsonResponse({"error": "The 'yt_link' field is missing."}, status=400)
 
-    data = {"yt_link": yt_link}
+    if not Checker.is_yt_link(yt_link):
+        return JsonResponse({"error": "The 'yt_link' field must be a valid YouTube link."}, status=400)
+
     logger.info(f"Received link: {yt_link}")
-    
-    url = request.build_absolute_uri(reverse('info'))
-    response = requests.post(url, data=data)
-    info = response.json()
-    id = info.get('id')
 
-    music = Music.get_music_from_id(id)
-    if music is not None: return JsonResponse({"data": music})
+    try:
+        # Known link: answered from the database, without touching YouTube
+        music = Music.get_music_from_id(Checker.get_video_id(yt_link))
+        if music is not None: return JsonResponse({"data": music})
 
-    url = request.build_absolute_uri(reverse('feature'))
-    response = requests.post(url, data=data)
-    features = response.json().get('data')
+        data = services.get_full_data(yt_link)
+        if data is None:
+            return JsonResponse({"error": "Feature extraction failed due to an unknown error."}, status=500)
+        info = data['info']
 
-    try:
-        music = Music.upload_music(info=info, features=features)
+        music = Music.get_music_from_id(info.get('id'))
+        if music is not None: return JsonResponse({"data": music})
+
+        music = Music.upload_music(info=info, features=data['feature'])
         if music is None:
             return JsonResponse({"error": "Music upload failed due to an unknown error."}, status=500)
         return JsonResponse({"data": music})
@@ -50,22 +56,34 @@ def upload_music(request: HttpRequest):
     
 @csrf_exempt   
 def get_similiar_musics(request: HttpRequest):
+    """
+    The musics most similar to `yt_link`. Optional filters: `exclude_same_artist` (`true` / `1`),
+    `min_view_count` and `exclude_ids` (repeated field), see `MusicFilter`.
+    """
     if request.method != 'POST':
         return JsonResponse({"error": "Only POST method is allowed."}, status=405)
 
     yt_link = request.POST.get("yt_link")
-    data = {"yt_link": yt_link}
-    
-    url = request.build_absolute_uri(reverse('info'))
-    response = requests.post(url, data=data)
-    info = response.json()
-    id = info.get('id')
 
-    music = Music.get_music_from_id(id)
-    if music is None: return JsonResponse({"error": "Music has not been uploaded."}, status=500)
+    if yt_link is None:
+        return JsonResponse({"error": "The 'yt_link' field is missing."}, status=400)
+
+    if not Checker.is_yt_link(yt_link):
+        return JsonResponse({"error": "The 'yt_link' field must be a valid YouTube link."}, status=400)
+
+    try:
+        filters = MusicFilter.parse({"min_view_count": request.POST.get("min_view_count"), "exclude_ids": request.POST.getlist("exclude_ids")})
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    exclude_same_artist = request.POST.get("exclude_same_artist", "").lower() in ("1", "true")
 
     try:
-        res = msc.compare(music.get('music_id'))
+        music = Music.get_music_from_id(services.get_video_id(yt_link))
+        if music is None: return JsonResponse({"error": "Music has not been uploaded."}, status=500)
+
+        if exclude_same_artist:
+            filters = replace(filters, exclude_artists=frozenset({music.get('artist_id')}))
+        res = msc.compare(music.get('music_id'), filters=filters)
         if res is None:
             return JsonResponse({"error": "Music similarity comparison failed due to an unknown error."}, status=500)
         return JsonResponse({"original_data": music, "data": res})
@@ -74,6 +92,122 @@ def get_similiar_musics(request: HttpRequest):
         logger.error(f"{str(e)} ({error_id})")
         return JsonResponse({"error": "Unknown error.", "error_id": error_id}, status=500)
 
+@csrf_exempt
+def get_similiar_musics_batch(request: HttpRequest):
+    """
+    `get_similiar_musics` for many seeds at once (playlist continuation, radio).
+
+    JSON body: `{"music_ids": [str], "features": [[float]], "k": int, "aggregate": null | "centroid" | "max", "filters": {...}}`,
+    see `MusicSimilarityComparator.compare_batch` and `MusicFilter.parse`. `music_ids` can also be sent as form fields.
+    """
+    if request.method != 'POST':
+        return JsonResponse({"error": "Only POST method is allowed."}, status=405)
+
+    if request.content_type == "application/json":
+        try:
+            body = json.loads(request.body or b"{}")
+        except ValueError:
+            return JsonResponse({"error": "The request body must be valid JSON."}, status=400)
+        if not isinstance(body, dict):
+            return JsonResponse({"error": "The request body must be a JSON object."}, status=400)
+    else:
+        body = {"music_ids": request.POST.getlist("music_ids"), "k": request.POST.get("k"), "aggregate": request.POST.get("aggregate")}
+
+    music_ids = body.get("music_ids") or []
+    features = body.get("features") or []
+    aggregate = body.get("aggregate") or None
+
+    if not isinstance(music_ids, list) or not all(isinstance(music_id, str) for music_id in music_ids):
+        return JsonResponse({"error": "The 'music_ids' field must be a list of music IDs."}, status=400)
+
+    if not isinstance(features, list) or not all(
+        isinstance(vector, list) and vector and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in vector)
+        for vector in features
+    ):
+        return JsonResponse({"error": "The 'features' field must be a list of feature vectors."}, status=400)
+
+    if len(music_ids) + len(features) == 0:
+        return JsonResponse({"error": "The 'music_ids' or 'features' field is missing."}, status=400)
+
+    if len(music_ids) + len(features) > settings.MUSIC_BATCH_MAX_QUERIES:
+        return JsonResponse({"error": f"At most {settings.MUSIC_BATCH_MAX_QUERIES} queries are allowed."}, status=400)
+
+    try:
+        k = int(body.get("k") if body.get("k") not in (None, "") else msc.k)
+    except (TypeError, ValueError):
+        k = 0
+    if not 1 <= k <= settings.MUSIC_BATCH_MAX_K:
+        return JsonResponse({"error": f"The 'k' field must be an integer between 1 and {settings.MUSIC_BATCH_MAX_K}."}, status=400)
+
+    if aggregate not in (None, "centroid", "max"):
+        return JsonResponse({"error": "The 'aggregate' field must be 'centroid' or 'max'."}, status=400)
+
+    try:
+        filters = MusicFilter.parse(body.get("filters"))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    try:
+        res = msc.compare_batch(music_ids=music_ids, features=features, k=k, aggregate=aggregate, filters=filters)
+        return JsonResponse({"data": res["results"], "missing": res["missing"]})
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        error_id = uuid4()
+        logger.error(f"{str(e)} ({error_id})")
+        return JsonResponse({"error": "Unknown error.", "error_id": error_id}, status=500)
+
+@csrf_exempt
+def enqueue_music(request: HttpRequest):
+    """
+    Asynchronous `upload_music`: queue the upload and answer at once with the job
+    (see `manage.py run_ingest_workers`).
+    """
+    if request.method != 'POST':
+        return JsonResponse({"error": "Only POST method is allowed."}, status=405)
+
+    yt_link = request.POST.get('yt_link')
+
+    if yt_link is None:
+        return JsonResponse({"error": "The 'yt_link' field is missing."}, status=400)
+
+    if not Checker.is_yt_link(yt_link):
+        return JsonResponse({"error": "The 'yt_link' field must be a valid YouTube link."}, status=400)
+
+    try:
+        job = jobs.enqueue(yt_link)
+        if job is None:
+            return JsonResponse({"error": "The video ID of 'yt_link' could not be found."}, status=400)
+        return JsonResponse({"data": job.to_dict()}, status=202)
+    except Exception as e:
+        error_id = uuid4()
+        logger.error(f"{str(e)} ({error_id})")
+        return JsonResponse({"error": "Unknown error.", "error_id": error_id}, status=500)
+
+def get_job(request: HttpRequest, job_id: str):
+    if request.method != 'GET':
+        return JsonResponse({"error": "Only GET method is allowed."}, status=405)
+
+    job = IngestJob.objects.filter(job_id=job_id).first()
+    if job is None: return JsonResponse({"error": "Job not found."}, status=404)
+    return JsonResponse({"data": job.to_dict()})
+
+def get_job_result(request: HttpRequest, job_id: str):
+    if request.method != 'GET':
+        return JsonResponse({"error": "Only GET method is allowed."}, status=405)
+
+    job = IngestJob.objects.filter(job_id=job_id).first()
+    if job is None: return JsonResponse({"error": "Job not found."}, status=404)
+
+    if job.status == IngestJob.FAILED:
+        return JsonResponse({"error": "The job failed.", "data": job.to_dict()}, status=500)
+    if job.status != IngestJob.SUCCEEDED:
+        return JsonResponse({"data": job.to_dict()}, status=202)
+
+    music = Music.get_music_from_id(job.music_id)
+    if music is None: return JsonResponse({"error": "The music of this job has been deleted."}, status=404)
+    return JsonResponse({"data": music})
+
 @csrf_exempt
 def test_create_data(request):
     artist = Artist.objects.create(artist_id="@123", name="Artist A", url="https://example.com/artist_a")
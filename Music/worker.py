@@ -0,0 +1,20 @@
+"""
+Entry point of the spawned ingest worker processes (see `Music.jobs.run_workers`).
+
+Spawned processes start from a fresh interpreter, so this module must not import any model
+before `django.setup()`.
+"""
+import os
+
+def main(name: str, poll_interval: float, stop_event, once: bool):
+    import django
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Echo_Sence.settings")
+    django.setup()
+
+    from Music.jobs import run_worker
+
+    try:
+        run_worker(name, poll_interval=poll_interval, stop_event=stop_event, once=once)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,68 @@
+"""
+Recall@k and latency of the IVF engine against the exact engine.
+
+Usage
+-------
+    python benchmarks/ann_recall.py --n 100000 --dim 10
+    python benchmarks/ann_recall.py --features features.npy   # real vectors, shape (n, dim)
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Music.utils import IVFEngine, SimilarityEngine
+
+def make_dataset(n: int, dim: int, n_clusters: int = 64, seed: int = 0):
+    # Clustered, non-negative vectors, like the min-max scaled encoder output.
+    rng = np.random.default_rng(seed)
+    centers = rng.random((n_clusters, dim), dtype=np.float32)
+    labels = rng.integers(0, n_clusters, n)
+    return np.clip(centers[labels] + 0.1 * rng.standard_normal((n, dim), dtype=np.float32), 0, 1)
+
+def timed_search(engine, queries, k, **kwargs):
+    start = time.perf_counter()
+    results = [engine.search(query, k=k, **kwargs) for query in queries]
+    return results, (time.perf_counter() - start) / len(queries) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--features", help="A .npy file of feature vectors. Synthetic vectors are used when omitted.")
+    parser.add_argument("--n", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--n-lists", type=int, default=None)
+    parser.add_argument("--n-probe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    features = np.load(args.features) if args.features else make_dataset(args.n, args.dim)
+    ids = [str(i) for i in range(len(features))]
+    rng = np.random.default_rng(1)
+    queries = features[rng.choice(len(features), args.queries, replace=False)]
+
+    exact = SimilarityEngine(ids, features)
+    start = time.perf_counter()
+    ivf = IVFEngine(ids, features, n_lists=args.n_lists)
+    build_time = time.perf_counter() - start
+
+    truth, exact_ms = timed_search(exact, queries, args.k)
+    truth = [set(music_id for music_id, _ in result) for result in truth]
+
+    print(f"musics: {len(features)}, dim: {features.shape[1]}, cells: {ivf.n_lists}, build: {build_time:.2f}s")
+    print(f"{'engine':<16}{'recall@' + str(args.k):>12}{'ms/query':>12}")
+    print(f"{'exact':<16}{1.0:>12.3f}{exact_ms:>12.3f}")
+    for n_probe in args.n_probe:
+        results, ivf_ms = timed_search(ivf, queries, args.k, n_probe=n_probe)
+        recall = np.mean([
+            len(expected & set(music_id for music_id, _ in result)) / len(expected)
+            for expected, result in zip(truth, results)
+        ])
+        print(f"{'ivf n_probe=' + str(n_probe):<16}{recall:>12.3f}{ivf_ms:>12.3f}")
+
+if __name__ == "__main__":
+    main()
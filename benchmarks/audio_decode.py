@@ -0,0 +1,117 @@
+"""
+CPU time per track of the audio decoding paths of `FeatureExtractor`.
+
+    legacy:
+        `Downloader.m4a_to_mp3` (pydub decode + mp3 encode) then `librosa.load` of the mp3.
+    ffmpeg:
+        `decode_audio` of the m4a straight to float32 PCM at 22050 Hz.
+
+CPU time includes the ffmpeg child processes. Without `--file`, a 30 s m4a excerpt (the size of
+a `Downloader.download_range` download) is synthesised with ffmpeg.
+
+Usage
+-------
+    python benchmarks/audio_decode.py --repeat 10
+    python benchmarks/audio_decode.py --file path/to/excerpt.m4a
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+def cpu_time():
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+def synthesise_m4a(path: str, seconds: float = 30, sr: int = 44100):
+    from Feature.utils.decoder import get_ffmpeg
+
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * sr)) / sr
+    tones = sum(np.sin(2 * np.pi * f * t) for f in (110, 220, 330, 440, 660)) / 5
+    y = (0.5 * tones + 0.05 * rng.standard_normal(len(t))).astype(np.float32)
+    stereo = np.stack([y, y], axis=1)
+    subprocess.run(
+        [get_ffmpeg(), "-y", "-loglevel", "error", "-f", "f32le", "-ar", str(sr), "-ac", "2", "-i", "pipe:0", "-c:a", "aac", "-b:a", "128k", path],
+        input=stereo.tobytes(),
+        check=True
+    )
+
+def transcode(m4a_path: str, workdir: str) -> str:
+    """
+    `Downloader.m4a_to_mp3`. pydub needs ffprobe: without it, its two ffmpeg passes
+    (m4a -> wav, wav -> mp3) are run directly.
+    """
+    from pydub.utils import which
+    from Feature.utils.decoder import get_ffmpeg
+    from Feature.utils.yt_music import Downloader
+
+    # m4a_to_mp3 deletes its input
+    copy = os.path.join(workdir, "input.m4a")
+    shutil.copyfile(m4a_path, copy)
+    if which("ffprobe") is not None:
+        return Downloader.m4a_to_mp3(copy, workdir)
+
+    wav_path, mp3_path = os.path.join(workdir, "input.wav"), os.path.join(workdir, "input.mp3")
+    subprocess.run([get_ffmpeg(), "-y", "-loglevel", "error", "-i", copy, "-f", "wav", wav_path], check=True)
+    subprocess.run([get_ffmpeg(), "-y", "-loglevel", "error", "-f", "wav", "-i", wav_path, "-f", "mp3", mp3_path], check=True)
+    os.remove(copy)
+    os.remove(wav_path)
+    return mp3_path
+
+def legacy(m4a_path: str, workdir: str):
+    import librosa
+
+    mp3_path = transcode(m4a_path, workdir)
+    y, sr = librosa.load(mp3_path, duration=30)
+    os.remove(mp3_path)
+    return y, sr
+
+def ffmpeg(m4a_path: str, workdir: str):
+    from Feature.utils.decoder import decode_audio
+
+    return decode_audio(m4a_path, duration=30)
+
+def measure(function, m4a_path: str, workdir: str, repeat: int):
+    function(m4a_path, workdir)  # imports, codec initialisation
+    cpu, wall = [], []
+    for _ in range(repeat):
+        cpu_start, wall_start = cpu_time(), time.perf_counter()
+        y, sr = function(m4a_path, workdir)
+        cpu.append(cpu_time() - cpu_start)
+        wall.append(time.perf_counter() - wall_start)
+    return float(np.median(cpu)), float(np.median(wall)), len(y), sr
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", help="An m4a file, a 30 s excerpt is synthesised otherwise.")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        m4a_path = args.file
+        if m4a_path is None:
+            m4a_path = os.path.join(workdir, "excerpt.m4a")
+            synthesise_m4a(m4a_path)
+
+        results = {name: measure(function, m4a_path, workdir, args.repeat) for name, function in (("legacy", legacy), ("ffmpeg", ffmpeg))}
+
+    print(f"{'path':<8} {'cpu ms/track':>13} {'wall ms/track':>14} {'samples':>9} {'sr':>6}")
+    for name, (cpu, wall, samples, sr) in results.items():
+        print(f"{name:<8} {cpu * 1000:>13.1f} {wall * 1000:>14.1f} {samples:>9} {sr:>6}")
+    saved = results["legacy"][0] - results["ffmpeg"][0]
+    print(f"CPU time saved per track: {saved * 1000:.1f} ms ({saved / results['legacy'][0]:.0%})")
+
+if __name__ == "__main__":
+    main()
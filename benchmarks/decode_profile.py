@@ -0,0 +1,114 @@
+"""
+CPU time and encoder-feature accuracy of the decode profiles (`Feature.utils.decoder.DecodeProfile`).
+
+Every profile decodes the 30 s window (offset 30 s) of a 44.1 kHz stereo m4a to 22050 Hz mono.
+The reference is the current local-file path, `librosa.load` with its default resampler
+(soxr_hq); "librosa full" decodes the whole track and slices the window afterwards.
+
+For each profile the encoder features (`FeatureExtractor`) are compared with the reference
+ones: cosine similarity and max abs difference (features are min-max scaled to [0, 1]).
+CPU time includes the ffmpeg child processes. Without `--file`, a 3 min track is synthesised.
+
+Usage
+-------
+    python benchmarks/decode_profile.py --repeat 5
+    python benchmarks/decode_profile.py --file path/to/track.m4a
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import numpy as np
+
+OFFSET, DURATION = 30., 30.
+
+def cpu_time():
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+def synthesise_m4a(path: str, seconds: float = 180, sr: int = 44100):
+    from Feature.utils.decoder import get_ffmpeg
+
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * sr)) / sr
+    envelope = 0.6 + 0.4 * np.sin(2 * np.pi * 2 * t) ** 2
+    left = sum(np.sin(2 * np.pi * f * t) for f in (110, 220, 330, 440)) / 4 * envelope
+    right = sum(np.sin(2 * np.pi * f * t) for f in (165, 247, 494, 660)) / 4 * envelope[::-1]
+    stereo = np.stack([left, right], axis=1) * 0.5 + 0.02 * rng.standard_normal((len(t), 2))
+    subprocess.run(
+        [get_ffmpeg(), "-y", "-loglevel", "error", "-f", "f32le", "-ar", str(sr), "-ac", "2", "-i", "pipe:0", "-c:a", "aac", "-b:a", "128k", path],
+        input=stereo.astype(np.float32).tobytes(),
+        check=True
+    )
+
+def librosa_full(path: str):
+    import librosa
+
+    y, sr = librosa.load(path)
+    return y[int(OFFSET * sr):int((OFFSET + DURATION) * sr)], sr
+
+def measure(load, path: str, repeat: int):
+    load(path)  # imports, codec initialisation
+    cpu = []
+    for _ in range(repeat):
+        start = cpu_time()
+        y, sr = load(path)
+        cpu.append(cpu_time() - start)
+    return float(np.median(cpu)), y, sr
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", help="An audio file of at least 60 s, a 3 min track is synthesised otherwise.")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    import logging
+    import warnings
+    logging.disable(logging.INFO)
+    warnings.filterwarnings("ignore")
+
+    from Feature.extractor import FeatureExtractor
+    from Feature.utils.decoder import DecodeProfile
+    from Feature.utils.score import Audio
+
+    profiles = {
+        "librosa soxr_hq (current)": DecodeProfile(backend="librosa"),
+        "librosa full": None,
+        "librosa soxr_lq": DecodeProfile(backend="librosa", resampler="soxr_lq"),
+        "librosa polyphase": DecodeProfile(backend="librosa", resampler="polyphase"),
+        "ffmpeg swr": DecodeProfile(),
+        "ffmpeg soxr": DecodeProfile(resampler="soxr"),
+    }
+    fe = FeatureExtractor(encoder_path="static/feature/models/best.h5", inference_mode="direct").load()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = args.file
+        if path is None:
+            path = os.path.join(workdir, "track.m4a")
+            synthesise_m4a(path)
+
+        results = {}
+        for name, profile in profiles.items():
+            load = librosa_full if profile is None else (lambda p, profile=profile: profile.load(p, offset=OFFSET, duration=DURATION))
+            cpu, y, sr = measure(load, path, args.repeat)
+            results[name] = (cpu, y, fe._get_audio_features(Audio(y=y, sr=sr)))
+
+    _, reference_y, reference = results["librosa soxr_hq (current)"]
+    print(f"{'profile':<26} {'cpu ms':>8} {'signal max diff':>16} {'feature cosine':>15} {'feature max diff':>17}")
+    for name, (cpu, y, features) in results.items():
+        n = min(len(y), len(reference_y))
+        cosine = float(np.dot(features, reference) / (np.linalg.norm(features) * np.linalg.norm(reference)))
+        print(
+            f"{name:<26} {cpu * 1000:>8.1f} {np.abs(y[:n] - reference_y[:n]).max():>16.2e} "
+            f"{cosine:>15.6f} {np.abs(features - reference).max():>17.2e}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Per-request encoder latency and memory for every inference mode of `FeatureExtractor`.
+
+Each mode runs in its own process so that the reported peak RSS is not shared between modes.
+
+Usage
+-------
+    python benchmarks/inference_latency.py --requests 200
+    python benchmarks/inference_latency.py --modes predict compiled tflite --batch-size 8
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = ["predict", "direct", "compiled", "tflite"]
+
+def peak_rss_mb():
+    try:
+        import resource
+        # KiB on Linux, bytes on macOS
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / 1024 if sys.platform != "darwin" else rss / 1024 / 1024
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 1024 / 1024
+
+def run_worker(mode: str, requests: int, batch_size: int, encoder_path: str, tflite_path: str):
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
+    import numpy as np
+    from keras import models
+    from Feature.utils.inference import InferenceRunner
+
+    start = time.perf_counter()
+    model = models.load_model(encoder_path)
+    runner = InferenceRunner(model, mode=mode, tflite_path=tflite_path)
+    load_s = time.perf_counter() - start
+
+    rng = np.random.default_rng(0)
+    X = rng.random((batch_size,) + runner.input_shape, dtype=np.float32)
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        runner(X)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    print(json.dumps({
+        "mode": mode,
+        "load_s": load_s,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "rss_mb": peak_rss_mb(),
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--encoder", default=os.path.join(ROOT, "static", "feature", "models", "best.h5"))
+    parser.add_argument("--worker", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--tflite-path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        return run_worker(args.worker, args.requests, args.batch_size, args.encoder, args.tflite_path)
+
+    print(f"{'mode':<10}{'load+warmup s':>15}{'p50 ms':>10}{'p95 ms':>10}{'peak RSS MB':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in args.modes:
+            output = subprocess.run(
+                [
+                    sys.executable, __file__, 
+                    "--worker", mode, 
+                    "--requests", str(args.requests), 
+                    "--batch-size", str(args.batch_size),
+                    "--encoder", args.encoder,
+                    "--tflite-path", os.path.join(tmp, "encoder.tflite")
+                ],
+                capture_output=True, text=True, check=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{mode:<10}{result['load_s']:>15.2f}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['rss_mb']:>14.0f}")
+
+if __name__ == "__main__":
+    main()
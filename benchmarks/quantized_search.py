@@ -0,0 +1,74 @@
+"""
+Memory per track, throughput and recall@k of the quantized engines (int8 / float16 codes with
+exact re-ranking) against the exact float32 engine, i.e. the results of `MusicSimilarityComparator`
+with the default `"exact"` backend.
+
+Usage
+-------
+    python benchmarks/quantized_search.py --n 1000000 --dim 10
+    python benchmarks/quantized_search.py --features features.npy   # real vectors, shape (n, dim)
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Music.utils import QuantizedEngine, SimilarityEngine
+
+def make_dataset(n: int, dim: int, n_clusters: int = 64, seed: int = 0):
+    # Clustered, non-negative vectors, like the min-max scaled encoder output.
+    rng = np.random.default_rng(seed)
+    centers = rng.random((n_clusters, dim), dtype=np.float32)
+    labels = rng.integers(0, n_clusters, n)
+    return np.clip(centers[labels] + 0.1 * rng.standard_normal((n, dim), dtype=np.float32), 0, 1)
+
+def run(engine, queries, k, batch):
+    start = time.perf_counter()
+    results = [engine.search(query, k=k) for query in queries]
+    latency = (time.perf_counter() - start) / len(queries) * 1000
+    start = time.perf_counter()
+    engine.search_batch(queries[:batch], k=k)
+    throughput = batch / (time.perf_counter() - start)
+    return results, latency, throughput
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--features", help="A .npy file of feature vectors. Synthetic vectors are used when omitted.")
+    parser.add_argument("--n", type=int, default=1000000)
+    parser.add_argument("--dim", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=256, help="Queries of the search_batch throughput run.")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    features = np.load(args.features) if args.features else make_dataset(args.n, args.dim)
+    ids = [str(i) for i in range(len(features))]
+    rng = np.random.default_rng(1)
+    queries = features[rng.choice(len(features), max(args.queries, args.batch), replace=False)]
+
+    exact = SimilarityEngine(ids, features)
+    truth, exact_ms, exact_qps = run(exact, queries[:args.queries], args.k, args.batch)
+    truth = [set(music_id for music_id, _ in result) for result in truth]
+
+    print(f"musics: {len(features)}, dim: {features.shape[1]}, k: {args.k}, batch: {args.batch}")
+    print(f"{'engine':<20}{'B/track':>9}{'scan MB':>9}{'ms/query':>10}{'batch q/s':>11}{'recall@' + str(args.k):>11}")
+    row = "{:<20}{:>9}{:>9.1f}{:>10.3f}{:>11.0f}{:>11.3f}"
+    print(row.format("float32 exact", 4 * exact.dim, exact.matrix.nbytes / 2 ** 20, exact_ms, exact_qps, 1.0))
+    for precision in ("int8", "float16"):
+        engine = QuantizedEngine(ids, features, precision=precision)
+        for rerank in args.rerank:
+            engine.rerank = rerank
+            results, ms, qps = run(engine, queries[:args.queries], args.k, args.batch)
+            recall = np.mean([
+                len(expected & set(music_id for music_id, _ in result)) / len(expected)
+                for expected, result in zip(truth, results)
+            ])
+            print(row.format(f"{precision} rerank={rerank}", engine.code_bytes, engine.codes.nbytes / 2 ** 20, ms, qps, recall))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Time of `AudioTools.get_stats_2D` on the segmented MFCC tensor of one track, against the
+previous implementation (float64, one scipy / numpy pass per statistic).
+
+Without `--file`, a 30 s excerpt is synthesised. The maximum absolute difference of each
+statistic to the previous implementation is reported too.
+
+Usage
+-------
+    python benchmarks/segment_stats.py --repeat 200
+    python benchmarks/segment_stats.py --file path/to/excerpt.m4a
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+NAMES = ("kurtosis", "max", "mean", "median", "min", "skew", "std")
+
+def legacy(data: np.ndarray) -> np.ndarray:
+    from scipy.stats import kurtosis, skew
+
+    data = data.astype(np.float64)
+    return np.array([
+        kurtosis(data, axis=2),
+        np.max(data, axis=2),
+        np.mean(data, axis=2),
+        np.median(data, axis=2),
+        np.min(data, axis=2),
+        skew(data, axis=2),
+        np.std(data, axis=2)
+    ])
+
+def fused(data: np.ndarray) -> np.ndarray:
+    from Feature.utils.utils import AudioTools
+
+    return np.array(AudioTools.get_stats_2D(data))
+
+def segmented_mfcc(y: np.ndarray, sr: int, n_mfcc: int = 80, segment_size: int = 10) -> np.ndarray:
+    import librosa
+    from Feature.utils.utils import AudioTools
+
+    db = AudioTools.get_db(librosa.feature.mfcc(y=y, sr=sr, n_mfcc=n_mfcc))
+    pad_width = segment_size - (db.shape[-1] % segment_size)
+    return np.pad(db, ((0, 0), (0, pad_width))).reshape(n_mfcc, -1, segment_size)
+
+def synthesise(seconds: float = 30, sr: int = 22050):
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * sr)) / sr
+    tones = sum(np.sin(2 * np.pi * f * t * (1 + 0.1 * np.sin(t))) for f in (110, 220, 440, 880)) / 4
+    return (tones + 0.05 * rng.standard_normal(len(t))).astype(np.float32), sr
+
+def measure(function, data: np.ndarray, repeat: int) -> float:
+    function(data)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(data)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", help="An audio file, a 30 s excerpt is synthesised otherwise.")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.file is not None:
+        from Feature.utils.decoder import decode_audio
+        y, sr = decode_audio(args.file, duration=30)
+    else:
+        y, sr = synthesise()
+    data = segmented_mfcc(y, sr)
+
+    results = {name: measure(function, data, args.repeat) for name, function in (("legacy", legacy), ("fused", fused))}
+    print(f"input {data.shape} {data.dtype}")
+    print(f"{'kernel':<8} {'ms/track':>9}")
+    for name, seconds in results.items():
+        print(f"{name:<8} {seconds * 1000:>9.2f}")
+    print(f"speed-up: {results['legacy'] / results['fused']:.1f}x")
+
+    expected, actual = legacy(data), fused(data)
+    print(f"{'stat':<9} {'max abs diff':>13} {'same NaNs':>10}")
+    for name, e, a in zip(NAMES, expected, actual):
+        print(f"{name:<9} {np.nanmax(np.abs(e - a)):>13.2e} {str(np.array_equal(np.isnan(e), np.isnan(a))):>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Latency of one exact search against the catalogue size, in the request process and spread over
+1..N shard processes (`ShardedEngine`). The results of every configuration are checked against
+the in-process search.
+
+Usage
+-------
+    python benchmarks/sharded_search.py --sizes 10000 100000 1000000 --shards 2 4 8
+    python benchmarks/sharded_search.py --batch 256   # search_batch of 256 queries instead
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Music.utils import ShardedEngine, SimilarityEngine
+
+def make_dataset(n: int, dim: int, seed: int = 0):
+    return np.random.default_rng(seed).random((n, dim), dtype=np.float32)
+
+def measure(engine, queries, k, batch):
+    if batch:
+        engine.search_batch(queries[:batch], k=k)
+        start = time.perf_counter()
+        results = engine.search_batch(queries[:batch], k=k)
+        return results, (time.perf_counter() - start) * 1000
+    engine.search(queries[0], k=k)
+    times, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(engine.search(query, k=k))
+        times.append(time.perf_counter() - start)
+    return results, np.median(times) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--dim", type=int, default=10)
+    parser.add_argument("--shards", type=int, nargs="+", default=[n for n in (2, 4, 8, 16) if n <= (os.cpu_count() or 1)] or [2])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=0, help="Time one search_batch of this many queries.")
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    unit = f"ms / batch of {args.batch}" if args.batch else "ms / query (median)"
+    print(f"cpus: {os.cpu_count()}, dim: {args.dim}, k: {args.k}, {unit}")
+    print(f"{'musics':>10}{'in-process':>12}" + "".join(f"{f'{n} shards':>12}" for n in args.shards))
+    for n in args.sizes:
+        features = make_dataset(n, args.dim)
+        ids = [str(i) for i in range(n)]
+        queries = make_dataset(max(args.queries, args.batch), args.dim, seed=1)
+
+        truth, base_ms = measure(SimilarityEngine(ids, features), queries, args.k, args.batch)
+        row = f"{n:>10}{base_ms:>12.3f}"
+        for n_shards in args.shards:
+            engine = ShardedEngine(ids, features, n_shards=n_shards)
+            results, shard_ms = measure(engine, queries, args.k, args.batch)
+            assert [[i for i, _ in r] for r in results] == [[i for i, _ in r] for r in truth], "sharded results differ"
+            engine.close()
+            row += f"{shard_ms:>12.3f}"
+        print(row)
+
+if __name__ == "__main__":
+    main()
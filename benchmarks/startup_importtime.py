@@ -0,0 +1,73 @@
+"""
+Import-time report of the Django startup path (settings + URLconf), checked against a budget.
+
+Runs `python -X importtime` in a fresh interpreter, prints the slowest top-level packages and
+exits with status 1 when the total is over `--budget` or when a module of `--forbid` is imported.
+
+Usage
+-------
+    python benchmarks/startup_importtime.py
+    python benchmarks/startup_importtime.py --budget 1.0 --top 20
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only needed once the encoder is loaded, or by the research helpers.
+FORBIDDEN = ["tensorflow", "keras", "matplotlib", "pandas", "sklearn", "scipy.stats"]
+
+STARTUP_CODE = """
+import django
+django.setup()
+import Echo_Sence.urls
+"""
+
+def measure() -> list[tuple[str, int, int]]:
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE="Echo_Sence.settings", PYTHONPATH=ROOT)
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP_CODE],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stderr
+
+    # import time: self [us] | cumulative | imported package
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        modules.append((name.rstrip(), int(self_us), int(cumulative_us)))
+    return modules
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, default=1.5, help="Maximum total import time, in seconds.")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--forbid", nargs="*", default=FORBIDDEN, help="Modules which must not be imported at startup.")
+    args = parser.parse_args()
+
+    modules = measure()
+    # Top-level imports have no indentation in the package column.
+    top_level = [(name.strip(), cumulative) for name, _, cumulative in modules if not name.startswith("  ")]
+    total = sum(cumulative for _, cumulative in top_level) / 1e6
+    imported = {name.strip() for name, _, _ in modules}
+
+    print(f"{'module':<40}{'cumulative ms':>15}")
+    for name, cumulative in sorted(top_level, key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{name:<40}{cumulative / 1000:>15.1f}")
+    print(f"{'total':<40}{total * 1000:>15.1f}  (budget {args.budget * 1000:.0f} ms)")
+
+    failed = False
+    forbidden = [name for name in args.forbid if name in imported]
+    if forbidden:
+        print(f"Imported at startup: {', '.join(forbidden)}")
+        failed = True
+    if total > args.budget:
+        print("Over budget.")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()